@@ -0,0 +1,138 @@
+""" Times parsing, lookups, whitespace enhancement, create_class and the cold start of the command line tool
+
+    python Benchmark/benchmark.py run --output results.json
+    python Benchmark/benchmark.py compare baseline.json results.json
+    python Benchmark/benchmark.py startup --budget-ms 60
+
+compare exits with status 1 when a benchmark got slower than the baseline by more than the tolerance, startup exits with
+status 1 when the cold start of the command line tool takes longer than the budget.
+"""
+
+import argparse, json, os, platform, statistics, subprocess, sys, tempfile, time
+
+import context
+import cmake_generator
+
+import cmake_create_class
+from CMakeClassCreator import ast, list_item_string_path, source_inserter
+
+_repository_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+_result_format_version = 1
+default_tolerance = 0.25
+default_startup_budget_ms = 60
+
+def _time(function, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return {"min": min(durations), "median": statistics.median(durations), "repeat": repeat}
+
+def _parse(full_cmake_source, backend):
+    return [match[0] for match in ast.Ast(backend).scan_all(full_cmake_source) if len(match) > 0]
+
+def _benchmark_shape(shape_name, shape, repeat, results):
+    generated = cmake_generator.generate_cmakelists(shape)
+    full_cmake_source = generated.full_cmake_source
+    full_cmake_ast = _parse(full_cmake_source, ast.HANDWRITTEN_BACKEND)
+    reference_source = list_item_string_path.PathAwareListItemString(generated.reference_class + ".cpp")
+
+    def add(name, function, repeat=repeat):
+        results["{0}/{1}".format(shape_name, name)] = _time(function, repeat)
+
+    for backend in ast.backends:
+        #the grammar is slow on large scripts, so it is timed less often
+        add("scan_all_" + backend, lambda: _parse(full_cmake_source, backend), repeat if backend == ast.HANDWRITTEN_BACKEND else max(1, repeat // 5))
+
+    add("lookup_target", lambda: source_inserter._make_inserter_for_target(full_cmake_ast, generated.target))
+    add("lookup_variable", lambda: source_inserter._make_inserter_for_variable_declaration(full_cmake_ast, generated.variable))
+    add("lookup_reference", lambda: source_inserter._make_inserter_for_item_next_to_other_source(full_cmake_ast, reference_source))
+    add("build_cmake_ast_index", lambda: source_inserter.CMakeAstIndex(full_cmake_ast))
+    cmake_ast_index = source_inserter.CMakeAstIndex(full_cmake_ast)
+    add("lookup_reference_with_index", lambda: source_inserter._make_inserter_for_item_next_to_other_source(cmake_ast_index, reference_source))
+
+    inserter = source_inserter._make_inserter_for_item_next_to_other_source(cmake_ast_index, reference_source)
+    add("whitespace_enhancement", lambda: source_inserter.insert_source_considering_existing_whitespace(inserter, "New.cpp", full_cmake_source))
+
+    with tempfile.TemporaryDirectory() as directory:
+        cmakelists_path = os.path.join(directory, "CMakeLists.txt")
+        with open(cmakelists_path, 'w') as cmakelists_file:
+            cmakelists_file.write(full_cmake_source)
+        add("create_class", lambda: cmake_create_class.create_class(cmakelists_path, "NewClass", generated.reference_class))
+        add("cli_cold_start", lambda: subprocess.run([sys.executable, os.path.join(_repository_directory, "cmake_create_class.py"), cmakelists_path, 
+            "NewClass", "-rc", generated.reference_class, "--no-daemon"], check=True, stdout=subprocess.DEVNULL), max(1, repeat // 2))
+
+def run(shape_names, repeat):
+    results = {}
+    for shape_name in shape_names:
+        _benchmark_shape(shape_name, cmake_generator.shapes[shape_name], repeat, results)
+    return {"format_version": _result_format_version, "python": platform.python_version(), "platform": platform.platform(), "benchmarks": results}
+
+def compare(baseline, current, tolerance=default_tolerance):
+    """ Returns (name, baseline median, current median, is regression) for every benchmark in both results """
+    comparisons = []
+    for name in sorted(set(baseline["benchmarks"]) & set(current["benchmarks"])):
+        baseline_median, current_median = baseline["benchmarks"][name]["median"], current["benchmarks"][name]["median"]
+        comparisons.append((name, baseline_median, current_median, current_median > baseline_median * (1 + tolerance)))
+    return comparisons
+
+def time_startup(repeat):
+    """ The median time that starting the command line tool takes on top of starting the interpreter, in seconds
+
+    The tool is started with arguments that it rejects after validating them, so nothing is read or parsed."""
+    def start(arguments):
+        return lambda: subprocess.run([sys.executable] + arguments, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    interpreter = _time(start(["-c", "pass"]), repeat)["median"]
+    validation_error = _time(start([os.path.join(_repository_directory, "cmake_create_class.py"), "CMakeLists.txt", "New\\Class"]), repeat)["median"]
+    return max(0.0, validation_error - interpreter)
+
+def _load_results(path):
+    with open(path, 'r') as results_file:
+        return json.load(results_file)
+
+def create_arg_parser():
+    parser = argparse.ArgumentParser(description="Benchmark CMake Class Creator on generated CMakeLists.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks and write the results as JSON.")
+    run_parser.add_argument("--shapes", nargs="+", choices=sorted(cmake_generator.shapes), default=["small", "medium", "large"], help="The generated CMakeLists to benchmark.")
+    run_parser.add_argument("--repeat", type=int, default=10, help="How many times every benchmark is timed.")
+    run_parser.add_argument("--output", help="The JSON file to write, stdout by default.")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare results with a baseline, exits with status 1 on a regression.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--tolerance", type=float, default=default_tolerance, help="The allowed slowdown of the median, 0.25 allows 25%% slower.")
+
+    startup_parser = subparsers.add_parser("startup", help="Time the cold start of the command line tool, exits with status 1 when it is over budget.")
+    startup_parser.add_argument("--budget-ms", type=float, default=default_startup_budget_ms, help="The allowed start up time on top of starting the interpreter.")
+    startup_parser.add_argument("--repeat", type=int, default=10, help="How many times the tool is started.")
+    return parser
+
+def main():
+    args = create_arg_parser().parse_args()
+
+    if args.command == "run":
+        results = json.dumps(run(args.shapes, args.repeat), indent=2, sort_keys=True)
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                output_file.write(results + "\n")
+        else:
+            print(results)
+        return 0
+
+    if args.command == "startup":
+        startup_ms = time_startup(args.repeat) * 1e3
+        print("{0:.1f} ms start up time, the budget is {1:.1f} ms".format(startup_ms, args.budget_ms))
+        return 1 if startup_ms > args.budget_ms else 0
+
+    comparisons = compare(_load_results(args.baseline), _load_results(args.current), args.tolerance)
+    for name, baseline_median, current_median, is_regression in comparisons:
+        print("{0:<45} {1:>12.6f} {2:>12.6f} {3:>8.2f}x{4}".format(name, baseline_median, current_median, 
+            current_median / baseline_median if baseline_median else float("inf"), "  REGRESSION" if is_regression else ""))
+    return 1 if any(comparison[3] for comparison in comparisons) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+""" Generates CMakeLists of a configurable size and shape for the benchmarks, the same shape and seed always give the same script """
+
+import random
+
+from collections import namedtuple
+
+class CMakeGeneratorException(Exception):
+    pass
+
+CMakeListsShape = namedtuple("CMakeListsShape", ["targets", "sources_per_list", "target_sources_scopes", "comment_ratio", "variable_composition_ratio", "use_tabs", "seed"])
+#the reference class, target and variable are declared exactly once, so lookups of them succeed
+#the first class of every target is never composed with a variable, so it can be used as a reference, and neither is the
+#last one because there is no location to insert after a composed list item
+GeneratedCMakeLists = namedtuple("GeneratedCMakeLists", ["full_cmake_source", "reference_class", "target", "variable"])
+
+shapes = {
+    "small": CMakeListsShape(targets=2, sources_per_list=20, target_sources_scopes=1, comment_ratio=0.1, variable_composition_ratio=0.1, use_tabs=False, seed=1),
+    "medium": CMakeListsShape(targets=20, sources_per_list=100, target_sources_scopes=2, comment_ratio=0.1, variable_composition_ratio=0.2, use_tabs=True, seed=2),
+    "large": CMakeListsShape(targets=100, sources_per_list=400, target_sources_scopes=3, comment_ratio=0.05, variable_composition_ratio=0.2, use_tabs=False, seed=3)}
+
+_scopes = ["PRIVATE", "PUBLIC", "INTERFACE"]
+
+def _make_source_item(random_generator, shape, stem, extension, composable=True):
+    if composable and random_generator.random() < shape.variable_composition_ratio:
+        return "${CMAKE_CURRENT_SOURCE_DIR}/src/" + stem + extension
+    return "src/" + stem + extension
+
+def _write_list(lines, random_generator, shape, items):
+    indentation = "\t" if shape.use_tabs else "    "
+    for item in items:
+        if random_generator.random() < shape.comment_ratio:
+            lines.append(indentation + "# {} is generated".format(item))
+        lines.append(indentation + item)
+
+def generate_cmakelists(shape):
+    if shape.targets < 1 or shape.sources_per_list < 1 or not 0 <= shape.target_sources_scopes <= len(_scopes):
+        raise CMakeGeneratorException("A generated CMakeLists needs at least one target with one source, and at most {} target_sources scopes".format(len(_scopes)))
+
+    random_generator = random.Random(shape.seed)
+    lines = ["cmake_minimum_required(VERSION 3.10)", "project(Generated)", ""]
+    for target_index in range(shape.targets):
+        target = "Target{}".format(target_index)
+        stems = ["{0}Class{1}".format(target, class_index) for class_index in range(shape.sources_per_list // 2 or 1)]
+
+        lines.append("set({}_Headers".format(target))
+        _write_list(lines, random_generator, shape, [_make_source_item(random_generator, shape, stem, ".hpp", 0 < index < len(stems) - 1) for index, stem in enumerate(stems)])
+        lines.append(")")
+        lines.append("set({}_Sources".format(target))
+        _write_list(lines, random_generator, shape, [_make_source_item(random_generator, shape, stem, ".cpp", 0 < index < len(stems) - 1) for index, stem in enumerate(stems)])
+        lines.append(")")
+        lines.append("add_library({0} ${{{0}_Headers}} ${{{0}_Sources}})".format(target))
+
+        for scope_index in range(shape.target_sources_scopes):
+            lines.append("target_sources({0} {1}".format(target, _scopes[scope_index]))
+            _write_list(lines, random_generator, shape, ["src/{0}{1}Extra{2}.cpp".format(target, _scopes[scope_index].title(), index) 
+                for index in range(max(1, shape.sources_per_list // 10))])
+            lines.append(")")
+        lines.append("")
+
+    middle_target = "Target{}".format(shape.targets // 2)
+    return GeneratedCMakeLists("\n".join(lines), "{}Class0".format(middle_target), middle_target, "{}_Sources".format(middle_target))
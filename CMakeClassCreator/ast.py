@@ -1,22 +1,49 @@
-from CMakeClassCreator.parser import Parser
+from CMakeClassCreator import lazy_import, profiling
+import re
 from abc import ABC, abstractmethod
+from array import array
+from collections.abc import Sequence
+from threading import Lock
+
+PYPARSING_BACKEND = "pyparsing"
+HANDWRITTEN_BACKEND = "handwritten"
+backends = [PYPARSING_BACKEND, HANDWRITTEN_BACKEND]
+
+#increase this whenever the grammar (or the hand-written parser) matches something else, so cached ASTs are invalidated
+grammar_version = 1
+
+#the parsers are only imported when something is parsed, the parser module imports all of pyparsing
+_parser_module = lazy_import.lazy_import("CMakeClassCreator.parser")
+handwritten_parser = lazy_import.lazy_import("CMakeClassCreator.handwritten_parser")
+statement_spans = lazy_import.lazy_import("CMakeClassCreator.statement_spans")
+
+class AstException(Exception):
+    pass
 
 class _LocationTrait(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def get_location(self):
         pass
 
 class _EndLocationTrait(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def get_end_location(self):
         pass
 
 ### AST components ###
 class VariableUseTerminator(object):
+    __slots__ = ("location",)
+
     def __init__(self, location):
         self.location = location
 
 class VariableUse(object):
+    __slots__ = ("var_name",)
+
     def __init__(self, var_name):
         self.var_name = var_name
 
@@ -25,6 +52,8 @@ class VariableUse(object):
                 and self.var_name == other.var_name
 
 class VariableUseWithLocation(VariableUse, _LocationTrait):
+    __slots__ = ("location",)
+
     def __init__(self, var_name, location):
         super().__init__(var_name)
         self.location = location
@@ -41,6 +70,8 @@ class VariableUseWithLocation(VariableUse, _LocationTrait):
         return self.location
 
 class VariableUseWithStartAndEndLocation(VariableUseWithLocation, _EndLocationTrait):
+    __slots__ = ("terminator",)
+
     def __init__(self, var_name, location, terminator):
         super().__init__(var_name, location)
         self.terminator = terminator
@@ -49,6 +80,8 @@ class VariableUseWithStartAndEndLocation(VariableUseWithLocation, _EndLocationTr
         return self.terminator.location
 
 class ListItemString(object):
+    __slots__ = ("list_item_string",)
+
     def __init__(self, list_item_string):
         self.list_item_string = list_item_string
         
@@ -57,6 +90,8 @@ class ListItemString(object):
             and self.list_item_string == other.list_item_string 
                 
 class ListItemStringWithLocation(ListItemString, _LocationTrait, _EndLocationTrait):
+    __slots__ = ("location",)
+
     def __init__(self, list_item_string, location):
         super().__init__(list_item_string)
         self.location = location
@@ -76,8 +111,10 @@ class ListItemStringWithLocation(ListItemString, _LocationTrait, _EndLocationTra
         return self.location + len(self.list_item_string)
 
 class CMakeStringList(object):
+    __slots__ = ("items",)
+
     def __init__(self, items):
-        self.items = items
+        self.items = list(items) #a copy, so no pyparsing results are kept alive
 
     def is_same(self, other):
         if not isinstance(other, CMakeStringList):
@@ -93,6 +130,8 @@ class CMakeStringList(object):
         return True
 
 class SetNormalVariable(object):
+    __slots__ = ("var_name", "cmake_string_list")
+
     def __init__(self, var_name, cmake_string_list):
         self.var_name = var_name
         self.cmake_string_list = cmake_string_list
@@ -103,6 +142,8 @@ class SetNormalVariable(object):
             and self.cmake_string_list.is_same(other.cmake_string_list)
 
 class AddLibrary(object):
+    __slots__ = ("library_name", "cmake_string_list")
+
     def __init__(self, library_name, cmake_string_list):
         self.library_name = library_name
         self.cmake_string_list = cmake_string_list
@@ -113,6 +154,8 @@ class AddLibrary(object):
             and self.cmake_string_list.is_same(other.cmake_string_list)
 
 class AddExecutable(object):
+    __slots__ = ("executable_name", "cmake_string_list")
+
     def __init__(self, executable_name, cmake_string_list):
         self.executable_name = executable_name
         self.cmake_string_list = cmake_string_list
@@ -123,6 +166,8 @@ class AddExecutable(object):
             and self.cmake_string_list.is_same(other.cmake_string_list)
 
 class TargetSources(object):
+    __slots__ = ("target_name", "cmake_string_list")
+
     def __init__(self, target_name, cmake_string_list):
         self.target_name = target_name
         self.cmake_string_list = cmake_string_list
@@ -131,8 +176,106 @@ class TargetSources(object):
         return isinstance(other, TargetSources) \
             and self.target_name == other.target_name \
             and self.cmake_string_list.is_same(other.cmake_string_list)
+LIST_ITEM_STRING_KIND, VARIABLE_USE_KIND, COMPOSED_LIST_ITEM_KIND = range(3)
+
+class _CompactListItems(Sequence):
+    """ The items of a compact cmake string list, an AST component is made each time an item is accessed """
+    __slots__ = ("cmake_string_list",)
+
+    def __init__(self, cmake_string_list):
+        self.cmake_string_list = cmake_string_list
+
+    def __len__(self):
+        return len(self.cmake_string_list.kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.cmake_string_list.make_item(item_index) for item_index in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("cmake string list index out of range")
+        return self.cmake_string_list.make_item(index)
+
+class CompactCMakeStringList(CMakeStringList):
+    """ A cmake string list that only keeps the kind, start and end of each item in typed arrays
+
+    The text of an item is sliced from the cmake source when the item is accessed. Locations are relative to the given
+    cmake source and are moved by location_offset, which allows the source to be a part of a larger cmake source."""
+    __slots__ = ("full_cmake_source", "kinds", "starts", "ends", "location_offset")
+
+    def __init__(self, full_cmake_source, kinds=None, starts=None, ends=None, location_offset=0):
+        self.full_cmake_source = full_cmake_source
+        self.kinds = kinds if kinds is not None else array("b")
+        self.starts = starts if starts is not None else array("q")
+        self.ends = ends if ends is not None else array("q")
+        self.location_offset = location_offset
+
+    @property
+    def items(self):
+        return _CompactListItems(self)
+
+    def append_item(self, kind, start, end):
+        self.kinds.append(kind)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def extend(self, other):
+        self.kinds.extend(other.kinds)
+        self.starts.extend(other.starts)
+        self.ends.extend(other.ends)
+
+    def keep_own_source_only(self):
+        """ Replaces the cmake source by the slice from the first to the last item, so a list doesn't keep a large source alive """
+        if not self.kinds:
+            return self
+        start, end = self.starts[0], self.ends[-1]
+        self.full_cmake_source = self.full_cmake_source[start:end]
+        self.starts = array("q", (item_start - start for item_start in self.starts))
+        self.ends = array("q", (item_end - start for item_end in self.ends))
+        self.location_offset += start
+        return self
+
+    def make_item(self, index):
+        kind, start, end = self.kinds[index], self.starts[index], self.ends[index]
+        if kind == COMPOSED_LIST_ITEM_KIND:
+            return self.full_cmake_source[start:end]
+        if kind == LIST_ITEM_STRING_KIND:
+            return ListItemStringWithLocation(self.full_cmake_source[start:end], start + self.location_offset)
+
+        var_name = handwritten_parser._find_variable_name_in_variable_use(self.full_cmake_source, start)
+        return VariableUseWithStartAndEndLocation(var_name, start + self.location_offset, VariableUseTerminator(end + self.location_offset))
 ### AST components END ###
 
+def _make_mention_check(name):
+    """ None without a name, otherwise a check whether a text contains the name, or one of the names of a collection """
+    if name is None:
+        return None
+    if isinstance(name, str):
+        return lambda text: name in text
+    if not name:
+        return lambda text: False
+    names_regex = re.compile("|".join(re.escape(one_name) for one_name in name))
+    return lambda text: names_regex.search(text) is not None
+
+def shift_locations(ast_item, offset):
+    """ Moves all locations in the given AST component by offset characters """
+    if hasattr(ast_item, "cmake_string_list"):
+        ast_item = ast_item.cmake_string_list
+    if isinstance(ast_item, CompactCMakeStringList):
+        ast_item.location_offset += offset
+        return
+    if isinstance(ast_item, CMakeStringList):
+        for item in ast_item.items:
+            shift_locations(item, offset)
+        return
+
+    if hasattr(ast_item, "location"):
+        ast_item.location += offset
+    if hasattr(ast_item, "terminator"):
+        ast_item.terminator.location += offset
+
 def _parse_variable_use_terminator(s, loc, toks):
     return VariableUseTerminator(loc+1)
 
@@ -181,36 +324,127 @@ def _parse_target_sources_action(s, loc, toks):
             cmake_string_list.items += list(scoped_cmake_string_list.items) 
     return TargetSources(target_name, cmake_string_list)
 
-class Ast(object):
-    def __init__(self):
-        self._parser = Parser()
+def _make_grammar():
+    """ Builds the pyparsing grammar with the parse actions that turn matches into AST components """
+    parser = _parser_module.Parser()
+
+    parser._cmake_stmt.parseWithTabs() #cmake source may contain tabs, this ensures that match locations consider tabs as one character
 
-        self._parser._cmake_stmt.parseWithTabs() #cmake source may contain tabs, this ensures that match locations consider tabs as one character
+    parser._variable_use_terminator.setParseAction(_parse_variable_use_terminator)
+    parser._variable_use_in_quotes_terminator.setParseAction(_parse_variable_use_in_quotes_terminator)
 
-        self._parser._variable_use_terminator.setParseAction(_parse_variable_use_terminator)
-        self._parser._variable_use_in_quotes_terminator.setParseAction(_parse_variable_use_in_quotes_terminator)
+    parser._standalone_variable_use.setParseAction(_parse_standalone_variable_use_action)
+    parser._equivalent_variable_use_in_quotes.setParseAction(_parse_standalone_variable_use_in_quotes_action)
+    parser._variable_use_to_compose_list_item.setParseAction(_parse_variable_use_to_compose_list_item)
 
-        self._parser._standalone_variable_use.setParseAction(_parse_standalone_variable_use_action)
-        self._parser._equivalent_variable_use_in_quotes.setParseAction(_parse_standalone_variable_use_in_quotes_action)
-        self._parser._variable_use_to_compose_list_item.setParseAction(_parse_variable_use_to_compose_list_item)
+    parser._string_list_item.setParseAction(_parse_list_item_string_action)
+    parser._cmake_list_content.setParseAction(_parse_cmake_string_list_action)
 
-        self._parser._string_list_item.setParseAction(_parse_list_item_string_action)
-        self._parser._cmake_list_content.setParseAction(_parse_cmake_string_list_action)
+    parser._set_normal_variable_stmt.setParseAction(_parse_set_normal_variable_action)
 
-        self._parser._set_normal_variable_stmt.setParseAction(_parse_set_normal_variable_action)
+    parser._add_library_stmt.setParseAction(_parse_add_library_action)
+    parser._add_normal_executable_stmt.setParseAction(_parse_add_normal_executable_action)
+    parser._target_sources_stmt.setParseAction(_parse_target_sources_action)
 
-        self._parser._add_library_stmt.setParseAction(_parse_add_library_action)
-        self._parser._add_normal_executable_stmt.setParseAction(_parse_add_normal_executable_action)
-        self._parser._target_sources_stmt.setParseAction(_parse_target_sources_action)
+    #pyparsing does this on the first parse, doing it here keeps it out of every parse that follows
+    parser._cmake_stmt.streamline()
+    for ignore_expr in parser._cmake_stmt.ignoreExprs:
+        ignore_expr.streamline()
 
+    return parser
+
+class Ast(object):
+    """ Parses cmake source into AST components
+
+    The backend is either the pyparsing grammar from the parser module or the equivalent hand-written parser, which is much faster on large files.
+    The grammar is only built when it is first needed, and is kept for every parse that follows."""
+    def __init__(self, backend=PYPARSING_BACKEND):
+        if backend not in backends:
+            raise AstException("Unknown parser backend {0}, choose one of {1}".format(backend, backends))
+
+        self.backend = backend
+        self._grammar = None
+        self._grammar_lock = Lock()
+        self._handwritten_parser = handwritten_parser.HandwrittenParser()
+
+    @property
+    def _parser(self):
+        with self._grammar_lock:
+            if self._grammar is None:
+                with profiling.phase("grammar"):
+                    self._grammar = _make_grammar()
+            return self._grammar
 
     def parse(self, string):
+        if self.backend == HANDWRITTEN_BACKEND:
+            return self._handwritten_parser.parse(string)
+
         return self._parser._cmake_stmt.parseString(string)
 
     def scan_all(self, string):
         """ Scan the given string for supported cmake grammar, ignores unsupported content and returns all matches"""
+        if self.backend == HANDWRITTEN_BACKEND:
+            return self._handwritten_parser.scan_all(string)
+
+        #the grammar is only tried where a candidate statement starts, which gives the same matches as scanString at a fraction of the cost
         matches = []
-        for (match, start, end) in self._parser._cmake_stmt.scanString(string):
-            matches.append(match)
-        return matches
-        
+        position = 0
+        cmake_stmt = self._parser._cmake_stmt
+        while True:
+            span = statement_spans.find_next_statement_span(string, position)
+            if span is None:
+                return matches
+
+            try:
+                position, match = cmake_stmt._parse(string, span.location)
+                matches.append(match)
+            except _parser_module.ParseException:
+                position = span.location + 1
+
+    def iter_statements(self, string, name=None):
+        """ Lazily parse the supported cmake statements, one statement per iteration
+
+        When a name (of a target, a variable or a source file), or a collection of names, is given, statements that don't contain
+        one of them anywhere in their text are skipped without being parsed. Ignored statements such as set(ENV{...}) are not yielded."""
+        is_mentioned = _make_mention_check(name)
+        position = 0
+        while True:
+            span = statement_spans.find_next_statement_span(string, position)
+            if span is None:
+                return
+
+            if is_mentioned is not None and not is_mentioned(span.get_text(string)):
+                position = span.get_end_location()
+                continue
+
+            ast_item_and_end = self._parse_statement_at(string, span.get_location())
+            if ast_item_and_end is None:
+                position = span.get_location() + 1
+                continue
+
+            ast_item, position = ast_item_and_end
+            if ast_item is not None:
+                yield ast_item
+
+    def _parse_statement_at(self, string, location):
+        if self.backend == HANDWRITTEN_BACKEND:
+            return self._handwritten_parser.parse_at(string, location)
+
+        try:
+            end, match = self._parser._cmake_stmt._parse(string, location)
+        except _parser_module.ParseException:
+            return None
+        return (match[0] if len(match) > 0 else None), end
+
+_shared_asts = {}
+_shared_asts_lock = Lock()
+
+def get_shared_ast(backend=PYPARSING_BACKEND):
+    """ Returns the Ast for the given settings that is shared by every caller in this process
+
+    Parsing doesn't change an Ast, so the shared instance can be reused for any number of parses"""
+    with _shared_asts_lock:
+        if backend not in _shared_asts:
+            #the pyparsing grammar is timed where Ast makes it, timing it here as well would count it twice
+            _shared_asts[backend] = Ast(backend)
+        return _shared_asts[backend]
@@ -0,0 +1,316 @@
+""" An on-disk cache of the AST of cmake scripts, so a script that didn't change doesn't have to be parsed again
+
+An AST is stored under a key made from a hash of the file content, the version of the grammar, the parser backend and the
+encoding used to read the file. When the caller already read the file, the content it read is hashed instead of the file.
+Hashing the content is skipped when the modification time and size of the file are the same as when it was last hashed. The cache directory is kept small by removing the entries that weren't used for the
+longest time, and the entries that are older than a maximum age.
+"""
+
+import hashlib, locale, os, time
+
+from collections import OrderedDict
+
+from CMakeClassCreator import ast
+
+class AstCacheException(Exception):
+    pass
+
+_format_version = 1
+_magic = b"CCCAST"
+_entry_suffix = ".ast"
+_path_record_suffix = ".path"
+
+#a file changed within this many seconds of being hashed may change again without its modification time changing
+_racy_modification_seconds = 2
+_hash_block_size = 1 << 20
+
+default_max_total_size = 64 * 1024 * 1024
+default_max_age_seconds = 30 * 24 * 60 * 60
+default_max_in_memory_entries = 64
+
+_statement_types = [ast.SetNormalVariable, ast.AddLibrary, ast.AddExecutable, ast.TargetSources]
+_list_item_string, _variable_use, _composed_list_item = range(3)
+
+def _statement_name(statement):
+    if isinstance(statement, ast.SetNormalVariable):
+        return statement.var_name
+    if isinstance(statement, ast.AddLibrary):
+        return statement.library_name
+    if isinstance(statement, ast.AddExecutable):
+        return statement.executable_name
+    return statement.target_name
+
+def _write_unsigned(output, value):
+    while value >= 0x80:
+        output.append((value & 0x7f) | 0x80)
+        value >>= 7
+    output.append(value)
+
+def _write_text(output, text):
+    encoded = text.encode("utf-8")
+    _write_unsigned(output, len(encoded))
+    output += encoded
+
+def _encode_list_item(output, item):
+    if isinstance(item, ast.ListItemStringWithLocation):
+        output.append(_list_item_string)
+        _write_text(output, item.list_item_string)
+        _write_unsigned(output, item.location)
+    elif isinstance(item, ast.VariableUseWithStartAndEndLocation):
+        output.append(_variable_use)
+        _write_text(output, item.var_name)
+        _write_unsigned(output, item.location)
+        _write_unsigned(output, item.terminator.location)
+    elif isinstance(item, str):
+        output.append(_composed_list_item)
+        _write_text(output, item)
+    else:
+        raise AstCacheException("Can't store a list item of type {}".format(type(item).__name__))
+
+def encode_ast(full_cmake_ast):
+    """ Turns a list of AST components into the compact binary format of a cache entry """
+    output = bytearray(_magic)
+    _write_unsigned(output, _format_version)
+    _write_unsigned(output, len(full_cmake_ast))
+    for statement in full_cmake_ast:
+        if type(statement) not in _statement_types:
+            raise AstCacheException("Can't store an AST component of type {}".format(type(statement).__name__))
+
+        output.append(_statement_types.index(type(statement)))
+        _write_text(output, _statement_name(statement))
+        _write_unsigned(output, len(statement.cmake_string_list.items))
+        for item in statement.cmake_string_list.items:
+            _encode_list_item(output, item)
+    return bytes(output)
+
+class _Reader(object):
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def read_byte(self):
+        if self.position >= len(self.data):
+            raise AstCacheException("The cache entry is truncated")
+        self.position += 1
+        return self.data[self.position - 1]
+
+    def read_unsigned(self):
+        value, shift = 0, 0
+        while True:
+            byte = self.read_byte()
+            value |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return value
+            shift += 7
+
+    def read_text(self):
+        length = self.read_unsigned()
+        if self.position + length > len(self.data):
+            raise AstCacheException("The cache entry is truncated")
+        self.position += length
+        return self.data[self.position - length:self.position].decode("utf-8")
+
+def _decode_list_item(reader):
+    kind = reader.read_byte()
+    if kind == _list_item_string:
+        return ast.ListItemStringWithLocation(reader.read_text(), reader.read_unsigned())
+    if kind == _variable_use:
+        var_name, location = reader.read_text(), reader.read_unsigned()
+        return ast.VariableUseWithStartAndEndLocation(var_name, location, ast.VariableUseTerminator(reader.read_unsigned()))
+    if kind == _composed_list_item:
+        return reader.read_text()
+    raise AstCacheException("Unknown list item kind {} in cache entry".format(kind))
+
+def decode_ast(data):
+    """ Turns a cache entry back into a list of AST components """
+    if not data.startswith(_magic):
+        raise AstCacheException("This is not an AST cache entry")
+
+    reader = _Reader(data)
+    reader.position = len(_magic)
+    if reader.read_unsigned() != _format_version:
+        raise AstCacheException("The cache entry has an unsupported format version")
+
+    full_cmake_ast = []
+    for _ in range(reader.read_unsigned()):
+        statement_type = reader.read_byte()
+        if statement_type >= len(_statement_types):
+            raise AstCacheException("Unknown statement kind {} in cache entry".format(statement_type))
+
+        name = reader.read_text()
+        items = [_decode_list_item(reader) for _ in range(reader.read_unsigned())]
+        full_cmake_ast.append(_statement_types[statement_type](name, ast.CMakeStringList(items)))
+    return full_cmake_ast
+
+def _hash_file_content(cmakelists_path):
+    content_hash = hashlib.blake2b(digest_size=16)
+    with open(cmakelists_path, 'rb') as cmakelists_file:
+        for block in iter(lambda: cmakelists_file.read(_hash_block_size), b""):
+            content_hash.update(block)
+    return content_hash.hexdigest()
+
+def _hash_source(full_cmake_source):
+    """ The hash of a cmake script that was read, as a string or a mapped_source.MappedCMakeSource """
+    content_hash = hashlib.blake2b(digest_size=16)
+    if isinstance(full_cmake_source, str):
+        content_hash.update(full_cmake_source.encode("utf-8", "surrogatepass"))
+    else:
+        full_cmake_source.update_hash(content_hash)
+    return content_hash.hexdigest()
+
+def _is_unchanged(cmakelists_stat, file_stat):
+    """ Whether the file is still the one of the stat that was taken before it was read """
+    return cmakelists_stat is not None and (cmakelists_stat.st_ino, cmakelists_stat.st_mtime_ns, cmakelists_stat.st_size) \
+        == (file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+
+def _write_atomically(path, data):
+    temporary_path = "{0}.{1}.tmp".format(path, os.getpid())
+    with open(temporary_path, 'wb') as temporary_file:
+        temporary_file.write(data)
+    os.replace(temporary_path, path)
+
+class AstCache(object):
+    def __init__(self, directory, max_total_size=default_max_total_size, max_age_seconds=default_max_age_seconds):
+        if max_total_size < 0 or max_age_seconds < 0:
+            raise AstCacheException("The maximum size and age of the cache can't be negative")
+
+        self.directory = directory
+        self.max_total_size = max_total_size
+        self.max_age_seconds = max_age_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def _path_record_path(self, cmakelists_path):
+        path_hash = hashlib.blake2b(os.path.abspath(cmakelists_path).encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, path_hash + _path_record_suffix)
+
+    def _get_content_hash(self, cmakelists_path, full_cmake_source=None, cmakelists_stat=None):
+        """ Uses the hash recorded for the file when its modification time and size are unchanged
+
+        The cmake source that the caller read is hashed instead of the file, then the recorded hash is only used when
+        cmakelists_stat was taken before the read and the file didn't change since."""
+        file_stat = os.stat(cmakelists_path)
+        is_read_file = full_cmake_source is None or _is_unchanged(cmakelists_stat, file_stat)
+        path_record_path = self._path_record_path(cmakelists_path)
+        try:
+            with open(path_record_path, 'r') as path_record:
+                modification_time, size, content_hash = path_record.read().split()
+            if is_read_file and int(modification_time) == file_stat.st_mtime_ns and int(size) == file_stat.st_size:
+                return content_hash
+        except (OSError, ValueError):
+            pass
+
+        content_hash = _hash_file_content(cmakelists_path) if full_cmake_source is None else _hash_source(full_cmake_source)
+        if is_read_file and time.time() - file_stat.st_mtime > _racy_modification_seconds:
+            _write_atomically(path_record_path, "{0} {1} {2}".format(file_stat.st_mtime_ns, file_stat.st_size, content_hash).encode("utf-8"))
+        return content_hash
+
+    def _entry_path(self, content_hash, parser_backend):
+        key = "|".join([str(_format_version), str(ast.grammar_version), parser_backend, locale.getpreferredencoding(False), content_hash])
+        return os.path.join(self.directory, hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest() + _entry_suffix)
+
+    def load(self, cmakelists_path, parser_backend=ast.HANDWRITTEN_BACKEND):
+        """ Returns the cached AST of the given file, or None when it isn't cached """
+        return self._load_entry(self._entry_path(self._get_content_hash(cmakelists_path), parser_backend))
+
+    def _load_entry(self, entry_path):
+        try:
+            with open(entry_path, 'rb') as entry:
+                full_cmake_ast = decode_ast(entry.read())
+            os.utime(entry_path) #entries that are used are the last to be evicted
+            return full_cmake_ast
+        except OSError:
+            return None
+        except AstCacheException:
+            self._remove(entry_path)
+            return None
+
+    def store(self, cmakelists_path, full_cmake_ast, parser_backend=ast.HANDWRITTEN_BACKEND):
+        self._store_entry(self._entry_path(self._get_content_hash(cmakelists_path), parser_backend), full_cmake_ast)
+
+    def _store_entry(self, entry_path, full_cmake_ast):
+        _write_atomically(entry_path, encode_ast(full_cmake_ast))
+        self.evict()
+
+    def load_or_parse(self, cmakelists_path, parse, parser_backend=ast.HANDWRITTEN_BACKEND, full_cmake_source=None, cmakelists_stat=None):
+        """ Returns the cached AST of the given file, or calls parse and stores its result
+
+        parse should parse full_cmake_source when it is given, which is the content of the file that the caller read
+        after taking cmakelists_stat, so the file isn't read again."""
+        file_stat = os.stat(cmakelists_path)
+        entry_path = self._entry_path(self._get_content_hash(cmakelists_path, full_cmake_source, cmakelists_stat), parser_backend)
+        full_cmake_ast = self._load_entry(entry_path)
+        if full_cmake_ast is not None:
+            return full_cmake_ast
+
+        full_cmake_ast = parse()
+        #without the read cmake source, the AST doesn't belong to the hashed content when the file changed in the meantime
+        if full_cmake_source is not None or os.stat(cmakelists_path).st_mtime_ns == file_stat.st_mtime_ns:
+            self._store_entry(entry_path, full_cmake_ast)
+        return full_cmake_ast
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass #already removed by another process
+
+    def evict(self):
+        """ Removes the entries that are too old, then the least recently used entries until the cache is small enough """
+        entries = []
+        oldest_allowed_time = time.time() - self.max_age_seconds
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith((_entry_suffix, _path_record_suffix)):
+                continue
+            path = os.path.join(self.directory, file_name)
+            try:
+                entry_stat = os.stat(path)
+            except OSError:
+                continue #already removed by another process
+
+            if entry_stat.st_mtime < oldest_allowed_time:
+                self._remove(path)
+            elif file_name.endswith(_entry_suffix):
+                entries.append((entry_stat.st_mtime, entry_stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_total_size:
+                break
+            self._remove(path)
+            total_size -= size
+
+class InMemoryAstCache(object):
+    """ Keeps the ASTs in memory for a process that edits the same cmake scripts many times, such as the daemon
+
+    It can be used wherever an AstCache is accepted. A changed modification time or size only causes a new parse when the
+    content hash changed as well."""
+    def __init__(self, max_entries=default_max_in_memory_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() #(path, parser backend) -> [modification time, size, stat is reliable, content hash, AST]
+
+    def load_or_parse(self, cmakelists_path, parse, parser_backend=ast.HANDWRITTEN_BACKEND, full_cmake_source=None, cmakelists_stat=None):
+        """ The same as AstCache.load_or_parse """
+        key = (os.path.abspath(cmakelists_path), parser_backend)
+        file_stat = os.stat(cmakelists_path)
+        #the modification time and size only tell the content of the read cmake source when the file didn't change since it was read
+        is_read_file = full_cmake_source is None or _is_unchanged(cmakelists_stat, file_stat)
+        stat_is_reliable = is_read_file and time.time() - file_stat.st_mtime > _racy_modification_seconds
+        entry = self._entries.get(key)
+        if is_read_file and entry is not None and entry[2] and (entry[0], entry[1]) == (file_stat.st_mtime_ns, file_stat.st_size):
+            self._entries.move_to_end(key)
+            return entry[4]
+
+        content_hash = _hash_file_content(cmakelists_path) if full_cmake_source is None else _hash_source(full_cmake_source)
+        if entry is not None and entry[3] == content_hash:
+            entry[:3] = [file_stat.st_mtime_ns, file_stat.st_size, stat_is_reliable]
+            self._entries.move_to_end(key)
+            return entry[4]
+
+        full_cmake_ast = parse()
+        #without the read cmake source, the AST doesn't belong to the hashed content when the file changed in the meantime
+        if full_cmake_source is not None or os.stat(cmakelists_path).st_mtime_ns == file_stat.st_mtime_ns:
+            self._entries[key] = [file_stat.st_mtime_ns, file_stat.st_size, stat_is_reliable, content_hash, full_cmake_ast]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return full_cmake_ast
@@ -1,4 +1,6 @@
-from CMakeClassCreator import source_inserter
+import os
+
+from CMakeClassCreator import list_item_string_path, source_inserter
 
 class ClassInserterException(Exception):
     pass
@@ -6,6 +8,29 @@ class ClassInserterException(Exception):
 _implementation_extensions = [".c", ".C", ".c++", ".cc", ".cpp", ".cxx"]
 _header_extensions = [".hpp", ".h", ".hh", ".h++", ".hpp", ".hxx"]
 
+class ClassStemIndex(object):
+    """ The list items of the class files in a cmake ast by class stem (the file name without extension) and extension, built in a single pass
+
+    It can be given to the functions of this module instead of a cmake ast, so every class lookup is a dict access."""
+    def __init__(self, cmake_ast):
+        self.cmake_ast_index = cmake_ast if isinstance(cmake_ast, source_inserter.CMakeAstIndex) else source_inserter.CMakeAstIndex(cmake_ast)
+        self.class_files = {} #stem -> {extension -> (statement, item index) pairs}
+
+        class_file_extensions = set(_header_extensions + _implementation_extensions)
+        for source_file_name, statements_and_items in self.cmake_ast_index.source_items.items():
+            stem, extension = os.path.splitext(source_file_name)
+            if extension in class_file_extensions:
+                self.class_files.setdefault(stem, {})[extension] = statements_and_items
+
+    def find_class_files(self, reference_class_name):
+        """ Maps every extension with which the reference class (a string or a PathAwareListItemString) is listed to the statements and list items """
+        found_class_files = {}
+        for extension in self.class_files.get(list_item_string_path.get_reference_source_file_name(reference_class_name), {}):
+            statements_and_items = self.cmake_ast_index.find_source_items(reference_class_name + extension)
+            if statements_and_items:
+                found_class_files[extension] = statements_and_items
+        return found_class_files
+
 def insert_class_next_to_other_class(cmake_ast, class_name, reference_class_name):
     def inserter_and_source_to_action_considering_whitespace(inserter_with_reference, extension):
         return inserter_with_reference.inserter.insert_source(class_name + extension)
@@ -13,9 +38,10 @@ def insert_class_next_to_other_class(cmake_ast, class_name, reference_class_name
     return _insert_class_next_to_other_class_with_inserter_enhancement(cmake_ast, class_name, reference_class_name, \
         inserter_and_source_to_action_considering_whitespace)
 
-def insert_class_next_to_other_class_with_whitespace_enhancement(full_cmake_source, cmake_ast, class_name, reference_class_name):
+def insert_class_next_to_other_class_with_whitespace_enhancement(full_cmake_source, cmake_ast, class_name, reference_class_name, sorted_insertion=False):
     def inserter_and_source_to_action_considering_whitespace(inserter_with_reference, extension):
-        return source_inserter.insert_source_considering_existing_whitespace(inserter_with_reference, class_name + extension, full_cmake_source)
+        return source_inserter.insert_source_considering_existing_whitespace(inserter_with_reference, class_name + extension, full_cmake_source, 
+            sorted_insertion)
 
     return _insert_class_next_to_other_class_with_inserter_enhancement(cmake_ast, class_name, reference_class_name, \
         inserter_and_source_to_action_considering_whitespace)
@@ -24,27 +50,29 @@ def _insert_class_next_to_other_class_with_inserter_enhancement(cmake_ast, class
     """ This function is agnostic about which enhancement will be done. 
     
     Customize the enhancement by providing a function as argument 'inserter_and_extension_to_action' and apply the enhancement therein"""
-    header_inserter, header_extension = _make_inserter_for_item_next_to_other_source(cmake_ast, reference_class_name, _header_extensions)
-
-    if not header_inserter:
-        raise ClassInserterException("The header file of reference class {0} can't be found in (supported) cmake statements, tried extensions {1}".format( \
-            reference_class_name, _header_extensions))
+    class_stem_index = cmake_ast if isinstance(cmake_ast, ClassStemIndex) else ClassStemIndex(cmake_ast)
+    class_files = class_stem_index.find_class_files(reference_class_name)
 
-    implementation_inserter, implementation_extension = _make_inserter_for_item_next_to_other_source(cmake_ast, reference_class_name, _implementation_extensions)
-
-    if not implementation_inserter:
-        raise ClassInserterException("The implementation file of reference class {0} can't be found in (supported) cmake statements, tried extensions {1}".format( \
-            reference_class_name, _implementation_extensions))
+    header_inserter, header_extension = _make_inserter_for_class_file(class_stem_index, class_files, reference_class_name, _header_extensions, "header")
+    implementation_inserter, implementation_extension = _make_inserter_for_class_file(class_stem_index, class_files, reference_class_name, 
+        _implementation_extensions, "implementation")
 
     return (inserter_and_extension_to_action(header_inserter, header_extension), 
         inserter_and_extension_to_action(implementation_inserter, implementation_extension))
 
-def _make_inserter_for_item_next_to_other_source(cmake_ast, reference_source_name, extensions):
-    for extension in extensions:
-        try:
-            inserter = source_inserter._make_inserter_for_item_next_to_other_source(cmake_ast, reference_source_name + extension)
-            return inserter, extension
-            break
-        except source_inserter.SourceInserterException:
-            pass
-    return (None, None)
\ No newline at end of file
+def find_class_file_extension(class_files, reference_class_name, extensions, file_kind):
+    """ The only one of the extensions with which the reference class is listed, class_files is the result of ClassStemIndex.find_class_files """
+    found_extensions = [extension for extension in dict.fromkeys(extensions) if extension in class_files]
+    if not found_extensions:
+        raise ClassInserterException("The {0} file of reference class {1} can't be found in (supported) cmake statements, tried extensions {2}".format( \
+            file_kind, reference_class_name, extensions))
+    if len(found_extensions) > 1:
+        raise ClassInserterException("The reference class {0} has more than one {1} file, found extensions {2}".format(reference_class_name, file_kind, found_extensions))
+    return found_extensions[0]
+
+def _make_inserter_for_class_file(class_stem_index, class_files, reference_class_name, extensions, file_kind):
+    extension = find_class_file_extension(class_files, reference_class_name, extensions, file_kind)
+    try:
+        return source_inserter._make_inserter_for_item_next_to_other_source(class_stem_index.cmake_ast_index, reference_class_name + extension), extension
+    except source_inserter.SourceInserterException as e:
+        raise ClassInserterException(str(e))
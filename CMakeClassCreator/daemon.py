@@ -0,0 +1,186 @@
+""" A JSON-RPC 2.0 server on a Unix domain socket, so a long running process can keep its parsed cmake scripts in memory
+
+Requests and responses are JSON objects on a single line. Only named parameters are supported. Every client connection
+is handled in its own thread, but the methods are called one at a time because they share their caches. The server shuts
+down when it didn't handle a request for the idle timeout.
+"""
+
+import inspect, json, os, socket, socketserver, stat, tempfile, threading, time
+
+class DaemonException(Exception):
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code #the JSON-RPC error code when the daemon answered with an error
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+APPLICATION_ERROR = 1
+
+default_idle_timeout_seconds = 15 * 60
+#how long a client waits for the answer, a busy or hung daemon shouldn't block it forever
+default_call_timeout_seconds = 30
+_shutdown_method = "shutdown"
+
+def default_socket_path():
+    """ Without $XDG_RUNTIME_DIR, the socket gets a directory of its own in the shared temporary directory, see is_trusted_socket """
+    runtime_directory = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_directory:
+        return os.path.join(runtime_directory, "cmake_class_creator-{}.sock".format(os.getuid()))
+    return os.path.join(tempfile.gettempdir(), "cmake_class_creator-{}".format(os.getuid()), "daemon.sock")
+
+def is_trusted_socket(socket_path):
+    """ Whether the socket belongs to this user and is in a directory that no other user can write to
+
+    Otherwise another user may have put a daemon there, which could answer with any cmake script to write."""
+    try:
+        socket_stat = os.lstat(socket_path)
+        directory_stat = os.stat(os.path.dirname(os.path.abspath(socket_path)))
+    except OSError:
+        return False
+
+    return stat.S_ISSOCK(socket_stat.st_mode) and socket_stat.st_uid == os.getuid() \
+        and directory_stat.st_uid in (os.getuid(), 0) and not directory_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+def _make_error_response(request_id, code, message):
+    return {"jsonrpc": "2.0", "error": {"code": code, "message": message}, "id": request_id}
+
+def _remove_stale_socket(socket_path):
+    if not os.path.exists(socket_path):
+        return
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.remove(socket_path) #left behind by a daemon that didn't shut down cleanly
+            return
+    raise DaemonException("A daemon is already listening on {}".format(socket_path))
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            response = self.server.handle_request_line(line)
+            if response is not None:
+                self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, methods, application_exceptions=(), idle_timeout_seconds=default_idle_timeout_seconds):
+        """ methods maps a method name to a function that takes the named parameters, its result has to be JSON serializable
+
+        The application exceptions are reported with their message, any other exception is reported as an internal error."""
+        self.socket_path = socket_path
+        self.methods = methods
+        self.application_exceptions = tuple(application_exceptions)
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self._method_lock = threading.Lock()
+        self._activity_lock = threading.Lock()
+        self._running_requests = 0
+        self._last_activity = time.monotonic()
+
+        #a directory that is made for the socket is only accessible by its owner, so clients can trust the socket
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), mode=0o700, exist_ok=True)
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+
+    def server_bind(self):
+        previous_umask = os.umask(0o177) #only the owner may connect
+        try:
+            super().server_bind()
+        finally:
+            os.umask(previous_umask)
+
+    def _set_running(self, change):
+        with self._activity_lock:
+            self._running_requests += change
+            self._last_activity = time.monotonic()
+
+    def handle_request_line(self, line):
+        """ Returns the response, or None for a notification """
+        try:
+            request = json.loads(line.decode("utf-8"))
+        except ValueError:
+            return _make_error_response(None, PARSE_ERROR, "The request is not valid JSON")
+
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), str):
+            return _make_error_response(request.get("id") if isinstance(request, dict) else None, INVALID_REQUEST, "The request is not a JSON-RPC 2.0 request")
+
+        self._set_running(1)
+        try:
+            response = self._call(request)
+        finally:
+            self._set_running(-1)
+        return response if "id" in request else None
+
+    def _call(self, request):
+        request_id = request.get("id")
+        if request["method"] == _shutdown_method:
+            threading.Thread(target=self.shutdown).start()
+            return {"jsonrpc": "2.0", "result": None, "id": request_id}
+
+        method = self.methods.get(request["method"])
+        if method is None:
+            return _make_error_response(request_id, METHOD_NOT_FOUND, "There is no method {}".format(request["method"]))
+
+        params = request.get("params", {})
+        try:
+            inspect.signature(method).bind(**params)
+        except TypeError as e:
+            return _make_error_response(request_id, INVALID_PARAMS, str(e))
+
+        try:
+            with self._method_lock:
+                return {"jsonrpc": "2.0", "result": method(**params), "id": request_id}
+        except self.application_exceptions as e:
+            return _make_error_response(request_id, APPLICATION_ERROR, str(e))
+        except Exception as e:
+            return _make_error_response(request_id, INTERNAL_ERROR, "{0}: {1}".format(type(e).__name__, str(e)))
+
+    def _shut_down_when_idle(self):
+        while True:
+            with self._activity_lock:
+                idle_seconds = time.monotonic() - self._last_activity if self._running_requests == 0 else 0
+            if idle_seconds >= self.idle_timeout_seconds:
+                self.shutdown()
+                return
+            time.sleep(min(1, self.idle_timeout_seconds - idle_seconds))
+
+    def serve_until_idle(self):
+        """ Handles requests until the daemon was idle for too long or until it is asked to shut down """
+        threading.Thread(target=self._shut_down_when_idle, daemon=True).start()
+        try:
+            self.serve_forever(poll_interval=0.1)
+        finally:
+            self.server_close()
+            try:
+                os.remove(self.socket_path)
+            except OSError:
+                pass
+
+def call(socket_path, method, params, timeout=default_call_timeout_seconds):
+    """ Sends a single request to the daemon and returns the result
+
+    Raises an OSError when no daemon is listening, socket.timeout (also an OSError) when it doesn't answer within the timeout
+    in seconds (None waits forever) and a DaemonException when the daemon answers with an error."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps({"jsonrpc": "2.0", "method": method, "params": params, "id": 1}).encode("utf-8") + b"\n")
+        with client.makefile('rb') as response_file:
+            response_line = response_file.readline()
+
+    try:
+        response = json.loads(response_line.decode("utf-8"))
+    except ValueError:
+        raise DaemonException("The daemon didn't send a valid response")
+
+    if "error" in response:
+        raise DaemonException(response["error"]["message"], response["error"]["code"])
+    return response.get("result")
@@ -0,0 +1,261 @@
+""" Collects the edits of a cmake source and builds the edited source in a single pass
+
+Doing insert actions one by one copies the whole source for every action. The edit buffer is a piece table instead: the
+edited source is a sequence of slices of the original source and inserted contents, which is joined once or written to
+a file piece by piece. The edits are all relative to the original source.
+
+The edits can also be given as a list with their line and column, or as a unified diff, without building the edited source.
+Both only need the lines of the original source around the edits.
+"""
+
+import difflib
+
+from collections import deque, namedtuple
+
+#line and column start at 1, position and end are locations in the original source, end is the position for an insertion
+Edit = namedtuple("Edit", ["position", "end", "line", "column", "content"])
+
+class EditBufferException(Exception):
+    pass
+
+class _Edit(object):
+    __slots__ = ("start", "end", "content", "order")
+
+    def __init__(self, start, end, content, order):
+        self.start = start
+        self.end = end
+        self.content = content
+        self.order = order
+
+    @property
+    def is_insertion(self):
+        return self.start == self.end
+
+class EditBuffer(object):
+    def __init__(self, full_cmake_source):
+        self.full_cmake_source = full_cmake_source
+        self._edits = []
+
+    def insert(self, position, content):
+        self._add(position, position, content)
+
+    def replace(self, start, end, content):
+        """ Replaces the original source from start until end """
+        if end < start:
+            raise EditBufferException("The replaced part can't end at {0} before it starts at {1}".format(end, start))
+        self._add(start, end, content)
+
+    @property
+    def is_unchanged(self):
+        return all(edit.is_insertion and not edit.content for edit in self._edits)
+
+    def do(self, insert_action):
+        """ Adds the insertion of a source_inserter.InsertAction """
+        self.insert(insert_action.position, insert_action.content)
+
+    def _add(self, start, end, content):
+        if start < 0 or end > len(self.full_cmake_source):
+            raise EditBufferException("The edit at {0}-{1} is outside of the cmake source of length {2}".format(start, end, len(self.full_cmake_source)))
+        self._edits.append(_Edit(start, end, content, len(self._edits)))
+
+    def _get_sorted_edits(self):
+        #insertions at the same position end up in reverse order, just like when doing insert actions one by one from the back,
+        #and before a part that is replaced from that position
+        sorted_edits = sorted(self._edits, key=lambda edit: (edit.start, not edit.is_insertion, -edit.order))
+
+        edited_until = 0
+        for edit in sorted_edits:
+            if edit.start < edited_until:
+                raise EditBufferException("The edit at {0}-{1} overlaps with a part that is replaced until {2}".format(edit.start, edit.end, edited_until))
+            edited_until = edit.end
+        return sorted_edits
+
+    def pieces(self):
+        """ The pieces of the edited source, all edits are checked before the first piece is given """
+        sorted_edits = self._get_sorted_edits()
+        position = 0
+        for edit in sorted_edits:
+            if edit.start > position:
+                yield self.full_cmake_source[position:edit.start]
+            if edit.content:
+                yield edit.content
+            position = edit.end
+
+        if position < len(self.full_cmake_source):
+            yield self.full_cmake_source[position:]
+
+    def text(self):
+        return "".join(self.pieces())
+
+    def write_to(self, output_file):
+        for piece in self.pieces():
+            output_file.write(piece)
+
+    def edits(self):
+        """ The edits in the order of the edited source, edits that change nothing are left out """
+        return get_edits([self.full_cmake_source], self._get_edit_spans())
+
+    def unified_diff(self, cmakelists_path, context_lines=3):
+        """ The lines of a unified diff of the original and the edited source, nothing when the source is unchanged """
+        return iter_unified_diff([self.full_cmake_source], self._get_edit_spans(), cmakelists_path, context_lines)
+
+    def _get_edit_spans(self):
+        return [(edit.start, edit.end, edit.content) for edit in self._get_sorted_edits()]
+
+def get_edits(blocks, edit_spans):
+    """ Turns sorted (start, end, content) spans into Edit records, the original source is given as text blocks
+
+    A mapped cmake source is read block by block, the line and column are counted without keeping the blocks."""
+    edits = []
+    edit_spans = [edit_span for edit_span in edit_spans if edit_span[0] != edit_span[1] or edit_span[2]]
+    index, line, line_start, block_start = 0, 1, 0, 0
+    for block in blocks:
+        counted_until = 0
+        while index < len(edit_spans) and edit_spans[index][0] <= block_start + len(block):
+            start, end, content = edit_spans[index]
+            line, line_start = _count_lines(block, block_start, counted_until, start - block_start, line, line_start)
+            counted_until = start - block_start
+            edits.append(Edit(start, end, line, start - line_start + 1, content))
+            index += 1
+        line, line_start = _count_lines(block, block_start, counted_until, len(block), line, line_start)
+        block_start += len(block)
+    return edits
+
+def _count_lines(block, block_start, count_from, count_until, line, line_start):
+    line_breaks = block.count("\n", count_from, count_until)
+    if line_breaks == 0:
+        return line, line_start
+    return line + line_breaks, block_start + block.rfind("\n", count_from, count_until) + 1
+
+def iter_unified_diff(blocks, edit_spans, cmakelists_path, context_lines=3):
+    """ The lines of a unified diff for sorted (start, end, content) spans, the original source is given as text blocks """
+    is_header_written = False
+    for hunk_lines in _iter_hunks(_iter_line_operations(blocks, edit_spans), context_lines):
+        if not is_header_written:
+            yield "--- {}\n".format(cmakelists_path)
+            yield "+++ {}\n".format(cmakelists_path)
+            is_header_written = True
+        yield from hunk_lines
+
+def _iter_lines(blocks):
+    """ The position and text of every line, blocks that end in the middle of a line are joined """
+    pending, position = "", 0
+    for block in blocks:
+        pending += block
+        line_start = 0
+        line_break = pending.find("\n")
+        while line_break != -1:
+            yield position + line_start, pending[line_start:line_break + 1]
+            line_start = line_break + 1
+            line_break = pending.find("\n", line_start)
+        pending, position = pending[line_start:], position + line_start
+    if pending:
+        yield position, pending
+
+def _iter_line_operations(blocks, edit_spans):
+    """ Yields (tag, line) like the lines of a diff, the lines that the edits touch are compared as a group """
+    index = 0
+    group_start, group_lines, group_spans, group_end = None, [], [], 0
+    for line_start, line in _iter_lines(blocks):
+        line_end = line_start + len(line)
+        #only the last line can lack a line break, an edit at the end of the source belongs to it
+        line_spans = []
+        while index < len(edit_spans) and (edit_spans[index][0] < line_end or (edit_spans[index][0] == line_end and not line.endswith("\n"))):
+            line_spans.append(edit_spans[index])
+            index += 1
+
+        if group_start is not None and not line_spans and group_end < line_start:
+            yield from _compare_group(group_lines, group_start, group_spans)
+            group_start, group_lines, group_spans = None, [], []
+        if group_start is None and not line_spans:
+            yield " ", line
+            continue
+
+        if group_start is None:
+            group_start = line_start
+        group_lines.append(line)
+        group_spans.extend(line_spans)
+        group_end = max([group_end] + [edit_span[1] for edit_span in line_spans])
+
+    #what is left is added after the last line break of the source
+    if index < len(edit_spans):
+        if group_start is None:
+            group_start = edit_spans[index][0]
+        group_spans.extend(edit_spans[index:])
+    if group_spans:
+        yield from _compare_group(group_lines, group_start, group_spans)
+
+def _compare_group(old_lines, group_start, edit_spans):
+    old_text = "".join(old_lines)
+    pieces, position = [], 0
+    for start, end, content in edit_spans:
+        pieces.append(old_text[position:start - group_start])
+        pieces.append(content)
+        position = end - group_start
+    pieces.append(old_text[position:])
+    new_lines = [line for _, line in _iter_lines(["".join(pieces)])]
+
+    #the group is only the few lines that the edits touch, so comparing them is cheap
+    for tag, old_start, old_end, new_start, new_end in difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            for line in old_lines[old_start:old_end]:
+                yield " ", line
+            continue
+        for line in old_lines[old_start:old_end]:
+            yield "-", line
+        for line in new_lines[new_start:new_end]:
+            yield "+", line
+
+def _iter_hunks(line_operations, context_lines):
+    """ Groups the changed lines with the context around them into hunks, changes that share context end up in the same hunk """
+    before = deque(maxlen=context_lines)
+    hunk, after = None, []
+    hunk_old_start = hunk_new_start = None #set with the first changed line of every hunk
+    old_number = new_number = 1 #the numbers of the next line
+    for tag, line in line_operations:
+        if tag == " ":
+            if hunk is None:
+                before.append(line)
+            else:
+                after.append(line)
+                if len(after) > 2 * context_lines:
+                    yield _format_hunk(hunk + [(" ", line) for line in after[:context_lines]], hunk_old_start, hunk_new_start)
+                    hunk = None
+                    before.extend(after[len(after) - context_lines:])
+                    after = []
+            old_number, new_number = old_number + 1, new_number + 1
+            continue
+
+        if hunk is None:
+            hunk = [(" ", line) for line in before]
+            hunk_old_start, hunk_new_start = old_number - len(before), new_number - len(before)
+            before.clear()
+        else:
+            hunk.extend((" ", line) for line in after)
+            after = []
+        hunk.append((tag, line))
+        if tag == "-":
+            old_number += 1
+        else:
+            new_number += 1
+
+    if hunk is not None:
+        yield _format_hunk(hunk + [(" ", line) for line in after[:context_lines]], hunk_old_start, hunk_new_start)
+
+def _format_hunk(hunk, old_start, new_start):
+    old_length = sum(1 for tag, _ in hunk if tag != "+")
+    new_length = sum(1 for tag, _ in hunk if tag != "-")
+    lines = ["@@ -{0} +{1} @@\n".format(_format_range(old_start, old_length), _format_range(new_start, new_length))]
+    for tag, line in hunk:
+        lines.append(tag + line)
+        if not line.endswith("\n"):
+            lines.append("\n\\ No newline at end of file\n")
+    return lines
+
+def _format_range(start, length):
+    """ The same ranges as diff -u, an empty range starts at the line before it """
+    if length == 1:
+        return str(start)
+    if length == 0:
+        start -= 1
+    return "{0},{1}".format(start, length)
@@ -0,0 +1,337 @@
+""" A hand-written tokenizer and recursive-descent parser for the statements the pyparsing grammar supports
+
+This is a drop-in replacement for scanning with the grammar in the parser module. It produces the same AST nodes with the
+same locations, but only attempts a statement where one of the statement keywords occurs, which makes a scan linear in
+the size of the cmake source instead of trying the complete grammar at every character offset.
+
+The quirks of the grammar are reproduced on purpose (keywords are not required to start a word, scope specifiers are
+matched as prefixes, comments are skipped between any two tokens, ...) so that both backends can be used interchangeably.
+"""
+
+import re
+
+from CMakeClassCreator import ast
+
+class HandwrittenParserException(Exception):
+    pass
+
+_whitespace = " \t\n\r"
+
+#a '#' reached while scanning starts a comment, so it has to be found just like the statement keywords
+_statement_start_regex = re.compile(r"#|set|add_library|add_executable|(?-i:target_sources)", re.IGNORECASE)
+
+_skip_regex = re.compile(r"(?:[ \t\n\r]+|#[^\n]*)*")
+_comments_only_skip_regex = re.compile(r"(?:[ \t\n\r]*#[^\n]*)*")
+
+_variable_name_regex = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_word_regex = re.compile(r"[!-(*-~]+") #all printable characters except whitespace and ')'
+_quoted_string_body_regex = re.compile(r'"(?:[^"\n\r\\]|(?:"")|(?:\\(?:[^x]|x[0-9a-fA-F]+)))*')
+
+_scope_specifier_keywords = ("PRIVATE", "PUBLIC", "INTERFACE")
+_normal_library_types = ("STATIC", "SHARED", "MODULE")
+
+def skip_whitespace_and_comments(source, position):
+    """ The location of the first character at or after the given position that isn't whitespace or part of a comment """
+    return _skip_regex.match(source, position).end()
+
+def find_end_of_comment(source, position):
+    """ The location of the line break that ends the comment at the given position, or the end of the source """
+    end = source.find("\n", position)
+    return len(source) if end == -1 else end
+
+def _expect_literal(source, position, literal):
+    position = skip_whitespace_and_comments(source, position)
+    return position + len(literal) if source.startswith(literal, position) else None
+
+def _expect_optional_literal(source, position, literals):
+    skipped_position = skip_whitespace_and_comments(source, position)
+    for literal in literals:
+        if source.startswith(literal, skipped_position):
+            return skipped_position + len(literal)
+    return position
+
+def _expect_variable_name(source, position):
+    match = _variable_name_regex.match(source, skip_whitespace_and_comments(source, position))
+    return (match.group(), match.end()) if match else None
+
+def _match_word(source, position):
+    match = _word_regex.match(source, position)
+    return match.end() if match else None
+
+def _match_quoted_string(source, position):
+    match = _quoted_string_body_regex.match(source, position)
+    if match is None or not source.startswith('"', match.end()):
+        return None
+    return match.end() + 1
+
+def _match_adjacent_variable_use(source, position):
+    """ Matches ${var} or "${var}" without any whitespace in between, as used to compose a list item """
+    if source.startswith("${", position):
+        match = _variable_name_regex.match(source, position + 2)
+        return match.end() + 1 if match and source.startswith("}", match.end()) else None
+
+    if source.startswith('"${', position):
+        match = _variable_name_regex.match(source, position + 3)
+        return match.end() + 2 if match and source.startswith('}"', match.end()) else None
+
+    return None
+
+def _match_composed_list_item(source, position):
+    end = _match_quoted_string(source, position)
+    if end is not None:
+        composed_end = _match_adjacent_variable_use(source, end)
+        if composed_end is not None:
+            return composed_end
+
+    #the grammar also has a word followed by a variable use, but the word would already contain the variable use
+    end = _match_adjacent_variable_use(source, position)
+    if end is None:
+        return None
+
+    composed_end = _match_quoted_string(source, end)
+    return composed_end if composed_end is not None else _match_word(source, end)
+
+def _match_standalone_variable_use(source, position):
+    if not source.startswith("${", position):
+        return None
+
+    name_and_end = _expect_variable_name(source, position + 2)
+    if name_and_end is None:
+        return None
+
+    return _expect_literal(source, name_and_end[1], "}")
+
+def _is_followed_by_whitespace(source, position):
+    position = _comments_only_skip_regex.match(source, position).end()
+    return position < len(source) and source[position] in _whitespace
+
+def _match_variable_use_in_quotes(source, position):
+    if not source.startswith('"', position):
+        return None
+
+    variable_use_start = _expect_literal(source, position + 1, "${")
+    if variable_use_start is None:
+        return None
+
+    name_and_end = _expect_variable_name(source, variable_use_start)
+    if name_and_end is None:
+        return None
+
+    closing_brace_end = _expect_literal(source, name_and_end[1], "}")
+    if closing_brace_end is None or _is_followed_by_whitespace(source, closing_brace_end):
+        return None
+
+    return _expect_literal(source, closing_brace_end, '"')
+
+def _find_variable_name_in_variable_use(source, position):
+    """ The name of the variable used by the (standalone) variable use that starts at the given position """
+    variable_use_start = _expect_literal(source, position + 1, "${") if source.startswith('"', position) else position + 2
+    return _expect_variable_name(source, variable_use_start)[0]
+
+def _match_list_item(source, position):
+    """ Returns the kind of list item that starts at the given position and its end location, or None """
+    end = _match_composed_list_item(source, position)
+    if end is not None:
+        return ast.COMPOSED_LIST_ITEM_KIND, end
+
+    end = _match_standalone_variable_use(source, position)
+    if end is None:
+        end = _match_variable_use_in_quotes(source, position)
+    if end is not None:
+        return ast.VARIABLE_USE_KIND, end
+
+    end = _match_quoted_string(source, position)
+    if end is None:
+        end = _match_word(source, position)
+    if end is None:
+        return None
+
+    return ast.LIST_ITEM_STRING_KIND, end
+
+def _parse_cmake_string_list(source, position):
+    cmake_string_list = ast.CompactCMakeStringList(source)
+    while True:
+        item_position = skip_whitespace_and_comments(source, position)
+        if source.startswith(_scope_specifier_keywords, item_position):
+            break
+
+        kind_and_end = _match_list_item(source, item_position)
+        if kind_and_end is None:
+            break
+
+        kind, position = kind_and_end
+        cmake_string_list.append_item(kind, item_position, position)
+
+    if not cmake_string_list.kinds:
+        return None
+
+    return cmake_string_list, position
+
+def _parse_set_env_variable_stmt(source, position):
+    for literal in ("(", "ENV", "{"):
+        position = _expect_literal(source, position, literal)
+        if position is None:
+            return None
+
+    name_and_end = _expect_variable_name(source, position)
+    if name_and_end is None:
+        return None
+
+    position = _expect_literal(source, name_and_end[1], "}")
+    if position is None:
+        return None
+
+    cmake_string_list_and_end = _parse_cmake_string_list(source, position)
+    if cmake_string_list_and_end is None:
+        return None
+
+    end = _expect_literal(source, cmake_string_list_and_end[1], ")")
+    return (None, end) if end is not None else None
+
+def _parse_set_normal_variable_stmt(source, position):
+    position = _expect_literal(source, position, "(")
+    if position is None:
+        return None
+
+    name_and_end = _expect_variable_name(source, position)
+    if name_and_end is None:
+        return None
+
+    cmake_string_list_and_end = _parse_cmake_string_list(source, name_and_end[1])
+    if cmake_string_list_and_end is None:
+        return None
+
+    position = _expect_optional_literal(source, cmake_string_list_and_end[1], ["PARENT_SCOPE"])
+    end = _expect_literal(source, position, ")")
+    if end is None:
+        return None
+
+    return ast.SetNormalVariable(name_and_end[0], cmake_string_list_and_end[0].keep_own_source_only()), end
+
+def _parse_target_declaration(source, position, optional_flag_groups):
+    """ The shared part of add_library and add_executable: a name, optional flags and the list of sources """
+    position = _expect_literal(source, position, "(")
+    if position is None:
+        return None
+
+    name_and_end = _expect_variable_name(source, position)
+    if name_and_end is None:
+        return None
+
+    position = name_and_end[1]
+    for optional_flags in optional_flag_groups:
+        position = _expect_optional_literal(source, position, optional_flags)
+
+    cmake_string_list_and_end = _parse_cmake_string_list(source, position)
+    if cmake_string_list_and_end is None:
+        return None
+
+    end = _expect_literal(source, cmake_string_list_and_end[1], ")")
+    if end is None:
+        return None
+
+    return name_and_end[0], cmake_string_list_and_end[0].keep_own_source_only(), end
+
+def _parse_add_library_stmt(source, position):
+    #an OBJECT library would also be accepted as a normal library with OBJECT as its first source, so it needs no separate rule
+    declaration = _parse_target_declaration(source, position, [_normal_library_types, ["EXCLUDE_FROM_ALL"]])
+    if declaration is None:
+        return None
+    return ast.AddLibrary(declaration[0], declaration[1]), declaration[2]
+
+def _parse_add_normal_executable_stmt(source, position):
+    declaration = _parse_target_declaration(source, position, [["WIN32"], ["MACOSX_BUNDLE"], ["EXCLUDE_FROM_ALL"]])
+    if declaration is None:
+        return None
+    return ast.AddExecutable(declaration[0], declaration[1]), declaration[2]
+
+def _parse_target_sources_stmt(source, position):
+    position = _expect_literal(source, position, "(")
+    if position is None:
+        return None
+
+    name_and_end = _expect_variable_name(source, position)
+    if name_and_end is None:
+        return None
+
+    position = name_and_end[1]
+    cmake_string_list = ast.CompactCMakeStringList(source)
+    while True:
+        scope_end = _expect_optional_literal(source, position, _scope_specifier_keywords)
+        if scope_end == position:
+            break
+
+        scoped_cmake_string_list_and_end = _parse_cmake_string_list(source, scope_end)
+        if scoped_cmake_string_list_and_end is None:
+            break
+
+        cmake_string_list.extend(scoped_cmake_string_list_and_end[0])
+        position = scoped_cmake_string_list_and_end[1]
+
+    if not cmake_string_list.kinds:
+        return None
+
+    end = _expect_literal(source, position, ")")
+    if end is None:
+        return None
+
+    return ast.TargetSources(name_and_end[0], cmake_string_list.keep_own_source_only()), end
+
+def _parse_set_stmt(source, position):
+    return _parse_set_env_variable_stmt(source, position) or _parse_set_normal_variable_stmt(source, position)
+
+_statement_parsers = {
+    "SET": _parse_set_stmt,
+    "ADD_LIBRARY": _parse_add_library_stmt,
+    "ADD_EXECUTABLE": _parse_add_normal_executable_stmt,
+    "TARGET_SOURCES": _parse_target_sources_stmt }
+
+def _parse_stmt_at_keyword(source, keyword_match):
+    statement_parser = _statement_parsers.get(keyword_match.group().upper())
+    if statement_parser is None:
+        return None #the regex is more lenient than the keyword comparison for some non-ascii characters
+
+    return statement_parser(source, keyword_match.end())
+
+def _to_match(node):
+    """ A set(ENV{...}) statement is matched but suppressed, just like in the grammar """
+    return [node] if node is not None else []
+
+class HandwrittenParser(object):
+    def parse_at(self, string, location):
+        """ Parse the supported cmake statement that starts exactly at the given location
+
+        Returns the AST component (None for an ignored statement) and the end location of the statement, or None when nothing matches"""
+        keyword_match = _statement_start_regex.match(string, location)
+        if keyword_match is None or keyword_match.group() == "#":
+            return None
+        return _parse_stmt_at_keyword(string, keyword_match)
+
+    def parse(self, string):
+        """ Parse the supported cmake statement at the start of the given string """
+        node_and_end = self.parse_at(string, skip_whitespace_and_comments(string, 0))
+        if node_and_end is None:
+            raise HandwrittenParserException("Expected a (supported) cmake statement at the start of the given string")
+
+        return _to_match(node_and_end[0])
+
+    def scan_all(self, string):
+        """ Scan the given string for supported cmake grammar, ignores unsupported content and returns all matches"""
+        matches = []
+        position = 0
+        while True:
+            keyword_match = _statement_start_regex.search(string, position)
+            if keyword_match is None:
+                return matches
+
+            if keyword_match.group() == "#":
+                position = find_end_of_comment(string, keyword_match.start())
+                continue
+
+            node_and_end = _parse_stmt_at_keyword(string, keyword_match)
+            if node_and_end is None:
+                position = keyword_match.start() + 1
+                continue
+
+            matches.append(_to_match(node_and_end[0]))
+            position = node_and_end[1]
@@ -0,0 +1,38 @@
+""" Defers importing a module until one of its attributes is used
+
+Importing pyparsing takes longer than parsing most cmake scripts with the hand-written parser, so modules that aren't
+needed to parse the command line arguments are imported lazily. A lazily imported module is used like any other module.
+"""
+
+import importlib.util, sys
+
+_lazy_modules = []
+
+def lazy_import(module_name):
+    """ Returns the module, which is only executed when one of its attributes is first accessed """
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    spec = importlib.util.find_spec(module_name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    _lazy_modules.append(module)
+
+    #like a regular import, a submodule is also an attribute of its package
+    parent_name, _, child_name = module_name.rpartition(".")
+    if parent_name:
+        setattr(sys.modules[parent_name], child_name, module)
+    return module
+
+def load_all():
+    """ Executes every lazily imported module now
+
+    Executing a lazily imported module isn't thread safe, code that goes on to use the modules from several threads at
+    once should load them first."""
+    #executing a module may import other modules lazily, which are loaded as well
+    loaded = 0
+    while loaded < len(_lazy_modules):
+        getattr(_lazy_modules[loaded], "__name__") #any attribute access executes the module
+        loaded += 1
@@ -32,7 +32,7 @@ class PathAwareListItemString(object):
         return not self.__eq__(other)
 
     def __str__(self):
-        return self.list_item_string_reference
+        return str(self.list_item_string_reference)
 
     def __add__(self, other):
         if isinstance(other, PathAwareListItemString):
@@ -61,6 +61,12 @@ def interpret_list_item_string_as_path(list_item_ast):
 
     return ListItemStringAsPath(list_item_ast.list_item_string)
 
+def get_reference_source_file_name(reference_item):
+    """ The file name that any list item matching the given reference (a string or a PathAwareListItemString) contains """
+    while isinstance(reference_item, PathAwareListItemString):
+        reference_item = reference_item.list_item_string_reference
+    return ListItemStringAsPath(reference_item).source_file_name
+
 def is_cmake_path(list_item_string):
     return separator in list_item_string.lstrip(separator).rstrip(separator)
 
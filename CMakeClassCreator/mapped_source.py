@@ -0,0 +1,193 @@
+""" Reads a (very large) cmake script through a memory map, without ever holding the complete script in memory
+
+The mapped script is decoded and parsed in blocks that end at a line break. Only the text of a statement that isn't finished
+at the end of a block is carried over to the next block, so the memory use grows with the largest statement (or line) instead
+of with the size of the script. The locations in the AST components are absolute and the same as when the complete script is
+parsed as a single string read in text mode.
+
+The encoding of the script has to be ASCII compatible (such as utf-8), so that a line break byte always ends a line.
+"""
+
+import bisect, locale, mmap, os
+
+from CMakeClassCreator import ast, edit_buffer, statement_spans
+
+default_block_size = 1 << 20
+
+class MappedCMakeSourceException(Exception):
+    pass
+
+def _translate_newlines(text):
+    """ The same translation as reading a file in text mode with universal newlines """
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+class MappedCMakeSource(object):
+    """ A cmake script that can be sliced (with character locations) and parsed like a string, while it stays on disk """
+    def __init__(self, cmakelists_path, block_size=default_block_size, encoding=None):
+        if block_size <= 0:
+            raise MappedCMakeSourceException("The block size must be positive")
+
+        self.block_size = block_size
+        self.encoding = encoding if encoding is not None else locale.getpreferredencoding(False)
+        self._file = open(cmakelists_path, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        #an empty file can't be mapped
+        self._mapping = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._size > 0 else b""
+        #character and byte location of the start of every block that has been decoded so far, and of the block after it
+        self._block_starts = [(0, 0)]
+
+    def close(self):
+        if isinstance(self._mapping, mmap.mmap):
+            self._mapping.close()
+        self._file.close()
+
+    def update_hash(self, content_hash):
+        """ Feeds the bytes of the cmake script to a hashlib hash """
+        content_hash.update(self._mapping)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _find_block_end(self, byte_start):
+        byte_end = min(byte_start + self.block_size, self._size)
+        if byte_end == self._size:
+            return byte_end
+
+        line_break = self._mapping.rfind(b"\n", byte_start, byte_end)
+        if line_break == -1:
+            line_break = self._mapping.find(b"\n", byte_end)
+        return self._size if line_break == -1 else line_break + 1
+
+    def _is_last_block(self, index):
+        return self._find_block_end(self._block_starts[index][1]) == self._size
+
+    def _read_block(self, index):
+        char_start, byte_start = self._block_starts[index]
+        byte_end = self._find_block_end(byte_start)
+        text = _translate_newlines(self._mapping[byte_start:byte_end].decode(self.encoding))
+
+        if index + 1 == len(self._block_starts) and byte_end < self._size:
+            self._block_starts.append((char_start + len(text), byte_end))
+        return text
+
+    def _iter_blocks(self, index=0):
+        """ Yields the character location and text of every block, starting at the given block """
+        while True:
+            text = self._read_block(index)
+            yield self._block_starts[index][0], text
+            if self._is_last_block(index):
+                return
+            index += 1
+
+    def _find_block_index(self, char_location):
+        while self._block_starts[-1][0] <= char_location and not self._is_last_block(len(self._block_starts) - 1):
+            self._read_block(len(self._block_starts) - 1)
+        return bisect.bisect_right(self._block_starts, (char_location, self._size)) - 1
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None or (key.start or 0) < 0 or (key.stop is not None and key.stop < 0):
+            raise MappedCMakeSourceException("A mapped cmake source only supports slices with non-negative bounds")
+
+        start = key.start or 0
+        pieces = []
+        for char_location, text in self._iter_blocks(self._find_block_index(start)):
+            if key.stop is not None and char_location >= key.stop:
+                break
+            pieces.append(text[max(start - char_location, 0):None if key.stop is None else key.stop - char_location])
+        return "".join(pieces)
+
+    def iter_statements(self, name=None, backend=ast.HANDWRITTEN_BACKEND):
+        """ Lazily parse the supported cmake statements block by block, just like Ast.iter_statements does for a string """
+        cmake_ast = ast.get_shared_ast(backend)
+        is_mentioned = ast._make_mention_check(name)
+        pending, pending_location = "", 0 #the text that is carried over, and where it is located in the script
+        position = 0
+        for index, (char_location, text) in enumerate(self._iter_blocks()):
+            pending, pending_location = pending[position:] + text, pending_location + position
+            position = 0
+            is_complete = self._is_last_block(index)
+
+            while True:
+                span = statement_spans.find_next_statement_span(pending, position)
+                if span is None:
+                    undecided_location = None if is_complete else statement_spans.find_undecided_statement_keyword(pending, position)
+                    position = len(pending) if undecided_location is None else undecided_location
+                    break
+
+                #a span that runs up to the end of the block may continue in the next block
+                is_span_complete = is_complete or span.get_end_location() < len(pending)
+                if is_mentioned is not None:
+                    if not is_span_complete:
+                        position = span.get_location()
+                        break
+                    if not is_mentioned(span.get_text(pending)):
+                        position = span.get_end_location()
+                        continue
+
+                #a statement that is matched doesn't depend on the text after it, a statement that fails might still match with more text
+                ast_item_and_end = cmake_ast._parse_statement_at(pending, span.get_location())
+                if ast_item_and_end is None:
+                    if not is_span_complete:
+                        position = span.get_location()
+                        break
+                    position = span.get_location() + 1
+                    continue
+
+                ast_item, position = ast_item_and_end
+                if ast_item is not None:
+                    ast.shift_locations(ast_item, pending_location)
+                    yield ast_item
+
+    def with_actions(self, actions):
+        return EditedMappedCMakeSource(self, actions)
+
+class EditedMappedCMakeSource(object):
+    """ The result of doing insert actions on a mapped cmake source, which is only built while it is being written """
+    def __init__(self, mapped_cmake_source, actions):
+        self.mapped_cmake_source = mapped_cmake_source
+        #actions at the same position end up in reversed order, just like when doing them one by one from the back
+        self.actions = [action for index, action in sorted(enumerate(actions), key=lambda indexed: (indexed[1].position, -indexed[0]))]
+
+    @property
+    def is_unchanged(self):
+        return not any(action.content for action in self.actions)
+
+    def write_to(self, output_file):
+        action_index = 0
+        for char_location, text in self.mapped_cmake_source._iter_blocks():
+            written_until = 0
+            while action_index < len(self.actions) and self.actions[action_index].position <= char_location + len(text):
+                action = self.actions[action_index]
+                output_file.write(text[written_until:action.position - char_location])
+                output_file.write(action.content)
+                written_until = action.position - char_location
+                action_index += 1
+            output_file.write(text[written_until:])
+
+        for action in self.actions[action_index:]:
+            output_file.write(action.content)
+
+    def edits(self):
+        """ Like EditBuffer.edits, the lines are counted while the mapped cmake script is read block by block """
+        return edit_buffer.get_edits(self._iter_block_texts(), self._get_edit_spans())
+
+    def unified_diff(self, cmakelists_path, context_lines=3):
+        return edit_buffer.iter_unified_diff(self._iter_block_texts(), self._get_edit_spans(), cmakelists_path, context_lines)
+
+    def _iter_block_texts(self):
+        return (text for _, text in self.mapped_cmake_source._iter_blocks())
+
+    def _get_edit_spans(self):
+        return [(action.position, action.position, action.content) for action in self.actions]
+
+    def close(self):
+        self.mapped_cmake_source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,139 @@
+""" Records the wall and cpu time of the phases of an operation, such as reading, parsing and writing a cmake script
+
+Recording is off until start_recording is called. While it is off, phase returns a shared context manager that does
+nothing, so the instrumented code only pays for a function call. The time of a phase doesn't include the time of the
+phases nested in it, so the times of all phases add up to the recorded time.
+"""
+
+import json, os, threading, time
+
+from collections import OrderedDict, namedtuple
+
+#start is in seconds since the recording started, the times don't include nested phases
+PhaseRecord = namedtuple("PhaseRecord", ["name", "start", "wall_seconds", "cpu_seconds", "self_wall_seconds", "self_cpu_seconds", "thread_id", "depth"])
+
+_recorder = None
+
+class _NoPhase(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        return False
+
+_no_phase = _NoPhase()
+
+class _Phase(object):
+    __slots__ = ("recorder", "name", "start_wall", "start_cpu", "nested_wall", "nested_cpu")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.nested_wall = self.nested_cpu = 0.0
+        self.recorder._open_phases().append(self)
+        self.start_cpu = time.thread_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        wall_seconds = time.perf_counter() - self.start_wall
+        cpu_seconds = time.thread_time() - self.start_cpu
+
+        open_phases = self.recorder._open_phases()
+        open_phases.pop()
+        if open_phases:
+            open_phases[-1].nested_wall += wall_seconds
+            open_phases[-1].nested_cpu += cpu_seconds
+
+        self.recorder._add(PhaseRecord(self.name, self.start_wall - self.recorder.start_wall, wall_seconds, cpu_seconds,
+            wall_seconds - self.nested_wall, cpu_seconds - self.nested_cpu, threading.get_ident(), len(open_phases)))
+        return False
+
+class PhaseRecorder(object):
+    def __init__(self):
+        self.records = []
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        self.wall_seconds = self.cpu_seconds = None
+        self._lock = threading.Lock()
+        self._threads = threading.local()
+
+    def _open_phases(self):
+        if not hasattr(self._threads, "open_phases"):
+            self._threads.open_phases = []
+        return self._threads.open_phases
+
+    def _add(self, record):
+        with self._lock:
+            self.records.append(record)
+
+    def stop(self):
+        self.wall_seconds = time.perf_counter() - self.start_wall
+        self.cpu_seconds = time.process_time() - self.start_cpu
+
+    def get_summary_lines(self):
+        """ One line per phase name in the order the phases were first entered, with the number of calls and their total times """
+        totals = OrderedDict()
+        for record in sorted(self.records, key=lambda record: record.start):
+            calls, wall_seconds, cpu_seconds = totals.get(record.name, (0, 0.0, 0.0))
+            totals[record.name] = (calls + 1, wall_seconds + record.self_wall_seconds, cpu_seconds + record.self_cpu_seconds)
+
+        name_width = max([len(name) for name in totals] + [len("total")])
+        line_format = "{0:<{width}} {1:>7} {2:>12} {3:>12}"
+        lines = [line_format.format("phase", "calls", "wall ms", "cpu ms", width=name_width)]
+        for name, (calls, wall_seconds, cpu_seconds) in totals.items():
+            lines.append(line_format.format(name, calls, _format_milliseconds(wall_seconds), _format_milliseconds(cpu_seconds), width=name_width))
+        if self.wall_seconds is not None:
+            lines.append(line_format.format("total", "", _format_milliseconds(self.wall_seconds), _format_milliseconds(self.cpu_seconds), width=name_width))
+        return lines
+
+    def write_chrome_trace(self, trace_file):
+        """ Writes the phases as complete events of the trace event format, which chrome://tracing and Perfetto can show """
+        process_id = os.getpid()
+        events = [{"name": record.name, "cat": "cmake_class_creator", "ph": "X", "ts": record.start * 1e6, "dur": record.wall_seconds * 1e6,
+            "pid": process_id, "tid": record.thread_id, "args": {"cpu_ms": record.cpu_seconds * 1e3}} for record in self.records]
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+def _format_milliseconds(seconds):
+    return "{:.3f}".format(seconds * 1e3)
+
+def start_recording():
+    """ Records the phases of every thread until stop_recording is called """
+    global _recorder
+    _recorder = PhaseRecorder()
+    return _recorder
+
+def stop_recording():
+    """ Returns the recorder with the phases that were recorded, or None when nothing was recorded """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.stop()
+    return recorder
+
+def is_recording():
+    return _recorder is not None
+
+def phase(name):
+    """ A context manager that records the time spent in it under the given name """
+    if _recorder is None:
+        return _no_phase
+    return _Phase(_recorder, name)
+
+def iterate_in_phase(name, iterable):
+    """ Records the time spent producing each item of a lazy iterable, such as the statements of a lazy parse """
+    if _recorder is None:
+        return iterable
+    return _iterate_in_phase(name, iterable)
+
+def _iterate_in_phase(name, iterable):
+    iterator = iter(iterable)
+    while True:
+        with phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
@@ -0,0 +1,179 @@
+""" Loads all cmake scripts of a project, starting at the root CMakeLists and following add_subdirectory() and include(),
+or only a given set of cmake scripts
+
+The scripts are parsed on a pool of worker processes. A worker sends back the AST in the compact binary format of the AST
+cache, which is cheap to transfer, and it is only turned back into AST components when it is used. The largest scripts
+that are known are handed out first, so a giant script doesn't end up being parsed last while the other workers are idle.
+"""
+
+import heapq, os, re
+
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from CMakeClassCreator import ast, ast_cache
+
+class ProjectLoaderException(Exception):
+    pass
+
+_ADD_SUBDIRECTORY = "add_subdirectory"
+
+#quoted arguments and comments are matched as well, so the commands are not found inside them
+_reference_regex = re.compile(r'"(?:[^"\\]|\\.)*"|#[^\n]*|\b(add_subdirectory|include)[ \t]*\([ \t\r\n]*("[^"]*"|[^\s()#"]+)', re.IGNORECASE)
+_resolvable_variables = ["${CMAKE_CURRENT_SOURCE_DIR}", "${CMAKE_CURRENT_LIST_DIR}"]
+
+def _find_references(full_cmake_source):
+    """ Returns the command and first argument of every add_subdirectory() and include() """
+    return [(match.group(1).lower(), match.group(2).strip('"')) for match in _reference_regex.finditer(full_cmake_source) if match.group(1)]
+
+def _resolve_reference(command, argument, current_source_directory, current_list_directory):
+    """ Returns the path of the referenced cmake script and its current source directory, or None when it can't be found """
+    argument = argument.replace(_resolvable_variables[0], current_source_directory).replace(_resolvable_variables[1], current_list_directory)
+    if "${" in argument:
+        return None #only cmake itself can tell what this refers to
+
+    path = os.path.join(current_source_directory, argument)
+    if command == _ADD_SUBDIRECTORY:
+        path = os.path.join(path, "CMakeLists.txt")
+        current_source_directory = os.path.dirname(path)
+
+    path = os.path.normpath(path)
+    return (path, os.path.normpath(current_source_directory)) if os.path.isfile(path) else None
+
+def _read_file(cmakelists_path):
+    with open(cmakelists_path, 'r') as cmakelists_file:
+        return cmakelists_file.read()
+
+def _load_file(cmakelists_path, parser_backend):
+    """ Runs in a worker process, returns the encoded AST and the references to other cmake scripts """
+    full_cmake_source = _read_file(cmakelists_path)
+    full_cmake_ast = [match[0] for match in ast.get_shared_ast(parser_backend).scan_all(full_cmake_source) if len(match) > 0]
+    return ast_cache.encode_ast(full_cmake_ast), _find_references(full_cmake_source)
+
+class ProjectFile(object):
+    """ A cmake script of the project, its AST is decoded when it is first used """
+    def __init__(self, cmakelists_path, current_source_directory, encoded_ast):
+        self.cmakelists_path = cmakelists_path
+        self.current_source_directory = current_source_directory
+        self._encoded_ast = encoded_ast
+        self._full_cmake_ast = None
+
+    @property
+    def full_cmake_ast(self):
+        if self._full_cmake_ast is None:
+            self._full_cmake_ast = ast_cache.decode_ast(self._encoded_ast)
+            self._encoded_ast = None
+        return self._full_cmake_ast
+
+class Project(object):
+    def __init__(self, root_cmakelists_path, files, missing_references):
+        self.root_cmakelists_path = root_cmakelists_path
+        self.files = files #the ProjectFile of each cmake script by path, in the order they were found
+        self.missing_references = missing_references #(referencing script, command, argument) that couldn't be resolved
+
+class _ProjectLoad(object):
+    def __init__(self, cmakelists_paths, follow_references=True):
+        self.waiting = [] #a heap that gives the largest file first
+        self.found_order = {}
+        self.loaded_files = {}
+        self.missing_references = []
+        self.follow_references = follow_references
+        for cmakelists_path in cmakelists_paths:
+            self.add_file(cmakelists_path, os.path.dirname(cmakelists_path))
+
+    def add_file(self, cmakelists_path, current_source_directory):
+        if cmakelists_path in self.found_order:
+            return
+
+        self.found_order[cmakelists_path] = len(self.found_order)
+        heapq.heappush(self.waiting, (-os.path.getsize(cmakelists_path), self.found_order[cmakelists_path], cmakelists_path, current_source_directory))
+
+    def next_file(self):
+        _, _, cmakelists_path, current_source_directory = heapq.heappop(self.waiting)
+        return cmakelists_path, current_source_directory
+
+    def add_loaded_file(self, cmakelists_path, current_source_directory, encoded_ast, references):
+        self.loaded_files[cmakelists_path] = ProjectFile(cmakelists_path, current_source_directory, encoded_ast)
+        if not self.follow_references:
+            return
+
+        for command, argument in references:
+            resolved = _resolve_reference(command, argument, current_source_directory, os.path.dirname(cmakelists_path))
+            if resolved is None:
+                self.missing_references.append((cmakelists_path, command, argument))
+            else:
+                self.add_file(*resolved)
+
+    def make_project(self, root_cmakelists_path):
+        files = OrderedDict((path, self.loaded_files[path]) for path in sorted(self.loaded_files, key=self.found_order.get))
+        return Project(root_cmakelists_path, files, self.missing_references)
+
+def load_project(root_cmakelists_path, workers=None, parser_backend=ast.HANDWRITTEN_BACKEND):
+    """ Loads the root CMakeLists and every cmake script it refers to, directly or indirectly
+
+    By default there is a worker process for every cpu, with one worker (or less) everything is parsed in this process."""
+    root_cmakelists_path = _normalize_existing_path(root_cmakelists_path)
+    return _load(_ProjectLoad([root_cmakelists_path]), workers, parser_backend).make_project(root_cmakelists_path)
+
+def load_cmake_scripts(cmakelists_paths, workers=None, parser_backend=ast.HANDWRITTEN_BACKEND):
+    """ Loads only the given cmake scripts, in parallel like load_project, the first one is the root of the project """
+    if not cmakelists_paths:
+        raise ProjectLoaderException("There are no cmake scripts to load.")
+
+    cmakelists_paths = [_normalize_existing_path(cmakelists_path) for cmakelists_path in cmakelists_paths]
+    return _load(_ProjectLoad(cmakelists_paths, follow_references=False), workers, parser_backend).make_project(cmakelists_paths[0])
+
+def find_cmake_scripts(root_cmakelists_path):
+    """ The paths of the root CMakeLists and every cmake script it refers to, like load_project finds them but without parsing them """
+    root_cmakelists_path = _normalize_existing_path(root_cmakelists_path)
+    found_paths = OrderedDict()
+    waiting = [(root_cmakelists_path, os.path.dirname(root_cmakelists_path))]
+    while waiting:
+        cmakelists_path, current_source_directory = waiting.pop()
+        if cmakelists_path in found_paths:
+            continue
+        found_paths[cmakelists_path] = None
+
+        full_cmake_source = _get_loaded_file(cmakelists_path, lambda: _read_file(cmakelists_path))
+        for command, argument in _find_references(full_cmake_source):
+            resolved = _resolve_reference(command, argument, current_source_directory, os.path.dirname(cmakelists_path))
+            if resolved is not None:
+                waiting.append(resolved)
+    return list(found_paths)
+
+def _normalize_existing_path(cmakelists_path):
+    if not os.path.isfile(cmakelists_path):
+        raise ProjectLoaderException("{} can't be found.".format(cmakelists_path))
+    return os.path.normpath(os.path.abspath(cmakelists_path))
+
+def _get_loaded_file(cmakelists_path, get_result):
+    """ A cmake script that can't be read or decoded fails the load, with its path in the message """
+    try:
+        return get_result()
+    except (OSError, UnicodeDecodeError) as e:
+        raise ProjectLoaderException("{0} can't be loaded: {1}".format(cmakelists_path, e))
+
+def _load(project_load, workers, parser_backend):
+    workers = os.cpu_count() if workers is None else workers
+
+    if workers <= 1:
+        while project_load.waiting:
+            cmakelists_path, current_source_directory = project_load.next_file()
+            project_load.add_loaded_file(cmakelists_path, current_source_directory, 
+                *_get_loaded_file(cmakelists_path, lambda: _load_file(cmakelists_path, parser_backend)))
+        return project_load
+
+    with ProcessPoolExecutor(workers) as executor:
+        running = {}
+        while project_load.waiting or running:
+            #only as many files as there are workers are handed out, the others wait so the largest one can go next
+            while project_load.waiting and len(running) < workers:
+                cmakelists_path, current_source_directory = project_load.next_file()
+                running[executor.submit(_load_file, cmakelists_path, parser_backend)] = (cmakelists_path, current_source_directory)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                cmakelists_path, current_source_directory = running.pop(future)
+                project_load.add_loaded_file(cmakelists_path, current_source_directory, *_get_loaded_file(cmakelists_path, future.result))
+
+    return project_load
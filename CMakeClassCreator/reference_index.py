@@ -0,0 +1,88 @@
+""" An index of the source files that are listed in the cmake scripts of a project
+
+Each list item string is indexed under its file name, the part that a PathAwareListItemString compares, so finding the
+cmake script and statement that list a reference source doesn't depend on the number of cmake scripts in the project.
+"""
+
+import os
+
+from collections import namedtuple
+
+from CMakeClassCreator import ast, class_inserter, project_loader, source_inserter
+
+class ReferenceIndexException(Exception):
+    pass
+
+IndexedReference = namedtuple("IndexedReference", ["cmakelists_path", "statement", "list_item"])
+
+class ReferenceIndex(object):
+    def __init__(self, cmake_asts_by_path=()):
+        """ cmake_asts_by_path gives (path, cmake AST) pairs, such as the items of a dict """
+        self._cmake_ast_index = source_inserter.CMakeAstIndex([]) #of the statements of every cmake script
+        self._cmakelists_paths = {} #id of a statement -> the path of its cmake script
+        self._class_stem_index = None
+        for cmakelists_path, full_cmake_ast in cmake_asts_by_path:
+            self.add_cmake_ast(cmakelists_path, full_cmake_ast)
+
+    def add_cmake_ast(self, cmakelists_path, full_cmake_ast):
+        self._class_stem_index = None
+        for statement in full_cmake_ast:
+            self._cmakelists_paths[id(statement)] = cmakelists_path
+            self._cmake_ast_index.add_statement(statement)
+
+    def find_references(self, reference_item):
+        """ All indexed list items that match the given reference (a string or a PathAwareListItemString), in the order they were indexed """
+        return [IndexedReference(self._cmakelists_paths[id(statement)], statement, list_item) 
+            for statement, list_item in self._cmake_ast_index.find_all_source_items(reference_item)]
+
+    def find_class_files(self, reference_class_name):
+        """ Maps every extension with which the reference class is listed anywhere in the project, see class_inserter.ClassStemIndex """
+        if self._class_stem_index is None:
+            self._class_stem_index = class_inserter.ClassStemIndex(self._cmake_ast_index)
+        return self._class_stem_index.find_class_files(reference_class_name)
+
+    def make_inserter_for_item_next_to_other_source(self, reference_item):
+        """ Returns the path of the cmake script that lists the reference and an inserter like source_inserter would make for that script """
+        references = self.find_references(reference_item)
+        if not references:
+            raise ReferenceIndexException("The reference item {} is not declared in any (supported) cmake statement of the project".format(reference_item))
+
+        cmakelists_paths = list(dict.fromkeys(reference.cmakelists_path for reference in references))
+        if len(cmakelists_paths) > 1:
+            raise ReferenceIndexException("The reference item {0} is declared in more than one cmake script: {1}".format(reference_item, ", ".join(cmakelists_paths)))
+
+        statements = list({id(reference.statement): reference.statement for reference in references}.values())
+        try:
+            return cmakelists_paths[0], source_inserter._make_inserter_for_item_next_to_other_source(statements, reference_item)
+        except source_inserter.SourceInserterException as e:
+            raise ReferenceIndexException("{0}: {1}".format(cmakelists_paths[0], str(e)))
+
+def make_reference_index(project):
+    """ Indexes every cmake script of a project from the project_loader module """
+    return ReferenceIndex((cmakelists_path, project_file.full_cmake_ast) for cmakelists_path, project_file in project.files.items())
+
+def _stat_cmake_scripts(cmakelists_paths):
+    """ The modification time and size of every cmake script, or None when one of them is gone """
+    stats = {}
+    for cmakelists_path in cmakelists_paths:
+        try:
+            file_stat = os.stat(cmakelists_path)
+        except OSError:
+            return None
+        stats[cmakelists_path] = (file_stat.st_mtime_ns, file_stat.st_size)
+    return stats
+
+class ReferenceIndexCache(object):
+    """ Keeps the reference index of a project until one of its cmake scripts changes, for a long running process such as the daemon """
+    def __init__(self):
+        self._entries = {} #(root path, parser backend) -> (modification time and size of every cmake script, reference index)
+
+    def load_or_build(self, root_cmakelists_path, parser_backend=ast.HANDWRITTEN_BACKEND, workers=None):
+        key = (os.path.abspath(root_cmakelists_path), parser_backend)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is not None and _stat_cmake_scripts(entry[0]) == entry[0]:
+            return entry[1]
+
+        project = project_loader.load_project(root_cmakelists_path, workers, parser_backend)
+        self._entries[key] = (_stat_cmake_scripts(project.files), make_reference_index(project))
+        return self._entries[key][1]
@@ -1,5 +1,7 @@
-from CMakeClassCreator import whitespace_inserter, ast, list_item_string_path
+from CMakeClassCreator import whitespace_inserter, ast, list_item_string_path, profiling
 from abc import ABC, abstractmethod
+import bisect
+import re
 
 class SourceInserterException(Exception):
     pass
@@ -123,38 +125,97 @@ def _add_path_prefix_to_insert_action(inserter_with_reference, insert_action):
 
 def _get_position_after_last_list_item(cmake_string_list_ast):
     last_item = cmake_string_list_ast.items[-1]
+    if not hasattr(last_item, "get_end_location"):
+        raise SourceInserterException("Can't insert after the list item {}, the location of a composed list item is unknown".format(last_item))
     return last_item.get_end_location()
 
+def _unquote(list_item_string):
+    return list_item_string.rstrip('"').lstrip('"')
+
+class CMakeAstIndex(object):
+    """ Lookups of the targets, variable declarations and source items of a parsed cmake script, built in a single pass
+
+    Every function in this module that takes a cmake ast also accepts an index, which turns its lookups into dict accesses."""
+    def __init__(self, cmake_ast):
+        self.statements = []
+        self.targets = {} #target name -> the add_library and add_executable statements
+        self.variable_declarations = {} #variable name -> the set statements
+        self.source_items = {} #file name of an (unquoted) list item string -> (statement, item index), the list item is only made by a lookup
+
+        for statement in cmake_ast:
+            self.add_statement(statement)
+
+    def add_statement(self, statement):
+        self.statements.append(statement)
+        if isinstance(statement, ast.AddLibrary):
+            self.targets.setdefault(statement.library_name, []).append(statement)
+        elif isinstance(statement, ast.AddExecutable):
+            self.targets.setdefault(statement.executable_name, []).append(statement)
+        elif isinstance(statement, ast.SetNormalVariable):
+            self.variable_declarations.setdefault(statement.var_name, []).append(statement)
+
+        for item_index, list_item_string in _iter_list_item_strings(statement.cmake_string_list):
+            source_file_name = list_item_string_path.ListItemStringAsPath(_unquote(list_item_string)).source_file_name
+            self.source_items.setdefault(source_file_name, []).append((statement, item_index))
+
+    def __iter__(self):
+        return iter(self.statements)
+
+    def find_all_source_items(self, source_item):
+        """ Every (statement, list item) with the given source item (a string or a PathAwareListItemString), in the order they were added """
+        statements_and_items = ((statement, statement.cmake_string_list.items[item_index])
+            for statement, item_index in self.source_items.get(list_item_string_path.get_reference_source_file_name(source_item), []))
+        return [(statement, list_item) for statement, list_item in statements_and_items if source_item == _unquote(list_item.list_item_string)]
+
+    def find_source_items(self, source_item):
+        """ The statements that contain the given source item (a string or a PathAwareListItemString), with the first matching list item of each """
+        matches = {}
+        for statement, list_item in self.find_all_source_items(source_item):
+            matches.setdefault(id(statement), (statement, list_item))
+        return list(matches.values())
+
+def _iter_list_item_strings(cmake_string_list):
+    """ The index and text of every list item string, without making AST components for the items of a compact list """
+    if isinstance(cmake_string_list, ast.CompactCMakeStringList):
+        full_cmake_source, starts, ends = cmake_string_list.full_cmake_source, cmake_string_list.starts, cmake_string_list.ends
+        for item_index, kind in enumerate(cmake_string_list.kinds):
+            if kind == ast.LIST_ITEM_STRING_KIND:
+                yield item_index, full_cmake_source[starts[item_index]:ends[item_index]]
+        return
+
+    for item_index, list_item in enumerate(cmake_string_list.items):
+        if isinstance(list_item, ast.ListItemString):
+            yield item_index, list_item.list_item_string
+
 def insert_source_item_directly_in_target(cmake_ast, source_item, cmake_target):
     """ Sets up the action to add a source file directly to the add_{library|executable} statement of a given target """
     return _make_inserter_for_target(cmake_ast, cmake_target).insert_source(source_item)
 
 def _make_inserter_for_target(cmake_ast, cmake_target):
-    add_library_ast_items = [ast_item for ast_item in _get_all_library_targets(cmake_ast) if ast_item.library_name == cmake_target]
-    add_executable_ast_items = [ast_item for ast_item in _get_all_executable_targets(cmake_ast) if ast_item.executable_name == cmake_target]
+    """ The cmake ast may be a lazy iterable, it is only consumed until a second declaration of the target is found """
+    inserters = []
+    for ast_item in (cmake_ast.targets.get(cmake_target, []) if isinstance(cmake_ast, CMakeAstIndex) else cmake_ast):
+        if isinstance(ast_item, ast.AddLibrary) and ast_item.library_name == cmake_target:
+            inserters.append(_AddLibraryInserter(ast_item))
+        elif isinstance(ast_item, ast.AddExecutable) and ast_item.executable_name == cmake_target:
+            inserters.append(_AddExecutableInserter(ast_item))
 
-    inserters = [_AddLibraryInserter(add_library_ast) for add_library_ast in add_library_ast_items]
-    inserters += [_AddExecutableInserter(add_executable_ast) for add_executable_ast in add_executable_ast_items]
+        if len(inserters) > 1:
+            raise SourceInserterException("There are too many add_{{executable, library}} statements for target {}".format(cmake_target))
 
     if len(inserters) == 0:
         raise SourceInserterException("The target {} is not found in the given cmake ast".format(cmake_target))
 
-    if len(inserters) > 1:
-        raise SourceInserterException("There are too many add_{executable, library} statements for target {}".format(cmake_target))
-
     return inserters[0]
 
-def _get_all_library_targets(cmake_ast):
-    return [ast_item for ast_item in cmake_ast if isinstance(ast_item, ast.AddLibrary)]
-
-def _get_all_executable_targets(cmake_ast):
-    return [ast_item for ast_item in cmake_ast if isinstance(ast_item, ast.AddExecutable)]
-
 def insert_source_item_in_variable_from_target(cmake_ast, source_item, cmake_target, variable_name):
     """ Sets up the action to add a source file to the given variable of the given target """
     return _make_source_inserter_for_item_in_variable_from_target(cmake_ast, cmake_target, variable_name).insert_source(source_item)
 
 def _make_source_inserter_for_item_in_variable_from_target(cmake_ast, cmake_target, variable_name):
+    #both the target and the variable declaration are looked up, a lazy iterable can only be consumed once
+    if not isinstance(cmake_ast, CMakeAstIndex):
+        cmake_ast = CMakeAstIndex(cmake_ast)
     target_inserter = _make_inserter_for_target(cmake_ast, cmake_target)
     relevant_variable_declarations_in_target = [declaration for declaration in target_inserter.get_cmake_list_ast().items if isinstance(declaration, ast.VariableUse) and declaration.var_name == variable_name]
 
@@ -172,21 +233,20 @@ def insert_source_item_in_variable(cmake_ast, source_item, variable_name):
     return inserter.insert_source(source_item)
 
 def _make_inserter_for_variable_declaration(cmake_ast, variable_name):
-    set_normal_variable_ast_items = _find_all_variable_declarations(cmake_ast)
+    """ The cmake ast may be a lazy iterable, it is only consumed until a second declaration of the variable is found """
+    inserters = []
+    for ast_item in (cmake_ast.variable_declarations.get(variable_name, []) if isinstance(cmake_ast, CMakeAstIndex) else cmake_ast):
+        if isinstance(ast_item, ast.SetNormalVariable) and ast_item.var_name == variable_name:
+            inserters.append(_SetNormalVariableInserter(ast_item))
+
+        if len(inserters) > 1:
+            raise SourceInserterException("There is more than one variable declaration statements with variable name {}".format(variable_name))
 
-    inserters = [_SetNormalVariableInserter(declaration) for declaration in set_normal_variable_ast_items if declaration.var_name == variable_name]
-    
     if len(inserters) == 0:
         raise SourceInserterException("The variable declaration {} is not found in the given cmake ast".format(variable_name))
 
-    if len(inserters) > 1:
-        raise SourceInserterException("There is more than one variable declaration statements with variable name {}".format(variable_name))
-
     return inserters[0]
 
-def _find_all_variable_declarations(cmake_ast):
-    return [ast_item for ast_item in cmake_ast if isinstance(ast_item, ast.SetNormalVariable)]
-
 def insert_source_item_next_to_other_source(cmake_ast, source_item, reference_item):
     """ Sets up the action to add a source file in the same way as the reference source file
 
@@ -194,88 +254,117 @@ def insert_source_item_next_to_other_source(cmake_ast, source_item, reference_it
     """
     return _make_inserter_for_item_next_to_other_source(cmake_ast, reference_item).insert_source(source_item)
 
-def insert_source_considering_existing_whitespace(inserter, source_item, full_cmake_source):
-    """ The source insertion considers the whitespace that is present in the cmake source """
+def insert_source_considering_existing_whitespace(inserter, source_item, full_cmake_source, sorted_insertion=False):
+    """ The source insertion considers the whitespace that is present in the cmake source
+
+    A source that the list already contains isn't added again, the insert action then has no content. With sorted_insertion,
+    the source goes to its place in a sorted list, a list that isn't sorted gets it at the end."""
     insert_action = inserter.insert_source(source_item)
     if hasattr(inserter, "get_cmake_list_ast"):
-        whitespace_inserter.enhance_insert_action_with_whitespace_used_in_cmake_string_list(full_cmake_source, insert_action, inserter.get_cmake_list_ast())
+        if _is_listed(insert_action.content.strip(), inserter.get_cmake_list_ast()):
+            insert_action.content = ""
+            return insert_action
+        anchor_location = getattr(inserter.get_matched_reference_item(), "location", None) if hasattr(inserter, "get_matched_reference_item") else None
+        if sorted_insertion and _move_to_sorted_position(full_cmake_source, insert_action, inserter.get_cmake_list_ast(), anchor_location):
+            return insert_action
+        with profiling.phase("whitespace"):
+            whitespace_inserter.enhance_insert_action_with_whitespace_used_in_cmake_string_list(full_cmake_source, insert_action, inserter.get_cmake_list_ast())
     return insert_action
 
-def _make_inserter_for_item_next_to_other_source(cmake_ast, reference_item):
-    try:
-        target, reference_ast = _find_reference_directly_in_target_declaration(cmake_ast, reference_item)
-        inserter = _AddLibraryInserter(target) if isinstance(target, ast.AddLibrary) else _AddExecutableInserter(target)
-        return _InserterWithMatchedReference(inserter, reference_ast)
-    except SourceInserterException:
-        pass
+def _is_listed(source_item, cmake_string_list_ast):
+    return any(isinstance(list_item, ast.ListItemString) and _unquote(list_item.list_item_string) == _unquote(source_item) 
+        for list_item in cmake_string_list_ast.items)
 
-    try:
-        declaration, reference_ast = _find_reference_in_variable_declaration(cmake_ast, reference_item)
-        return _InserterWithMatchedReference(_SetNormalVariableInserter(declaration), reference_ast)
-    except SourceInserterException:
-        pass
+def _get_sort_key(list_item_string):
+    """ Sorted lists are compared by file name, so the path prefixes and quotes of the items don't matter
 
-    try:
-        target_sources_stmt, reference_ast = _find_reference_in_target_sources_stmt(cmake_ast, reference_item)
-        return _InserterWithMatchedReference(_TargetSourcesInserter(target_sources_stmt), reference_ast)
-    except SourceInserterException:
-        pass
+    The comparison ignores case, B.cpp sorts after a.cpp."""
+    return list_item_string_path.ListItemStringAsPath(_unquote(list_item_string)).source_file_name.lower()
 
-    raise SourceInserterException("The reference item {} is not declared in any (supported) cmake statement".format(reference_item))
+_comment_regex = re.compile(r"#[^\n]*")
 
-def _find_reference_directly_in_target_declaration(cmake_ast, reference_item):
-    all_targets = _get_all_library_targets(cmake_ast) + _get_all_executable_targets(cmake_ast)
-    cmake_lists_with_target = [(target.cmake_string_list, target) for target in all_targets]
-    
-    relevant_cmake_lists_with_target_and_reference = []
-    
-    for cmake_list_with_target in cmake_lists_with_target:
-        reference_ast = _find_source_item(cmake_list_with_target[0], reference_item)
-        if reference_ast is not None:
-            relevant_cmake_lists_with_target_and_reference.append((*cmake_list_with_target, reference_ast))
-
-    if len(relevant_cmake_lists_with_target_and_reference) == 0:
-        raise SourceInserterException("The reference item {} is not declared in a target".format(reference_item))
-    if len(relevant_cmake_lists_with_target_and_reference) > 1:
-        raise SourceInserterException("The reference item {0} is defined in multiple targets: {1}".format(reference_item, \
-            [cmake_list_with_target[0] for cmake_list_with_target in cmake_lists_with_target]))
-
-    return relevant_cmake_lists_with_target_and_reference[0][1], relevant_cmake_lists_with_target_and_reference[0][2]
-
-def _find_reference_in_variable_declaration(cmake_ast, reference_item):
-    relevant_variable_declarations_and_reference = []
-    for declaration in cmake_ast:
-        if isinstance(declaration, ast.SetNormalVariable):
-            reference_ast = _find_source_item(declaration.cmake_string_list, reference_item)
-            if reference_ast is not None:
-                relevant_variable_declarations_and_reference.append((declaration, reference_ast))
-    
-    if len(relevant_variable_declarations_and_reference) == 0:
-        raise SourceInserterException("The reference item {} is not declared in a variable declaration".format(reference_item))
-    if len(relevant_variable_declarations_and_reference) > 1:
-        raise SourceInserterException("The reference item {0} is defined in multiple variable declarations: {1}".format(reference_item, \
-            [declaration_and_reference[0].var_name for declaration_and_reference in relevant_variable_declarations_and_reference]))
-
-    return relevant_variable_declarations_and_reference[0][0], relevant_variable_declarations_and_reference[0][1]
-
-def _find_reference_in_target_sources_stmt(cmake_ast, reference_item):
-    relevant_target_sources_and_reference = []
-    for target_sources_stmt in cmake_ast:
-        if isinstance(target_sources_stmt, ast.TargetSources):
-            reference_ast = _find_source_item(target_sources_stmt.cmake_string_list, reference_item)
-            if reference_ast is not None:
-                relevant_target_sources_and_reference.append((target_sources_stmt, reference_ast))
-    
-    if len(relevant_target_sources_and_reference) == 0:
-        raise SourceInserterException("The reference item {} is not declared in a target_sources statement".format(reference_item))
-    if len(relevant_target_sources_and_reference) > 1:
-        raise SourceInserterException("The reference item {0} is defined in multiple target_sources statements: {1}".format(reference_item, \
-            ["target_sources({})".format(target_sources_stmt_and_reference[0].target_name) for target_sources_stmt_and_reference in relevant_target_sources_and_reference]))
+def _get_scope_segment(full_cmake_source, items, anchor_location):
+    """ The indices of the items that are only separated by whitespace and comments from the item at the anchor location
 
-    return relevant_target_sources_and_reference[0][0], relevant_target_sources_and_reference[0][1]
+    Scope specifiers like PUBLIC split the list of a target_sources statement, sorting happens within one part. Without an
+    anchor location (or when it isn't found), the last part is used, which is where an unsorted insertion goes."""
+    segments = [[]]
+    for index, item in enumerate(items):
+        if index > 0 and _comment_regex.sub("", full_cmake_source[items[index - 1].get_end_location():item.location]).strip():
+            segments.append([])
+        segments[-1].append(index)
 
-def _find_source_item(cmake_string_list, source_item):
-    try:
-        return next(list_item for list_item in cmake_string_list.items if isinstance(list_item, ast.ListItemString) and source_item == list_item.list_item_string.rstrip('"').lstrip('"'))
-    except StopIteration:
+    for segment in segments:
+        if any(items[index].location == anchor_location for index in segment):
+            return segment
+    return segments[-1]
+
+def _get_whitespace_before_item(full_cmake_source, items, index):
+    """ The run of whitespace right in front of the item, a scope specifier or a comment before that run is left out """
+    if index == 0:
         return None
+    gap = full_cmake_source[items[index - 1].get_end_location():items[index].location]
+    return gap[len(gap.rstrip()):] or None
+
+def _move_to_sorted_position(full_cmake_source, insert_action, cmake_string_list_ast, anchor_location=None):
+    """ Moves the action in front of the first list item string that sorts after it, with the whitespace in front of that item
+
+    Only the items in the same scope segment as the anchor location are considered, see _get_scope_segment. Returns False
+    when the action stays at the end of the list, because the segment isn't sorted or the source sorts after every item of
+    the last segment."""
+    items = cmake_string_list_ast.items
+    if not all(hasattr(item, "location") and hasattr(item, "get_end_location") for item in items):
+        return False #a composed list item has no location, there may be no room next to it
+
+    segment = _get_scope_segment(full_cmake_source, items, anchor_location)
+    string_item_indices = [index for index in segment if isinstance(items[index], ast.ListItemString)]
+    keys = [_get_sort_key(items[index].list_item_string) for index in string_item_indices]
+    if not keys or any(keys[index] > keys[index + 1] for index in range(len(keys) - 1)):
+        return False
+
+    sorted_index = bisect.bisect_right(keys, _get_sort_key(insert_action.content.strip()))
+    if sorted_index == len(keys):
+        if segment[-1] == len(items) - 1:
+            return False
+        #the segment is followed by a scope specifier, so the source goes right after the last item of the segment
+        last_index = segment[-1]
+        whitespace = _get_whitespace_before_item(full_cmake_source, items, last_index) or " "
+        insert_action.position = items[last_index].get_end_location()
+        insert_action.content = whitespace + insert_action.content.strip()
+        return True
+
+    next_index = string_item_indices[sorted_index]
+    whitespace = _get_whitespace_before_item(full_cmake_source, items, next_index)
+    if whitespace is None and len(segment) > 1:
+        whitespace = _get_whitespace_before_item(full_cmake_source, items, segment[1])
+    insert_action.position = items[next_index].location
+    insert_action.content = insert_action.content.strip() + (whitespace or " ")
+    return True
+
+def _make_inserter_for_item_next_to_other_source(cmake_ast, reference_item):
+    """ A reference in a target declaration goes before one in a variable declaration, which goes before one in a target_sources statement """
+    cmake_ast_index = cmake_ast if isinstance(cmake_ast, CMakeAstIndex) else CMakeAstIndex(cmake_ast)
+    statements_and_references = cmake_ast_index.find_source_items(reference_item)
+
+    for statement_types, make_inserter, describe_statements in _reference_statement_kinds:
+        relevant_statements_and_references = [statement_and_reference for statement_and_reference in statements_and_references 
+            if isinstance(statement_and_reference[0], statement_types)]
+        if len(relevant_statements_and_references) > 1:
+            raise SourceInserterException("The reference item {0} is defined in multiple {1}".format(reference_item, 
+                describe_statements([statement for statement, _ in relevant_statements_and_references])))
+        if relevant_statements_and_references:
+            statement, reference_ast = relevant_statements_and_references[0]
+            return _InserterWithMatchedReference(make_inserter(statement), reference_ast)
+
+    raise SourceInserterException("The reference item {} is not declared in any (supported) cmake statement".format(reference_item))
+
+def _make_target_inserter(target):
+    return _AddLibraryInserter(target) if isinstance(target, ast.AddLibrary) else _AddExecutableInserter(target)
+
+_reference_statement_kinds = [
+    ((ast.AddLibrary, ast.AddExecutable), _make_target_inserter, 
+        lambda targets: "targets: {}".format([_make_target_inserter(target).get_name() for target in targets])),
+    (ast.SetNormalVariable, _SetNormalVariableInserter, 
+        lambda declarations: "variable declarations: {}".format([declaration.var_name for declaration in declarations])),
+    (ast.TargetSources, _TargetSourcesInserter, 
+        lambda target_sources_stmts: "target_sources statements: {}".format(["target_sources({})".format(target_sources_stmt.target_name) for target_sources_stmt in target_sources_stmts]))]
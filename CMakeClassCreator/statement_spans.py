@@ -0,0 +1,120 @@
+""" Finds where the supported cmake statements start, without parsing them
+
+Most of a cmake script consists of statements that are never matched (if, find_package, target_link_libraries, ...).
+The span of each set, add_library, add_executable and target_sources statement is found with a cheap pre-pass, so the
+grammar only needs to be tried at the start of those spans.
+
+Keywords are found the same way the grammar finds them: case-insensitively, also when they are part of a longer word
+(unset(...) contains set(...)) and only outside comments.
+"""
+
+import re
+
+from CMakeClassCreator import handwritten_parser
+
+_statement_keyword_regex = re.compile(r"#|set|add_library|add_executable|target_sources", re.IGNORECASE)
+_statement_keywords = ["set", "add_library", "add_executable", "target_sources"]
+
+_parenthesis_content_regex = re.compile(r'[()#"]')
+_quoted_argument_regex = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+
+class StatementSpan(object):
+    """ A candidate statement, from the start of its keyword up to and including the balancing closing parenthesis
+
+    When the parentheses are never balanced or a quoted argument is never closed, the span runs up to the end of the cmake source"""
+    def __init__(self, keyword, location, end_location):
+        self.keyword = keyword
+        self.location = location
+        self.end_location = end_location
+
+    def get_location(self):
+        return self.location
+
+    def get_end_location(self):
+        return self.end_location
+
+    def get_text(self, full_cmake_source):
+        return full_cmake_source[self.location:self.end_location]
+
+def _find_balancing_parenthesis_end(full_cmake_source, open_parenthesis_location):
+    depth = 1
+    position = open_parenthesis_location + 1
+    while True:
+        match = _parenthesis_content_regex.search(full_cmake_source, position)
+        if match is None:
+            return len(full_cmake_source)
+
+        position = match.end()
+        character = match.group()
+        if character == "(":
+            depth += 1
+        elif character == ")":
+            depth -= 1
+            if depth == 0:
+                return position
+        elif character == "#":
+            position = handwritten_parser.find_end_of_comment(full_cmake_source, position)
+        else:
+            quoted_argument = _quoted_argument_regex.match(full_cmake_source, match.start())
+            if quoted_argument is None:
+                return len(full_cmake_source)
+            position = quoted_argument.end()
+
+def _find_next_statement_keyword(full_cmake_source, position):
+    """ Returns the next statement keyword outside a comment and the location after the whitespace and comments that follow it """
+    while True:
+        match = _statement_keyword_regex.search(full_cmake_source, position)
+        if match is None:
+            return None
+
+        if match.group() == "#":
+            position = handwritten_parser.find_end_of_comment(full_cmake_source, match.start())
+            continue
+
+        #the grammar compares upper case keywords, ſet (with a long s) is a set statement there, but .lower() alone would keep the ſ
+        keyword = match.group().upper().lower()
+        if keyword not in _statement_keywords:
+            position = match.start() + 1
+            continue
+
+        return keyword, match.start(), handwritten_parser.skip_whitespace_and_comments(full_cmake_source, match.end())
+
+def find_next_statement_span(full_cmake_source, position=0):
+    """ Returns the span of the first candidate statement that starts at or after the given position, or None """
+    while True:
+        keyword_and_locations = _find_next_statement_keyword(full_cmake_source, position)
+        if keyword_and_locations is None:
+            return None
+
+        keyword, location, open_parenthesis_location = keyword_and_locations
+        if not full_cmake_source.startswith("(", open_parenthesis_location):
+            position = location + 1
+            continue
+
+        return StatementSpan(keyword, location, _find_balancing_parenthesis_end(full_cmake_source, open_parenthesis_location))
+
+def find_undecided_statement_keyword(full_cmake_source, position=0):
+    """ Returns the location of the first keyword that is followed by nothing but whitespace and comments, or None
+
+    When only the start of a cmake source is available, whether such a keyword starts a statement depends on what follows."""
+    while True:
+        keyword_and_locations = _find_next_statement_keyword(full_cmake_source, position)
+        if keyword_and_locations is None:
+            return None
+
+        keyword, location, open_parenthesis_location = keyword_and_locations
+        if open_parenthesis_location == len(full_cmake_source):
+            return location
+        position = location + 1
+
+def find_statement_spans(full_cmake_source):
+    """ Returns the spans of all candidate statements, a statement nested in the span of another one is not included """
+    spans = []
+    position = 0
+    while True:
+        span = find_next_statement_span(full_cmake_source, position)
+        if span is None:
+            return spans
+
+        spans.append(span)
+        position = span.end_location
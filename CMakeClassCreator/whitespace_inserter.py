@@ -9,6 +9,10 @@ class LessThanTwoItemsException(WhitespaceInsertException):
     """ To deduce what whitespace is between two elements, there must be at least two elements """
     pass
 
+class ItemWithoutLocationException(WhitespaceInsertException):
+    """ A composed list item has no location, so the whitespace next to it can't be found """
+    pass
+
 def enhance_insert_action_with_whitespace_used_in_cmake_string_list(full_cmake_source, insert_action, cmake_string_list_ast):
     try:
         insert_action.whitespace_prefix = get_content_between_second_to_last_and_last_item(full_cmake_source, cmake_string_list_ast)
@@ -19,6 +23,10 @@ def get_content_between_second_to_last_and_last_item(full_cmake_source, cmake_st
     if len(cmake_string_list_ast.items)<2:
         raise LessThanTwoItemsException()
 
-    begin_index, end_index = cmake_string_list_ast.items[-2].get_end_location(), cmake_string_list_ast.items[-1].location
+    second_to_last_item, last_item = cmake_string_list_ast.items[-2], cmake_string_list_ast.items[-1]
+    if not hasattr(second_to_last_item, "get_end_location") or not hasattr(last_item, "location"):
+        raise ItemWithoutLocationException()
+
+    begin_index, end_index = second_to_last_item.get_end_location(), last_item.location
     return full_cmake_source[begin_index:end_index]
 
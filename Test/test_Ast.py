@@ -165,6 +165,101 @@ class TestAst(unittest.TestCase):
             ast.CMakeStringList([ast.ListItemStringWithLocation("windows_util.h", 215), ast.ListItemStringWithLocation("windows_util.c", 230)]))
         self.assertTrue(list(matches[3])[0].is_same(expected_fourth_match))
     
+    def test_grammar_is_built_on_first_use(self):
+        given_ast = ast.Ast()
+        self.assertIsNone(given_ast._grammar)
+
+        given_ast.parse("set(TabsPls_Source main.cpp)")
+        grammar = given_ast._grammar
+        self.assertIsNotNone(grammar)
+
+        given_ast.scan_all("set(TabsPls_Source main.cpp)")
+        self.assertIs(given_ast._grammar, grammar)
+
+    def test_handwritten_backend_doesnt_build_grammar(self):
+        given_ast = ast.Ast(ast.HANDWRITTEN_BACKEND)
+        given_ast.scan_all("set(TabsPls_Source main.cpp)")
+        self.assertIsNone(given_ast._grammar)
+
+    def test_get_shared_ast(self):
+        self.assertIs(ast.get_shared_ast(), ast.get_shared_ast(ast.PYPARSING_BACKEND))
+        self.assertIsNot(ast.get_shared_ast(ast.PYPARSING_BACKEND), ast.get_shared_ast(ast.HANDWRITTEN_BACKEND))
+
+    def test_scan_all_gives_the_same_matches_as_scanning_every_offset(self):
+        given_source = ("# set(commented out)\n"
+            + "message(\"set(in_a_string value)\")\n"
+            + "unset(TabsPls_Headers File.hpp)\n"
+            + "set(outer PUBLIC set(inner value))\n"
+            + "add_executable(TabsPls ${TabsPls_Headers} \"${TabsPls_Sources}\")\n"
+            + "target_sources(TabsPls PRIVATE windows_util.h PUBLIC windows_util.c)")
+        given_ast = ast.Ast()
+
+        matches = given_ast.scan_all(given_source)
+        expected_matches = [match for match, start, end in given_ast._parser._cmake_stmt.scanString(given_source)]
+
+        self.assertEqual(len(matches), 5)
+        self.assertEqual(len(matches), len(expected_matches))
+        for match, expected_match in zip(matches, expected_matches):
+            self.assertTrue(list(match)[0].is_same(list(expected_match)[0]))
+
+    def test_iter_statements_is_lazy(self):
+        given_source = "set(TabsPls_Headers File.hpp)\nset(ENV{PATH} unused)\nadd_executable(TabsPls ${TabsPls_Headers})"
+
+        for backend in ast.backends:
+            statements = ast.Ast(backend).iter_statements(given_source)
+            self.assertTrue(next(statements).is_same(ast.SetNormalVariable("TabsPls_Headers", ast.CMakeStringList([ast.ListItemStringWithLocation("File.hpp", 20)]))))
+            self.assertTrue(next(statements).is_same(ast.AddExecutable("TabsPls", ast.CMakeStringList([ast.VariableUseWithLocation("TabsPls_Headers", 75)]))))
+            self.assertRaises(StopIteration, next, statements)
+
+    def test_iter_statements_skips_statements_without_name(self):
+        given_source = ("set(TabsPls_Headers File.hpp)\n"
+            + "set(outer PUBLIC set(inner File.cpp))\n"
+            + "target_sources(TabsPls PRIVATE File.cpp)")
+
+        for backend in ast.backends:
+            statements = list(ast.Ast(backend).iter_statements(given_source, "File.cpp"))
+            self.assertEqual([type(statement) for statement in statements], [ast.SetNormalVariable, ast.TargetSources])
+            self.assertEqual(statements[0].var_name, "inner")
+
+    def test_iter_statements_skips_statements_without_any_of_the_names(self):
+        given_source = "set(TabsPls_Headers File.hpp)\nset(TabsPls_Sources File.cpp)\nadd_executable(TabsPls Main.cpp)"
+
+        for backend in ast.backends:
+            self.assertEqual([statement.var_name for statement in ast.Ast(backend).iter_statements(given_source, ["File.cpp", "Other.cpp"])], ["TabsPls_Sources"])
+            self.assertEqual(len(list(ast.Ast(backend).iter_statements(given_source, ["File.hpp", "Main.cpp"]))), 2)
+            self.assertEqual(list(ast.Ast(backend).iter_statements(given_source, [])), [])
+
+    def test_compact_cmake_string_list(self):
+        given_source = 'set(TabsPls_Sources Main.cpp "${ Other_Sources }" ${dir}/File.cpp)'
+        cmake_string_list = ast.Ast(ast.HANDWRITTEN_BACKEND).parse(given_source)[0].cmake_string_list
+
+        self.assertIsInstance(cmake_string_list, ast.CompactCMakeStringList)
+        self.assertEqual(len(cmake_string_list.items), 3)
+        self.assertTrue(cmake_string_list.items[0].is_same(ast.ListItemStringWithLocation("Main.cpp", 20)))
+        self.assertTrue(cmake_string_list.items[-2].is_same(ast.VariableUseWithLocation("Other_Sources", 29)))
+        self.assertEqual(cmake_string_list.items[-2].get_end_location(), 49)
+        self.assertEqual(cmake_string_list.items[2:], ["${dir}/File.cpp"])
+        self.assertRaises(IndexError, cmake_string_list.items.__getitem__, 3)
+        self.assertEqual(cmake_string_list.full_cmake_source, 'Main.cpp "${ Other_Sources }" ${dir}/File.cpp')
+
+        ast.shift_locations(cmake_string_list, 100)
+        self.assertEqual(cmake_string_list.items[0].get_location(), 120)
+        self.assertEqual(cmake_string_list.items[0].list_item_string, "Main.cpp")
+
+    def test_compact_cmake_string_list_of_target_sources_keeps_only_its_statement(self):
+        given_source = "set(Other a.cpp)\ntarget_sources(TabsPls PRIVATE Main.cpp PUBLIC ${Headers})\nset(Last b.cpp)"
+        cmake_string_list = ast.Ast(ast.HANDWRITTEN_BACKEND).scan_all(given_source)[1][0].cmake_string_list
+
+        self.assertEqual(cmake_string_list.full_cmake_source, "Main.cpp PUBLIC ${Headers}")
+        self.assertTrue(cmake_string_list.items[0].is_same(ast.ListItemStringWithLocation("Main.cpp", 48)))
+        self.assertTrue(cmake_string_list.items[1].is_same(ast.VariableUseWithLocation("Headers", 64)))
+        self.assertEqual(cmake_string_list.items[1].get_end_location(), 74)
+
+    def test_ast_components_have_no_instance_dictionary(self):
+        for ast_item in [ast.ListItemStringWithLocation("Main.cpp", 0), ast.VariableUseWithStartAndEndLocation("Sources", 0, ast.VariableUseTerminator(10)),
+            ast.SetNormalVariable("Sources", ast.CMakeStringList([]))]:
+            self.assertFalse(hasattr(ast_item, "__dict__"))
+
     def test_list_item_string_with_terminator(self):
         given_ast = ast.Ast()
 
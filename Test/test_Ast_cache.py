@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import context
+
+from CMakeClassCreator import ast, ast_cache
+from test_Handwritten_parser import _describe
+
+_given_source = ("set(TabsPls_Sources Main.cpp ${dir}/Directory.cpp \"${Generated_Sources}\")\n"
+    + "add_executable(TabsPls WIN32 ${TabsPls_Sources})\n"
+    + "target_sources(TabsPls PRIVATE windows_util.h PUBLIC windows_util.c)")
+
+class TestAstCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_directory = os.path.join(self.directory, "cache")
+        self.cmakelists_path = os.path.join(self.directory, "CMakeLists.txt")
+        with open(self.cmakelists_path, 'w') as cmakelists_file:
+            cmakelists_file.write(_given_source)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _parse(self, backend=ast.HANDWRITTEN_BACKEND):
+        self.parse_count = getattr(self, "parse_count", 0) + 1
+        return [match[0] for match in ast.Ast(backend).scan_all(_given_source)]
+
+    def _cache_entries(self):
+        return [file_name for file_name in os.listdir(self.cache_directory) if file_name.endswith(".ast")]
+
+    def test_encode_and_decode(self):
+        for backend in ast.backends:
+            full_cmake_ast = self._parse(backend)
+            self.assertEqual([_describe(statement) for statement in ast_cache.decode_ast(ast_cache.encode_ast(full_cmake_ast))],
+                [_describe(statement) for statement in full_cmake_ast])
+
+    def test_decode_invalid_entry(self):
+        self.assertRaises(ast_cache.AstCacheException, ast_cache.decode_ast, b"not an entry")
+        self.assertRaises(ast_cache.AstCacheException, ast_cache.decode_ast, ast_cache.encode_ast(self._parse())[:-3])
+
+    def test_load_or_parse_parses_once(self):
+        given_cache = ast_cache.AstCache(self.cache_directory)
+
+        first_ast = given_cache.load_or_parse(self.cmakelists_path, self._parse)
+        second_ast = given_cache.load_or_parse(self.cmakelists_path, self._parse)
+
+        self.assertEqual(self.parse_count, 1)
+        self.assertEqual([_describe(statement) for statement in first_ast], [_describe(statement) for statement in second_ast])
+
+    def test_changed_content_is_parsed_again(self):
+        given_cache = ast_cache.AstCache(self.cache_directory)
+        given_cache.load_or_parse(self.cmakelists_path, self._parse)
+
+        with open(self.cmakelists_path, 'a') as cmakelists_file:
+            cmakelists_file.write("\nset(Other_Sources Other.cpp)")
+
+        self.assertIsNone(given_cache.load(self.cmakelists_path))
+
+    def test_modification_time_and_size_skip_hashing(self):
+        given_cache = ast_cache.AstCache(self.cache_directory)
+        an_hour_ago = time.time() - 3600
+        os.utime(self.cmakelists_path, (an_hour_ago, an_hour_ago))
+        given_cache.load_or_parse(self.cmakelists_path, self._parse)
+
+        #same size and modification time, only the recorded hash can give a cache hit
+        with open(self.cmakelists_path, 'w') as cmakelists_file:
+            cmakelists_file.write(_given_source.replace("Main.cpp", "Next.cpp"))
+        os.utime(self.cmakelists_path, (an_hour_ago, an_hour_ago))
+
+        self.assertIsNotNone(given_cache.load(self.cmakelists_path))
+
+    def test_read_cmake_source_is_hashed_instead_of_the_file(self):
+        for given_cache in [ast_cache.AstCache(self.cache_directory), ast_cache.InMemoryAstCache()]:
+            self.parse_count = 0
+            an_hour_ago = time.time() - 3600
+            os.utime(self.cmakelists_path, (an_hour_ago, an_hour_ago))
+            cmakelists_stat = os.stat(self.cmakelists_path)
+            given_cache.load_or_parse(self.cmakelists_path, self._parse, full_cmake_source=_given_source, cmakelists_stat=cmakelists_stat)
+
+            #the file changes after the caller read it, the AST still belongs to the cmake source that was read
+            with open(self.cmakelists_path, 'w') as cmakelists_file:
+                cmakelists_file.write("set(Other_Sources Other.cpp)")
+            given_cache.load_or_parse(self.cmakelists_path, self._parse, full_cmake_source=_given_source, cmakelists_stat=cmakelists_stat)
+            self.assertEqual(self.parse_count, 1)
+
+            given_cache.load_or_parse(self.cmakelists_path, lambda: [], full_cmake_source="set(Other_Sources Other.cpp)")
+            self.assertEqual(self.parse_count, 1)
+            if isinstance(given_cache, ast_cache.AstCache):
+                self.assertEqual(given_cache.load(self.cmakelists_path), [])
+
+            with open(self.cmakelists_path, 'w') as cmakelists_file:
+                cmakelists_file.write(_given_source)
+
+    def test_backend_and_grammar_version_are_part_of_the_key(self):
+        given_cache = ast_cache.AstCache(self.cache_directory)
+        given_cache.load_or_parse(self.cmakelists_path, self._parse)
+
+        self.assertIsNone(given_cache.load(self.cmakelists_path, ast.PYPARSING_BACKEND))
+
+        grammar_version = ast.grammar_version
+        ast.grammar_version += 1
+        try:
+            self.assertIsNone(given_cache.load(self.cmakelists_path))
+        finally:
+            ast.grammar_version = grammar_version
+
+    def test_corrupt_entry_is_removed(self):
+        given_cache = ast_cache.AstCache(self.cache_directory)
+        given_cache.load_or_parse(self.cmakelists_path, self._parse)
+        with open(os.path.join(self.cache_directory, self._cache_entries()[0]), 'wb') as entry:
+            entry.write(b"garbage")
+
+        self.assertIsNone(given_cache.load(self.cmakelists_path))
+        self.assertEqual(self._cache_entries(), [])
+
+    def test_evict_by_size(self):
+        given_cache = ast_cache.AstCache(self.cache_directory, max_total_size=0)
+        given_cache.load_or_parse(self.cmakelists_path, self._parse)
+        self.assertEqual(self._cache_entries(), [])
+
+    def test_evict_by_age(self):
+        given_cache = ast_cache.AstCache(self.cache_directory)
+        given_cache.load_or_parse(self.cmakelists_path, self._parse)
+        entry_path = os.path.join(self.cache_directory, self._cache_entries()[0])
+        long_ago = time.time() - ast_cache.default_max_age_seconds - 60
+        os.utime(entry_path, (long_ago, long_ago))
+
+        given_cache.evict()
+
+        self.assertEqual(self._cache_entries(), [])
+
+    def test_in_memory_cache(self):
+        given_cache = ast_cache.InMemoryAstCache(max_entries=1)
+        first_ast = given_cache.load_or_parse(self.cmakelists_path, self._parse)
+        self.assertIs(given_cache.load_or_parse(self.cmakelists_path, self._parse), first_ast)
+
+        #a new modification time with the same content keeps the AST
+        os.utime(self.cmakelists_path, (time.time() - 3600, time.time() - 3600))
+        self.assertIs(given_cache.load_or_parse(self.cmakelists_path, self._parse), first_ast)
+        self.assertEqual(self.parse_count, 1)
+
+        with open(self.cmakelists_path, 'a') as cmakelists_file:
+            cmakelists_file.write("\nset(Other_Sources Other.cpp)")
+        given_cache.load_or_parse(self.cmakelists_path, self._parse)
+        self.assertEqual(self.parse_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
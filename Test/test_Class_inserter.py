@@ -2,7 +2,7 @@ import unittest
 
 import context
 
-from CMakeClassCreator import class_inserter, ast
+from CMakeClassCreator import class_inserter, ast, list_item_string_path
 
 class TestClassInserter(unittest.TestCase):
     def test_insert_class_next_to_other_class(self):
@@ -44,5 +44,28 @@ class TestClassInserter(unittest.TestCase):
             + "add_executable(TabsPls ${TabsPls_Headers} ${TabsPls_Sources})\n"
             + "target_sources(TabsPls PRIVATE windows_util.h windows_util.c)"))
 
+    def test_class_stem_index(self):
+        given_source = ("set(TabsPls_Headers Source/File.hpp Directory.h Directory.hpp)\n"
+            + "add_executable(TabsPls ${TabsPls_Headers} \"Source/File.cpp\" Main.cpp README.md)")
+        given_class_stem_index = class_inserter.ClassStemIndex(match[0] for match in ast.Ast().scan_all(given_source))
+
+        self.assertEqual(sorted(given_class_stem_index.class_files), ["Directory", "File", "Main"])
+        class_files = given_class_stem_index.find_class_files(list_item_string_path.PathAwareListItemString("File"))
+        self.assertEqual({extension: [list_item.list_item_string for _, list_item in statements_and_items] for extension, statements_and_items in class_files.items()},
+            {".hpp": ["Source/File.hpp"], ".cpp": ["\"Source/File.cpp\""]})
+        self.assertEqual(sorted(given_class_stem_index.find_class_files(list_item_string_path.PathAwareListItemString("Directory"))), [".h", ".hpp"])
+        self.assertEqual(given_class_stem_index.find_class_files(list_item_string_path.PathAwareListItemString("README")), {})
+
+    def test_class_with_more_than_one_header_extension(self):
+        given_ast = [match[0] for match in ast.Ast().scan_all("add_library(TabsPls Directory.h Directory.hpp Directory.cpp)")]
+
+        with self.assertRaises(class_inserter.ClassInserterException) as context_manager:
+            class_inserter.insert_class_next_to_other_class(given_ast, "File", "Directory")
+        self.assertIn("['.hpp', '.h']", str(context_manager.exception))
+
+    def test_class_without_implementation_file(self):
+        given_class_stem_index = class_inserter.ClassStemIndex(ast.Ast().parse("add_library(TabsPls Directory.hpp)"))
+        self.assertRaises(class_inserter.ClassInserterException, class_inserter.insert_class_next_to_other_class, given_class_stem_index, "File", "Directory")
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
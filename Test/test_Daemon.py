@@ -0,0 +1,189 @@
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import context
+
+import cmake_create_class
+from CMakeClassCreator import daemon
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.directory, "daemon.sock")
+        self.cmakelists_path = os.path.join(self.directory, "CMakeLists.txt")
+        with open(self.cmakelists_path, 'w') as cmakelists_file:
+            cmakelists_file.write("set(TabsPls_Sources\n    Main.cpp\n    Directory.cpp\n    Directory.hpp\n)\nadd_executable(TabsPls ${TabsPls_Sources})\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _start_daemon(self, idle_timeout_seconds=60):
+        given_daemon = daemon.Daemon(self.socket_path, cmake_create_class.make_daemon_methods(), [cmake_create_class.CMakeClassCreatorException], idle_timeout_seconds)
+        serving_thread = threading.Thread(target=given_daemon.serve_until_idle)
+        serving_thread.start()
+        return serving_thread
+
+    def _stop_daemon(self, serving_thread):
+        daemon.call(self.socket_path, "shutdown", {})
+        serving_thread.join(10)
+        self.assertFalse(serving_thread.is_alive())
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_methods(self):
+        serving_thread = self._start_daemon()
+        try:
+            result = daemon.call(self.socket_path, "create_class", {"cmakelists": self.cmakelists_path, "name": "File", "reference_class": "Directory"})
+            self.assertEqual(result["cmakelists_path"], self.cmakelists_path)
+            self.assertIn("    File.cpp\n    File.hpp\n", result["full_cmake_source"])
+
+            result = daemon.call(self.socket_path, "insert_single_source_in_variable", {"cmakelists": self.cmakelists_path, "name": "File.cpp", "variable": "TabsPls_Sources"})
+            self.assertIn("    Directory.hpp\n    File.cpp\n", result["full_cmake_source"])
+
+            result = daemon.call(self.socket_path, "insert_single_source_in_target", {"cmakelists": self.cmakelists_path, "name": "File.cpp", "target": "TabsPls"})
+            self.assertIn("add_executable(TabsPls ${TabsPls_Sources} File.cpp)", result["full_cmake_source"])
+
+            result = daemon.call(self.socket_path, "insert_single_source_next_to_reference", {"cmakelists": self.cmakelists_path, "name": "File.cpp", "reference_class": "Main.cpp"})
+            self.assertIn("    Directory.hpp\n    File.cpp\n", result["full_cmake_source"])
+        finally:
+            self._stop_daemon(serving_thread)
+
+    def test_changed_cmake_script_is_parsed_again(self):
+        serving_thread = self._start_daemon()
+        try:
+            daemon.call(self.socket_path, "insert_single_source_in_variable", {"cmakelists": self.cmakelists_path, "name": "File.cpp", "variable": "TabsPls_Sources"})
+            with open(self.cmakelists_path, 'w') as cmakelists_file:
+                cmakelists_file.write("set(Other_Sources Main.cpp)\n")
+
+            result = daemon.call(self.socket_path, "insert_single_source_in_variable", {"cmakelists": self.cmakelists_path, "name": "File.cpp", "variable": "Other_Sources"})
+            self.assertEqual(result["full_cmake_source"], "set(Other_Sources Main.cpp File.cpp)\n")
+        finally:
+            self._stop_daemon(serving_thread)
+
+    def test_errors(self):
+        serving_thread = self._start_daemon()
+        try:
+            with self.assertRaises(daemon.DaemonException) as context_manager:
+                daemon.call(self.socket_path, "create_class", {"cmakelists": self.cmakelists_path, "name": "File", "reference_class": "Missing"})
+            self.assertEqual(context_manager.exception.code, daemon.APPLICATION_ERROR)
+
+            with self.assertRaises(daemon.DaemonException) as context_manager:
+                daemon.call(self.socket_path, "remove_class", {})
+            self.assertEqual(context_manager.exception.code, daemon.METHOD_NOT_FOUND)
+
+            with self.assertRaises(daemon.DaemonException) as context_manager:
+                daemon.call(self.socket_path, "create_class", {"cmakelists": self.cmakelists_path})
+            self.assertEqual(context_manager.exception.code, daemon.INVALID_PARAMS)
+
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(self.socket_path)
+                client.sendall(b"not json\n")
+                with client.makefile('rb') as response_file:
+                    self.assertEqual(json.loads(response_file.readline().decode("utf-8"))["error"]["code"], daemon.PARSE_ERROR)
+        finally:
+            self._stop_daemon(serving_thread)
+
+    def test_concurrent_clients(self):
+        serving_thread = self._start_daemon()
+        results = []
+        def insert(index):
+            results.append(daemon.call(self.socket_path, "insert_single_source_in_variable", 
+                {"cmakelists": self.cmakelists_path, "name": "File{}.cpp".format(index), "variable": "TabsPls_Sources"}))
+        try:
+            client_threads = [threading.Thread(target=insert, args=(index,)) for index in range(8)]
+            for client_thread in client_threads:
+                client_thread.start()
+            for client_thread in client_threads:
+                client_thread.join(10)
+            self.assertEqual(sorted(result["full_cmake_source"].count("File") for result in results), [1] * 8)
+        finally:
+            self._stop_daemon(serving_thread)
+
+    def test_idle_timeout(self):
+        serving_thread = self._start_daemon(idle_timeout_seconds=0.2)
+        serving_thread.join(10)
+        self.assertFalse(serving_thread.is_alive())
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_daemon_that_doesnt_answer_is_bypassed(self):
+        given_args = cmake_create_class.create_arg_parser().parse_args([self.cmakelists_path, "File.cpp", "-t", "TabsPls", "--daemon-socket", self.socket_path])
+        call_timeout_seconds = daemon.default_call_timeout_seconds
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as hung_daemon:
+            hung_daemon.bind(self.socket_path)
+            hung_daemon.listen(1)
+            daemon.default_call_timeout_seconds = 0.1
+            try:
+                self.assertIsNone(cmake_create_class._call_daemon_if_running(given_args))
+            finally:
+                daemon.default_call_timeout_seconds = call_timeout_seconds
+
+    def test_no_daemon_doesnt_look_for_the_socket(self):
+        given_args = cmake_create_class.create_arg_parser().parse_args([self.cmakelists_path, "File.cpp", "-t", "TabsPls", "--no-daemon"])
+        default_socket_path = daemon.default_socket_path
+        def fail():
+            raise AssertionError("the default socket path is not needed")
+        daemon.default_socket_path = fail
+        try:
+            self.assertIsNone(cmake_create_class._call_daemon_if_running(given_args))
+            self.assertIsNone(cmake_create_class.create_daemon_arg_parser().parse_args([]).socket)
+        finally:
+            daemon.default_socket_path = default_socket_path
+
+    def test_untrusted_socket_is_bypassed(self):
+        given_args = cmake_create_class.create_arg_parser().parse_args([self.cmakelists_path, "File.cpp", "-t", "TabsPls", "--daemon-socket", self.socket_path])
+        with open(self.socket_path, 'w'):
+            pass
+        self.assertFalse(daemon.is_trusted_socket(self.socket_path))
+        os.remove(self.socket_path)
+
+        serving_thread = self._start_daemon()
+        try:
+            self.assertTrue(daemon.is_trusted_socket(self.socket_path))
+            self.assertIsNotNone(cmake_create_class._call_daemon_if_running(given_args))
+
+            os.chmod(self.directory, 0o777)
+            self.assertFalse(daemon.is_trusted_socket(self.socket_path))
+            self.assertIsNone(cmake_create_class._call_daemon_if_running(given_args))
+        finally:
+            os.chmod(self.directory, 0o700)
+            self._stop_daemon(serving_thread)
+
+    def test_daemon_result_for_another_cmake_script_is_rejected(self):
+        other_cmakelists_path = os.path.join(self.directory, "Other", "CMakeLists.txt")
+        def create_class(**params):
+            return [{"cmakelists_path": other_cmakelists_path, "full_cmake_source": ""}] if params.get("project") \
+                else {"cmakelists_path": other_cmakelists_path, "full_cmake_source": ""}
+        def insert_single_source_in_target(**params):
+            return {"cmakelists_path": self.cmakelists_path, "full_cmake_source": ""}
+        methods = {"create_class": create_class, "insert_single_source_in_target": insert_single_source_in_target}
+        foreign_daemon = daemon.Daemon(self.socket_path, methods, [], 60)
+        serving_thread = threading.Thread(target=foreign_daemon.serve_until_idle)
+        serving_thread.start()
+        try:
+            for arguments in [["File", "-rc", "Directory"], ["File", "-rc", "Directory", "--project"]]:
+                given_args = cmake_create_class.create_arg_parser().parse_args([self.cmakelists_path] + arguments + ["--daemon-socket", self.socket_path])
+                with mock.patch("sys.stderr", io.StringIO()) as stderr:
+                    self.assertIsNone(cmake_create_class._call_daemon_if_running(given_args))
+                self.assertIn(other_cmakelists_path, stderr.getvalue())
+
+            given_args = cmake_create_class.create_arg_parser().parse_args([self.cmakelists_path, "File.cpp", "-t", "TabsPls", "--daemon-socket", self.socket_path])
+            self.assertEqual(cmake_create_class._call_daemon_if_running(given_args).cmakelists_path, self.cmakelists_path)
+        finally:
+            self._stop_daemon(serving_thread)
+
+    def test_stale_socket_is_replaced(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale_socket:
+            stale_socket.bind(self.socket_path)
+
+        serving_thread = self._start_daemon()
+        self.assertRaises(daemon.DaemonException, daemon.Daemon, self.socket_path, {})
+        self._stop_daemon(serving_thread)
+
+if __name__ == '__main__':
+    unittest.main()
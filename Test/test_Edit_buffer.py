@@ -0,0 +1,103 @@
+import difflib
+import io
+import unittest
+
+import context
+
+from CMakeClassCreator import edit_buffer, source_inserter
+
+class TestEditBuffer(unittest.TestCase):
+    def test_same_result_as_doing_insert_actions_from_the_back(self):
+        given_source = "set(TabsPls_Sources Main.cpp)"
+        given_actions = [source_inserter.InsertAction(28, " File.hpp"), source_inserter.InsertAction(0, "#"), 
+            source_inserter.InsertAction(28, " File.cpp"), source_inserter.InsertAction(29, "\n")]
+
+        expected_source = given_source
+        for action in sorted(given_actions, reverse=True, key=lambda action: action.position):
+            expected_source = action.do(expected_source)
+
+        given_buffer = edit_buffer.EditBuffer(given_source)
+        for action in given_actions:
+            given_buffer.do(action)
+
+        self.assertEqual(given_buffer.text(), expected_source)
+        self.assertEqual(given_buffer.text(), "#set(TabsPls_Sources Main.cpp File.cpp File.hpp)\n")
+
+    def test_replace_and_write_to(self):
+        given_buffer = edit_buffer.EditBuffer("set(TabsPls_Sources Main.cpp)")
+        given_buffer.replace(20, 28, "Directory.cpp")
+        given_buffer.insert(20, "Main.cpp ")
+        given_buffer.insert(28, " File.cpp")
+
+        output = io.StringIO()
+        given_buffer.write_to(output)
+
+        self.assertEqual(output.getvalue(), "set(TabsPls_Sources Main.cpp Directory.cpp File.cpp)")
+
+    def test_conflicting_edits(self):
+        given_buffer = edit_buffer.EditBuffer("set(TabsPls_Sources Main.cpp)")
+        given_buffer.replace(20, 28, "Directory.cpp")
+        given_buffer.insert(24, "File.cpp")
+        self.assertRaises(edit_buffer.EditBufferException, given_buffer.text)
+
+        given_buffer = edit_buffer.EditBuffer("set(TabsPls_Sources Main.cpp)")
+        given_buffer.replace(20, 28, "Directory.cpp")
+        given_buffer.replace(4, 21, "Other_Sources")
+        self.assertRaises(edit_buffer.EditBufferException, given_buffer.text)
+
+    def test_edits_outside_of_the_source(self):
+        given_buffer = edit_buffer.EditBuffer("set(TabsPls_Sources Main.cpp)")
+        self.assertRaises(edit_buffer.EditBufferException, given_buffer.insert, 30, " File.cpp")
+        self.assertRaises(edit_buffer.EditBufferException, given_buffer.insert, -1, "#")
+        self.assertRaises(edit_buffer.EditBufferException, given_buffer.replace, 20, 10, "")
+
+    def test_edits_with_line_and_column(self):
+        given_buffer = edit_buffer.EditBuffer("set(TabsPls_Sources\n    Main.cpp\n)\n")
+        given_buffer.insert(32, "\n    File.hpp")
+        given_buffer.insert(32, "\n    File.cpp")
+        given_buffer.insert(20, "")
+        given_buffer.replace(0, 3, "list(APPEND")
+
+        self.assertEqual(given_buffer.edits(), [edit_buffer.Edit(0, 3, 1, 1, "list(APPEND"), 
+            edit_buffer.Edit(32, 32, 2, 13, "\n    File.cpp"), edit_buffer.Edit(32, 32, 2, 13, "\n    File.hpp")])
+        self.assertFalse(given_buffer.is_unchanged)
+
+    def test_unified_diff_is_the_same_as_difflib(self):
+        given_source = "".join("    Source{}.cpp\n".format(index) for index in range(20))
+        given_buffer = edit_buffer.EditBuffer(given_source)
+        given_buffer.insert(given_source.index(".cpp\n", 40) + 4, "\n    New1.cpp")
+        given_buffer.insert(given_source.index("    Source16"), "    New2.cpp\n")
+        given_buffer.insert(given_source.index("    Source18"), "    New3.cpp\n")
+        given_buffer.replace(0, 4, "")
+
+        for context_lines in range(4):
+            expected_diff = difflib.unified_diff(given_source.splitlines(True), given_buffer.text().splitlines(True), "CMakeLists.txt", "CMakeLists.txt", n=context_lines)
+            self.assertEqual(list(given_buffer.unified_diff("CMakeLists.txt", context_lines)), list(expected_diff))
+
+    def test_unified_diff_without_line_break_at_the_end(self):
+        given_buffer = edit_buffer.EditBuffer("set(TabsPls_Sources\n    Main.cpp)")
+        given_buffer.insert(32, "\n    File.cpp")
+
+        self.assertEqual("".join(given_buffer.unified_diff("CMakeLists.txt")), "--- CMakeLists.txt\n+++ CMakeLists.txt\n@@ -1,2 +1,3 @@\n set(TabsPls_Sources\n"
+            + "-    Main.cpp)\n\\ No newline at end of file\n+    Main.cpp\n+    File.cpp)\n\\ No newline at end of file\n")
+
+    def test_unchanged_source_has_no_diff(self):
+        given_buffer = edit_buffer.EditBuffer("set(TabsPls_Sources Main.cpp)\n")
+        given_buffer.insert(28, "")
+
+        self.assertTrue(given_buffer.is_unchanged)
+        self.assertEqual(given_buffer.edits(), [])
+        self.assertEqual(list(given_buffer.unified_diff("CMakeLists.txt")), [])
+
+    def test_lines_are_counted_over_blocks(self):
+        given_source = "set(TabsPls_Sources\n    Main.cpp\n)\n"
+        given_edit_spans = [(0, 0, "#"), (20, 20, " "), (33, 33, "\n    File.cpp"), (36, 36, "\n")]
+
+        for block_size in range(1, len(given_source) + 1):
+            given_blocks = [given_source[start:start + block_size] for start in range(0, len(given_source), block_size)]
+            self.assertEqual(edit_buffer.get_edits(given_blocks, given_edit_spans), edit_buffer.get_edits([given_source], given_edit_spans))
+            self.assertEqual(list(edit_buffer.iter_unified_diff(given_blocks, given_edit_spans, "CMakeLists.txt")), 
+                list(edit_buffer.iter_unified_diff([given_source], given_edit_spans, "CMakeLists.txt")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import random
+import unittest
+
+import context
+
+from CMakeClassCreator import ast, handwritten_parser
+
+def _describe(ast_item):
+    """ Turns an AST component into nested tuples, so results of both backends can be compared including all locations """
+    if isinstance(ast_item, (str, int)):
+        return ast_item
+    if isinstance(ast_item, ast.CMakeStringList):
+        return tuple(_describe(item) for item in ast_item.items)
+    attribute_names = sorted({name for ast_type in type(ast_item).__mro__ for name in getattr(ast_type, "__slots__", ())})
+    return (type(ast_item).__name__,) + tuple((name, _describe(getattr(ast_item, name))) for name in attribute_names)
+
+def _describe_matches(matches):
+    return [tuple(_describe(ast_item) for ast_item in match) for match in matches]
+
+class TestHandwrittenParser(unittest.TestCase):
+    def test_parse_set_normal_variable(self):
+        result = handwritten_parser.HandwrittenParser().parse("set(TabsPls_Source main.cpp ${other_var} \"${var_in_quotes}\")")
+
+        expected_result = ast.SetNormalVariable("TabsPls_Source", ast.CMakeStringList([ast.ListItemStringWithLocation("main.cpp", 19),
+            ast.VariableUseWithLocation("other_var", 28), ast.VariableUseWithLocation("var_in_quotes", 41)]))
+
+        self.assertTrue(result[0].is_same(expected_result))
+        self.assertEqual(result[0].cmake_string_list.items[2].get_end_location(), 59)
+
+    def test_parse_target_sources(self):
+        result = handwritten_parser.HandwrittenParser().parse("target_sources(TabsPls PRIVATE file_linux.h file_linux.cpp ${TabsPls_Sources_Linux} PUBLIC linux_extras.h)")
+
+        expected_result = ast.TargetSources("TabsPls", ast.CMakeStringList([ast.ListItemStringWithLocation("file_linux.h", 31),
+            ast.ListItemStringWithLocation("file_linux.cpp", 44),
+                ast.VariableUseWithLocation("TabsPls_Sources_Linux", 59),
+                    ast.ListItemStringWithLocation("linux_extras.h", 91)]))
+
+        self.assertTrue(result[0].is_same(expected_result))
+
+    def test_parse_unsupported_statement(self):
+        self.assertRaises(handwritten_parser.HandwrittenParserException, handwritten_parser.HandwrittenParser().parse, "project(TabsPls)")
+        self.assertRaises(handwritten_parser.HandwrittenParserException, handwritten_parser.HandwrittenParser().parse, "set(TabsPls_Source main.cpp")
+
+    def test_set_env_variable_is_matched_without_ast_component(self):
+        matches = handwritten_parser.HandwrittenParser().scan_all("set(ENV{ENV_VAR_NAME} value)\nset(var value)")
+
+        self.assertEqual(len(matches), 2)
+        self.assertEqual(matches[0], [])
+        self.assertTrue(matches[1][0].is_same(ast.SetNormalVariable("var", ast.CMakeStringList([ast.ListItemStringWithLocation("value", 37)]))))
+
+    def test_scan_all_skips_comments(self):
+        matches = handwritten_parser.HandwrittenParser().scan_all("# set(commented out)\nSET(var # also a comment )\n value)")
+
+        self.assertEqual(len(matches), 1)
+        self.assertTrue(matches[0][0].is_same(ast.SetNormalVariable("var", ast.CMakeStringList([ast.ListItemStringWithLocation("value", 49)]))))
+
+    def test_scan_all_matches_pyparsing_backend(self):
+        given_source = ("project(TabsPls)\n"
+            + "\tset(TabsPls_Headers File.hpp\n"
+            + "Directory.hpp # the parenthesis ) in this comment is ignored\n"
+            + ")\n\n"
+            + "Set(TabsPls_Sources \"File.cpp\"\n"
+            + "\t${dir}/Directory.cpp\n"
+            + "\t\" ${ quoted_with_whitespace }\"\n"
+            + "\tMain.cpp PARENT_SCOPE\n"
+            + ")\n\n"
+            + "set(ENV{PATH} unused)\n"
+            + "if(WIN32)\n"
+            + "  add_library(TabsPlsLib STATIC EXCLUDE_FROM_ALL lib.cpp)\n"
+            + "endif()\n"
+            + "add_executable(TabsPls WIN32 ${TabsPls_Headers} ${TabsPls_Sources})\n\n"
+            + "target_sources(TabsPls PRIVATE windows_util.h windows_util.c INTERFACE \"${interface_sources}\")")
+
+        self.assertEqual(_describe_matches(ast.Ast(ast.HANDWRITTEN_BACKEND).scan_all(given_source)),
+            _describe_matches(ast.Ast(ast.PYPARSING_BACKEND).scan_all(given_source)))
+
+    def test_scan_all_matches_pyparsing_backend_on_random_source(self):
+        fragments = ["set", "SET", "add_library", "add_executable", "target_sources", "(", ")", " ", "\n", "\t", "#", "${", "}", '"',
+            "var", "file.cpp", "dir/", "ENV", "{", "PRIVATE", "PUBLIC", "STATIC", "WIN32", "PARENT_SCOPE", "\\"]
+        given_random = random.Random(0)
+        pyparsing_ast, handwritten_ast = ast.Ast(ast.PYPARSING_BACKEND), ast.Ast(ast.HANDWRITTEN_BACKEND)
+
+        for _ in range(200):
+            given_source = "".join(given_random.choice(fragments) for _ in range(given_random.randint(1, 40)))
+            self.assertEqual(_describe_matches(handwritten_ast.scan_all(given_source)), _describe_matches(pyparsing_ast.scan_all(given_source)), given_source)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import io
+import os
+import tempfile
+import unittest
+
+import context
+
+from CMakeClassCreator import ast, edit_buffer, mapped_source, source_inserter
+from test_Handwritten_parser import _describe
+
+class TestMappedSource(unittest.TestCase):
+    def setUp(self):
+        temporary_file, self.cmakelists_path = tempfile.mkstemp()
+        os.close(temporary_file)
+
+    def tearDown(self):
+        os.remove(self.cmakelists_path)
+
+    def _write_cmakelists(self, content):
+        with open(self.cmakelists_path, 'wb') as cmakelists_file:
+            cmakelists_file.write(content.encode("utf-8"))
+
+    def test_iter_statements_gives_absolute_locations(self):
+        self._write_cmakelists("project(TabsPls)\r\n"
+            + "set(TabsPls_Sources\r\n  Main.cpp\r\n  Directory.cpp\r\n)\r\n"
+            + "# añadir todo\n"
+            + "add_executable(TabsPls\n ${TabsPls_Sources}\n)\n")
+        with open(self.cmakelists_path) as cmakelists_file:
+            full_cmake_source = cmakelists_file.read()
+
+        expected_statements = [_describe(statement) for statement in ast.Ast(ast.HANDWRITTEN_BACKEND).iter_statements(full_cmake_source)]
+        self.assertEqual(len(expected_statements), 2)
+
+        for block_size in [1, 16, mapped_source.default_block_size]:
+            with mapped_source.MappedCMakeSource(self.cmakelists_path, block_size, "utf-8") as given_source:
+                self.assertEqual([_describe(statement) for statement in given_source.iter_statements()], expected_statements)
+                self.assertEqual(given_source[0:None], full_cmake_source)
+                self.assertEqual(given_source[40:60], full_cmake_source[40:60])
+
+    def test_iter_statements_with_name(self):
+        self._write_cmakelists("set(TabsPls_Headers\n File.hpp\n)\nset(TabsPls_Sources\n File.cpp\n)\n")
+
+        with mapped_source.MappedCMakeSource(self.cmakelists_path, 4, "utf-8") as given_source:
+            statements = list(given_source.iter_statements("File.cpp"))
+
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].is_same(ast.SetNormalVariable("TabsPls_Sources", ast.CMakeStringList([ast.ListItemStringWithLocation("File.cpp", 53)]))))
+
+    def test_empty_file(self):
+        with mapped_source.MappedCMakeSource(self.cmakelists_path) as given_source:
+            self.assertEqual(list(given_source.iter_statements()), [])
+            self.assertEqual(given_source[0:None], "")
+
+    def test_write_with_actions(self):
+        given_content = "set(TabsPls_Sources\n Main.cpp\n)\n"
+        self._write_cmakelists(given_content)
+        given_actions = [source_inserter.InsertAction(29, " File.hpp"), source_inserter.InsertAction(29, " File.cpp"), source_inserter.InsertAction(0, "#")]
+
+        with mapped_source.MappedCMakeSource(self.cmakelists_path, 8, "utf-8") as given_source:
+            output = io.StringIO()
+            given_source.with_actions(given_actions).write_to(output)
+
+        self.assertEqual(output.getvalue(), "#set(TabsPls_Sources\n Main.cpp File.cpp File.hpp\n)\n")
+
+    def test_edits_and_diff_are_the_same_as_those_of_the_edit_buffer(self):
+        given_content = "set(TabsPls_Sources\n Main.cpp\n)\nadd_executable(TabsPls ${TabsPls_Sources})\n"
+        self._write_cmakelists(given_content)
+        given_actions = [source_inserter.InsertAction(29, "\n File.hpp"), source_inserter.InsertAction(29, "\n File.cpp"), source_inserter.InsertAction(0, "#")]
+
+        expected_buffer = edit_buffer.EditBuffer(given_content)
+        for action in given_actions:
+            expected_buffer.do(action)
+
+        with mapped_source.MappedCMakeSource(self.cmakelists_path, 8, "utf-8") as given_source:
+            edited_source = given_source.with_actions(given_actions)
+            self.assertEqual(edited_source.edits(), expected_buffer.edits())
+            self.assertEqual(list(edited_source.unified_diff("CMakeLists.txt", 1)), list(expected_buffer.unified_diff("CMakeLists.txt", 1)))
+
+    def test_only_slices_are_supported(self):
+        with mapped_source.MappedCMakeSource(self.cmakelists_path) as given_source:
+            self.assertRaises(mapped_source.MappedCMakeSourceException, given_source.__getitem__, 0)
+            self.assertRaises(mapped_source.MappedCMakeSourceException, given_source.__getitem__, slice(-1, None))
+
+if __name__ == '__main__':
+    unittest.main()
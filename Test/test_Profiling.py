@@ -0,0 +1,62 @@
+import io, json
+import unittest
+
+import context
+
+from CMakeClassCreator import profiling
+
+class TestProfiling(unittest.TestCase):
+    def tearDown(self):
+        profiling.stop_recording()
+
+    def test_nothing_is_recorded_when_off(self):
+        self.assertFalse(profiling.is_recording())
+        self.assertIs(profiling.phase("parse"), profiling.phase("read"))
+
+        given_statements = iter(["set(...)"])
+        self.assertIs(profiling.iterate_in_phase("parse", given_statements), given_statements)
+        self.assertIsNone(profiling.stop_recording())
+
+    def test_nested_phases_are_not_counted_twice(self):
+        phase_recorder = profiling.start_recording()
+        with profiling.phase("resolve"):
+            with profiling.phase("whitespace"):
+                sum(range(10000))
+            with profiling.phase("whitespace"):
+                pass
+        self.assertIs(profiling.stop_recording(), phase_recorder)
+
+        self.assertEqual([(record.name, record.depth) for record in phase_recorder.records], [("whitespace", 1), ("whitespace", 1), ("resolve", 0)])
+        whitespace_record, _, resolve_record = phase_recorder.records
+        self.assertAlmostEqual(resolve_record.self_wall_seconds, 
+            resolve_record.wall_seconds - sum(record.wall_seconds for record in phase_recorder.records[:2]))
+        self.assertGreaterEqual(whitespace_record.start, resolve_record.start)
+
+        summary_lines = phase_recorder.get_summary_lines()
+        self.assertEqual([line.split()[:2] for line in summary_lines[1:-1]], [["resolve", "1"], ["whitespace", "2"]])
+        self.assertEqual(summary_lines[-1].split()[0], "total")
+
+    def test_iterate_in_phase(self):
+        phase_recorder = profiling.start_recording()
+        self.assertEqual(list(profiling.iterate_in_phase("parse", ["set(...)", "add_library(...)"])), ["set(...)", "add_library(...)"])
+        profiling.stop_recording()
+
+        #the last record is the call that found the end of the iterable
+        self.assertEqual([record.name for record in phase_recorder.records], ["parse"] * 3)
+
+    def test_write_chrome_trace(self):
+        phase_recorder = profiling.start_recording()
+        with profiling.phase("read"):
+            pass
+        profiling.stop_recording()
+
+        trace_file = io.StringIO()
+        phase_recorder.write_chrome_trace(trace_file)
+        trace_events = json.loads(trace_file.getvalue())["traceEvents"]
+        self.assertEqual(len(trace_events), 1)
+        self.assertEqual((trace_events[0]["name"], trace_events[0]["ph"]), ("read", "X"))
+        self.assertGreaterEqual(trace_events[0]["dur"], 0)
+        self.assertIn("cpu_ms", trace_events[0]["args"])
+
+if __name__ == '__main__':
+    unittest.main()
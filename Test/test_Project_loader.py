@@ -0,0 +1,89 @@
+import locale
+import os
+import shutil
+import tempfile
+import unittest
+
+import context
+
+from CMakeClassCreator import ast, project_loader
+from test_Handwritten_parser import _describe
+
+class TestProjectLoader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self._write("CMakeLists.txt", "project(TabsPls)\n"
+            + "include(cmake/Warnings.cmake)\n"
+            + "include(CTest)\n"
+            + "# add_subdirectory(Commented)\n"
+            + "message(\"add_subdirectory(Quoted)\")\n"
+            + "add_subdirectory(Core)\n"
+            + "ADD_SUBDIRECTORY(\"${CMAKE_CURRENT_SOURCE_DIR}/App\")\n"
+            + "add_subdirectory(${Unknown})\n")
+        self._write("cmake/Warnings.cmake", "set(Warnings_Sources Warnings.cpp)\n")
+        self._write("Core/CMakeLists.txt", "add_library(Core Directory.cpp)\ninclude(../cmake/Warnings.cmake)\n")
+        self._write("App/CMakeLists.txt", "include(App.cmake)\nadd_executable(TabsPls Main.cpp)\n")
+        self._write("App/App.cmake", "target_sources(TabsPls PRIVATE " + " ".join("File{}.cpp".format(index) for index in range(100)) + ")\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self.directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as cmake_file:
+            cmake_file.write(content)
+
+    def _path(self, relative_path):
+        return os.path.join(self.directory, relative_path)
+
+    def test_follows_add_subdirectory_and_include(self):
+        project = project_loader.load_project(self._path("CMakeLists.txt"), workers=1)
+
+        self.assertEqual(list(project.files), [self._path(relative_path) for relative_path in
+            ["CMakeLists.txt", "cmake/Warnings.cmake", "Core/CMakeLists.txt", "App/CMakeLists.txt", "App/App.cmake"]])
+        self.assertEqual(project.files[self._path("App/App.cmake")].current_source_directory, self._path("App"))
+        self.assertEqual(project.missing_references, [(self._path("CMakeLists.txt"), "include", "CTest"),
+            (self._path("CMakeLists.txt"), "add_subdirectory", "${Unknown}")])
+
+        core_ast = project.files[self._path("Core/CMakeLists.txt")].full_cmake_ast
+        self.assertEqual(len(core_ast), 1)
+        self.assertTrue(core_ast[0].is_same(ast.AddLibrary("Core", ast.CMakeStringList([ast.ListItemStringWithLocation("Directory.cpp", 17)]))))
+
+    def test_find_cmake_scripts_gives_the_scripts_of_the_project(self):
+        self.assertEqual(sorted(project_loader.find_cmake_scripts(self._path("CMakeLists.txt"))),
+            sorted(project_loader.load_project(self._path("CMakeLists.txt"), workers=1).files))
+
+    def test_worker_processes_give_the_same_project(self):
+        expected_project = project_loader.load_project(self._path("CMakeLists.txt"), workers=1)
+        given_project = project_loader.load_project(self._path("CMakeLists.txt"), workers=2)
+
+        self.assertEqual(list(given_project.files), list(expected_project.files))
+        self.assertEqual(given_project.missing_references, expected_project.missing_references)
+        for path, project_file in given_project.files.items():
+            self.assertEqual([_describe(statement) for statement in project_file.full_cmake_ast],
+                [_describe(statement) for statement in expected_project.files[path].full_cmake_ast])
+
+    def test_missing_root(self):
+        self.assertRaises(project_loader.ProjectLoaderException, project_loader.load_project, self._path("Missing/CMakeLists.txt"))
+
+    @unittest.skipUnless(locale.getpreferredencoding(False).lower().replace("-", "") == "utf8", "needs a locale that can't decode every byte")
+    def test_script_that_cant_be_decoded_is_named(self):
+        with open(self._path("Core/CMakeLists.txt"), 'wb') as cmake_file:
+            cmake_file.write(b"add_library(Core Directory\xff.cpp)\n")
+
+        for workers in [1, 2]:
+            with self.assertRaises(project_loader.ProjectLoaderException) as context_manager:
+                project_loader.load_project(self._path("CMakeLists.txt"), workers=workers)
+            self.assertIn(self._path("Core/CMakeLists.txt"), str(context_manager.exception))
+
+    def test_load_cmake_scripts_doesnt_follow_references(self):
+        project = project_loader.load_cmake_scripts([self._path("App/CMakeLists.txt"), self._path("Core/CMakeLists.txt")], workers=2)
+
+        self.assertEqual(project.root_cmakelists_path, self._path("App/CMakeLists.txt"))
+        self.assertEqual(list(project.files), [self._path("App/CMakeLists.txt"), self._path("Core/CMakeLists.txt")])
+        self.assertEqual(project.missing_references, [])
+        self.assertRaises(project_loader.ProjectLoaderException, project_loader.load_cmake_scripts, [self._path("Core/CMakeLists.txt"), self._path("Missing.cmake")])
+
+if __name__ == '__main__':
+    unittest.main()
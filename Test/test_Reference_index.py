@@ -0,0 +1,58 @@
+import unittest
+
+import context
+
+from CMakeClassCreator import ast, list_item_string_path, reference_index
+
+def _parse(full_cmake_source):
+    return [match[0] for match in ast.Ast(ast.HANDWRITTEN_BACKEND).scan_all(full_cmake_source) if len(match) > 0]
+
+class TestReferenceIndex(unittest.TestCase):
+    def test_find_references_by_file_name(self):
+        given_index = reference_index.ReferenceIndex([
+            ("Core/CMakeLists.txt", _parse("set(Core_Sources Source/Directory.cpp \"Source/Main.cpp\")")),
+            ("App/CMakeLists.txt", _parse("add_executable(TabsPls ${Core_Sources} Main.cpp)"))])
+
+        references = given_index.find_references(list_item_string_path.PathAwareListItemString("Main.cpp"))
+
+        self.assertEqual([reference.cmakelists_path for reference in references], ["Core/CMakeLists.txt", "App/CMakeLists.txt"])
+        self.assertEqual([reference.list_item.list_item_string for reference in references], ["\"Source/Main.cpp\"", "Main.cpp"])
+        self.assertEqual(given_index.find_references(list_item_string_path.PathAwareListItemString("Core_Sources")), [])
+
+    def test_make_inserter_for_item_next_to_other_source(self):
+        given_index = reference_index.ReferenceIndex([
+            ("Core/CMakeLists.txt", _parse("set(Core_Sources Source/Directory.cpp)\ntarget_sources(Core PRIVATE Directory.cpp)")),
+            ("App/CMakeLists.txt", _parse("add_executable(TabsPls Main.cpp)"))])
+
+        cmakelists_path, inserter = given_index.make_inserter_for_item_next_to_other_source(list_item_string_path.PathAwareListItemString("Directory.cpp"))
+
+        self.assertEqual(cmakelists_path, "Core/CMakeLists.txt")
+        self.assertEqual(inserter.get_matched_reference_item().list_item_string, "Source/Directory.cpp")
+        self.assertEqual(inserter.insert_source("File.cpp").content, " Source/File.cpp")
+
+    def test_ambiguous_reference_names_every_cmake_script(self):
+        given_index = reference_index.ReferenceIndex([
+            ("Core/CMakeLists.txt", _parse("add_library(Core Directory.cpp)")),
+            ("Other/CMakeLists.txt", _parse("add_library(Other Main.cpp)")),
+            ("App/CMakeLists.txt", _parse("add_executable(TabsPls Source/Directory.cpp)"))])
+
+        with self.assertRaises(reference_index.ReferenceIndexException) as context_manager:
+            given_index.make_inserter_for_item_next_to_other_source(list_item_string_path.PathAwareListItemString("Directory.cpp"))
+
+        self.assertIn("Core/CMakeLists.txt, App/CMakeLists.txt", str(context_manager.exception))
+
+    def test_ambiguous_reference_within_a_cmake_script(self):
+        given_index = reference_index.ReferenceIndex([("Core/CMakeLists.txt", _parse("set(A Directory.cpp)\nset(B Directory.cpp)"))])
+
+        with self.assertRaises(reference_index.ReferenceIndexException) as context_manager:
+            given_index.make_inserter_for_item_next_to_other_source(list_item_string_path.PathAwareListItemString("Directory.cpp"))
+
+        self.assertTrue(str(context_manager.exception).startswith("Core/CMakeLists.txt: "))
+
+    def test_missing_reference(self):
+        given_index = reference_index.ReferenceIndex([("CMakeLists.txt", _parse("add_library(Core Directory.cpp)"))])
+        self.assertRaises(reference_index.ReferenceIndexException, given_index.make_inserter_for_item_next_to_other_source, 
+            list_item_string_path.PathAwareListItemString("Main.cpp"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,6 +16,10 @@ class TestSourceInserter(unittest.TestCase):
         given_cmake_string_list = ast.CMakeStringList([ast.ListItemString("item1.cpp"), ast.VariableUse("Sources"), ast.VariableUseWithStartAndEndLocation("Headers", 14, ast.VariableUseTerminator(22))])
         self.assertEqual(source_inserter._get_position_after_last_list_item(given_cmake_string_list), 22)
         
+    def test_get_position_after_last_composed_list_item(self):
+        given_cmake_string_list = ast.CMakeStringList([ast.ListItemStringWithLocation("item1.cpp", 0), "${dir}/item2.cpp"])
+        self.assertRaises(source_inserter.SourceInserterException, source_inserter._get_position_after_last_list_item, given_cmake_string_list)
+
     def test_insert_directly_in_executable(self):
         given_ast = ast.Ast()
         given_source = "add_executable(TabsPls Main.cpp)"
@@ -30,6 +34,14 @@ class TestSourceInserter(unittest.TestCase):
         given_cmake_ast = given_ast.parse("add_executable(IWantTabs Main.cpp)")
         self.assertRaises(source_inserter.SourceInserterException, source_inserter.insert_source_item_directly_in_target, given_cmake_ast, "file.cpp", "TabsPls")
 
+    def test_insert_directly_in_target_declared_twice(self):
+        def given_lazy_cmake_ast():
+            yield ast.AddExecutable("TabsPls", ast.CMakeStringList([ast.ListItemStringWithLocation("Main.cpp", 23)]))
+            yield ast.AddLibrary("TabsPls", ast.CMakeStringList([ast.ListItemStringWithLocation("Lib.cpp", 60)]))
+            self.fail("The cmake ast is consumed after the target turned out to be declared twice")
+
+        self.assertRaises(source_inserter.SourceInserterException, source_inserter.insert_source_item_directly_in_target, given_lazy_cmake_ast(), "file.cpp", "TabsPls")
+
     def test_insert_in_variable_from_target(self):
         given_ast = ast.Ast()
         given_source = ("set(TabsPls_Sources Main.cpp)\n"
@@ -41,6 +53,14 @@ class TestSourceInserter(unittest.TestCase):
         self.assertEqual(insert_action.content, " file.cpp")
         self.assertEqual(insert_action.do(given_source), "set(TabsPls_Sources Main.cpp file.cpp)\nadd_executable(TabsPls ${TabsPls_Sources})")
 
+    def test_insert_in_variable_from_target_with_lazy_cmake_ast(self):
+        given_source = ("set(TabsPls_Sources Main.cpp)\n"
+            + "add_executable(TabsPls ${TabsPls_Sources})")
+        given_lazy_cmake_ast = ast.Ast().iter_statements(given_source)
+
+        insert_action = source_inserter.insert_source_item_in_variable_from_target(given_lazy_cmake_ast, "file.cpp", "TabsPls", "TabsPls_Sources")
+        self.assertEqual(insert_action.do(given_source), "set(TabsPls_Sources Main.cpp file.cpp)\nadd_executable(TabsPls ${TabsPls_Sources})")
+
     def test_insert_in_non_existing_variable_from_target(self):
         given_ast = ast.Ast()
         given_cmake_ast = given_ast.parse(("set(TabsPls_Sources Main.cpp)\n"
@@ -75,6 +95,14 @@ class TestSourceInserter(unittest.TestCase):
 
         self.assertRaises(source_inserter.SourceInserterException, source_inserter.insert_source_item_in_variable, given_cmake_ast, "file.cpp", "TabsPls_Sources")
 
+    def test_insert_in_variable_declared_twice(self):
+        given_ast = ast.Ast()
+        given_source = ("set(TabsPls_Sources Main.cpp)\n"
+            + "set(TabsPls_Sources ${TabsPls_Sources} Other.cpp)")
+
+        self.assertRaises(source_inserter.SourceInserterException, source_inserter.insert_source_item_in_variable, 
+            given_ast.iter_statements(given_source, "TabsPls_Sources"), "file.cpp", "TabsPls_Sources")
+
     def test_insert_next_to_other_source_directly_at_target(self):
         given_ast = ast.Ast()
         given_source = "add_executable(TabsPls Main.cpp)"
@@ -117,6 +145,40 @@ class TestSourceInserter(unittest.TestCase):
 
         self.assertRaises(source_inserter.SourceInserterException, source_inserter.insert_source_item_next_to_other_source, given_cmake_ast, "file.cpp", "other_file.cpp")
 
+    def test_insert_with_cmake_ast_index(self):
+        given_ast = ast.Ast()
+        given_source = ("set(TabsPls_Sources Source/Main.cpp)\n"
+            + "add_executable(TabsPls ${TabsPls_Sources})\n"
+            + "target_sources(TabsPls PRIVATE Main.cpp)")
+        given_cmake_ast_index = source_inserter.CMakeAstIndex(match[0] for match in given_ast.scan_all(given_source))
+
+        self.assertEqual(source_inserter.insert_source_item_directly_in_target(given_cmake_ast_index, "file.cpp", "TabsPls").position, 78)
+        self.assertEqual(source_inserter.insert_source_item_in_variable(given_cmake_ast_index, "file.cpp", "TabsPls_Sources").position, 35)
+        self.assertEqual(source_inserter.insert_source_item_in_variable_from_target(given_cmake_ast_index, "file.cpp", "TabsPls", "TabsPls_Sources").position, 35)
+
+        #the variable declaration goes before the target_sources statement
+        insert_action = source_inserter.insert_source_item_next_to_other_source(given_cmake_ast_index, "file.cpp", list_item_string_path.PathAwareListItemString("Main.cpp"))
+        self.assertEqual(insert_action.position, 35)
+        self.assertEqual(insert_action.content, " Source/file.cpp")
+
+        self.assertRaises(source_inserter.SourceInserterException, source_inserter.insert_source_item_directly_in_target, given_cmake_ast_index, "file.cpp", "IWantTabs")
+        self.assertRaises(source_inserter.SourceInserterException, source_inserter.insert_source_item_in_variable, given_cmake_ast_index, "file.cpp", "IWantTabs_Sources")
+
+    def test_cmake_ast_index_find_source_items(self):
+        given_cmake_ast_index = source_inserter.CMakeAstIndex(ast.Ast().parse("add_library(TabsPls Main.cpp Source/Main.cpp \"Main.h\")"))
+
+        self.assertEqual([list_item.list_item_string for _, list_item in given_cmake_ast_index.find_source_items("Source/Main.cpp")], ["Source/Main.cpp"])
+        self.assertEqual([list_item.list_item_string for _, list_item in given_cmake_ast_index.find_source_items(list_item_string_path.PathAwareListItemString("Main.cpp"))], ["Main.cpp"])
+        self.assertEqual([list_item.list_item_string for _, list_item in given_cmake_ast_index.find_source_items("Main.h")], ["\"Main.h\""])
+        self.assertEqual(given_cmake_ast_index.find_source_items("Other.cpp"), [])
+
+    def test_reference_in_multiple_targets(self):
+        given_cmake_ast = [match[0] for match in ast.Ast().scan_all("add_library(TabsPls Main.cpp)\nadd_executable(IWantTabs Main.cpp)")]
+
+        with self.assertRaises(source_inserter.SourceInserterException) as context_manager:
+            source_inserter.insert_source_item_next_to_other_source(given_cmake_ast, "file.cpp", "Main.cpp")
+        self.assertIn("['TabsPls', 'IWantTabs']", str(context_manager.exception))
+
     def test_whitespace_property(self):
         self.assertEqual(source_inserter.InsertAction(0, "content").whitespace_prefix, "")
         self.assertEqual(source_inserter.InsertAction(0, " content").whitespace_prefix, " ")
@@ -143,6 +205,77 @@ class TestSourceInserter(unittest.TestCase):
         insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "file3.cpp", given_full_source)
         self.assertEqual(insert_action.do(given_full_source), "file1.cpp\n\tfile2.cpp\n\tfile3.cpp")
 
+    def test_source_that_is_already_listed_is_not_added_again(self):
+        given_source = 'add_executable(TabsPls Source/Main.cpp "Source/File.cpp")'
+        given_inserter = source_inserter._make_inserter_for_item_next_to_other_source(ast.Ast().parse(given_source), 
+            list_item_string_path.PathAwareListItemString("Main.cpp"))
+
+        self.assertEqual(source_inserter.insert_source_considering_existing_whitespace(given_inserter, "File.cpp", given_source).content, "")
+        self.assertEqual(source_inserter.insert_source_considering_existing_whitespace(given_inserter, "Main.cpp", given_source).content, "")
+        self.assertEqual(source_inserter.insert_source_considering_existing_whitespace(given_inserter, "Other.cpp", given_source).content, " Source/Other.cpp")
+
+    def test_sorted_insertion_between_neighbouring_items(self):
+        given_source = 'set(TabsPls_Sources\n    "Source/Alpha.cpp"\n    Source/Main.cpp\n\tOther/Zeta.cpp\n)'
+        given_inserter = source_inserter._make_inserter_for_variable_declaration(ast.Ast().parse(given_source), "TabsPls_Sources")
+
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "Beta.cpp", given_source, True)
+        self.assertEqual(insert_action.do(given_source), 'set(TabsPls_Sources\n    "Source/Alpha.cpp"\n    Beta.cpp\n    Source/Main.cpp\n\tOther/Zeta.cpp\n)')
+
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "Source/Tau.cpp", given_source, True)
+        self.assertEqual(insert_action.do(given_source), 'set(TabsPls_Sources\n    "Source/Alpha.cpp"\n    Source/Main.cpp\n\tSource/Tau.cpp\n\tOther/Zeta.cpp\n)')
+
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "Abc.cpp", given_source, True)
+        self.assertEqual(insert_action.do(given_source), 'set(TabsPls_Sources\n    Abc.cpp\n    "Source/Alpha.cpp"\n    Source/Main.cpp\n\tOther/Zeta.cpp\n)')
+
+    def test_sorted_insertion_stays_in_the_scope_of_the_reference(self):
+        given_source = "target_sources(TabsPls PRIVATE a.cpp PUBLIC c.h)"
+        given_inserter = source_inserter._make_inserter_for_item_next_to_other_source(ast.Ast().parse(given_source),
+            list_item_string_path.PathAwareListItemString("a.cpp"))
+
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "b.cpp", given_source, True)
+        self.assertEqual(insert_action.do(given_source), "target_sources(TabsPls PRIVATE a.cpp b.cpp PUBLIC c.h)")
+
+        given_source = "target_sources(TabsPls\n  PRIVATE\n    b.cpp # main\n    d.cpp\n  PUBLIC\n\tc.h\n\tz.h\n)"
+        given_inserter = source_inserter._make_inserter_for_item_next_to_other_source(ast.Ast().parse(given_source),
+            list_item_string_path.PathAwareListItemString("d.cpp"))
+
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "a.cpp", given_source, True)
+        self.assertEqual(insert_action.do(given_source), "target_sources(TabsPls\n  PRIVATE\n    a.cpp\n    b.cpp # main\n    d.cpp\n  PUBLIC\n\tc.h\n\tz.h\n)")
+
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "c.cpp", given_source, True)
+        self.assertEqual(insert_action.do(given_source), "target_sources(TabsPls\n  PRIVATE\n    b.cpp # main\n    c.cpp\n    d.cpp\n  PUBLIC\n\tc.h\n\tz.h\n)")
+
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "e.cpp", given_source, True)
+        self.assertEqual(insert_action.do(given_source), "target_sources(TabsPls\n  PRIVATE\n    b.cpp # main\n    d.cpp\n    e.cpp\n  PUBLIC\n\tc.h\n\tz.h\n)")
+
+        given_inserter = source_inserter._make_inserter_for_item_next_to_other_source(ast.Ast().parse(given_source),
+            list_item_string_path.PathAwareListItemString("z.h"))
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "a.h", given_source, True)
+        self.assertEqual(insert_action.do(given_source), "target_sources(TabsPls\n  PRIVATE\n    b.cpp # main\n    d.cpp\n  PUBLIC\n\ta.h\n\tc.h\n\tz.h\n)")
+
+    def test_sorted_insertion_ignores_case(self):
+        given_source = "add_executable(TabsPls alpha.cpp Beta.cpp gamma.cpp)"
+        given_inserter = source_inserter._make_inserter_for_target(ast.Ast().parse(given_source), "TabsPls")
+
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "Delta.cpp", given_source, True)
+        self.assertEqual(insert_action.do(given_source), "add_executable(TabsPls alpha.cpp Beta.cpp Delta.cpp gamma.cpp)")
+
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "apple.cpp", given_source, True)
+        self.assertEqual(insert_action.do(given_source), "add_executable(TabsPls alpha.cpp apple.cpp Beta.cpp gamma.cpp)")
+
+    def test_sorted_insertion_appends_to_a_list_that_isnt_sorted(self):
+        given_source = "add_executable(TabsPls Main.cpp ${Other_Sources} Directory.cpp)"
+        given_inserter = source_inserter._make_inserter_for_target(ast.Ast().parse(given_source), "TabsPls")
+
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "File.cpp", given_source, True)
+        self.assertEqual(insert_action.do(given_source), "add_executable(TabsPls Main.cpp ${Other_Sources} Directory.cpp File.cpp)")
+
+        given_source = "add_executable(TabsPls Directory.cpp ${Other_Sources} Main.cpp)"
+        given_inserter = source_inserter._make_inserter_for_target(ast.Ast().parse(given_source), "TabsPls")
+
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(given_inserter, "File.cpp", given_source, True)
+        self.assertEqual(insert_action.do(given_source), "add_executable(TabsPls Directory.cpp ${Other_Sources} File.cpp Main.cpp)")
+
     def test_insert_next_to_other_source_directly_at_target_using_path_aware_reference(self):
         given_ast = ast.Ast()
         given_source = "add_executable(TabsPls Main.cpp)"
@@ -0,0 +1,60 @@
+import unittest
+
+import context
+
+from CMakeClassCreator import statement_spans
+
+class TestStatementSpans(unittest.TestCase):
+    def test_find_statement_spans(self):
+        given_source = ("project(TabsPls)\n"
+            + "SET(TabsPls_Sources Main.cpp)\n"
+            + "if(WIN32)\n"
+            + "\tadd_executable (TabsPls ${TabsPls_Sources})\n"
+            + "endif()\n"
+            + "target_sources(TabsPls PRIVATE $<$<CONFIG:Debug>:debug.cpp>)")
+
+        spans = statement_spans.find_statement_spans(given_source)
+
+        self.assertEqual([span.keyword for span in spans], ["set", "add_executable", "target_sources"])
+        self.assertEqual([span.get_text(given_source) for span in spans], ["SET(TabsPls_Sources Main.cpp)",
+            "add_executable (TabsPls ${TabsPls_Sources})", "target_sources(TabsPls PRIVATE $<$<CONFIG:Debug>:debug.cpp>)"])
+        self.assertEqual((spans[0].get_location(), spans[0].get_end_location()), (17, 46))
+
+    def test_keywords_are_compared_in_upper_case_like_the_grammar(self):
+        spans = statement_spans.find_statement_spans("\u017fet(TabsPls_Sources Main.cpp)")
+        self.assertEqual([span.keyword for span in spans], ["set"])
+
+    def test_comments_are_skipped(self):
+        given_source = "# set(commented out)\nset(var #)\n value)"
+
+        spans = statement_spans.find_statement_spans(given_source)
+
+        self.assertEqual(len(spans), 1)
+        self.assertEqual(spans[0].get_text(given_source), "set(var #)\n value)")
+
+    def test_parentheses_in_quoted_arguments_are_not_counted(self):
+        given_source = 'set(var "(" ")" value)'
+
+        spans = statement_spans.find_statement_spans(given_source)
+
+        self.assertEqual(spans[0].get_text(given_source), given_source)
+
+    def test_keyword_without_parenthesis_is_not_a_statement(self):
+        self.assertEqual(statement_spans.find_statement_spans("settings target_sources_dir"), [])
+
+    def test_unbalanced_span_runs_up_to_the_end(self):
+        given_source = "set(var value\n"
+
+        spans = statement_spans.find_statement_spans(given_source)
+
+        self.assertEqual(spans[0].get_end_location(), len(given_source))
+
+    def test_find_next_statement_span(self):
+        given_source = "set(outer $<IF:1,set(inner value)>)"
+
+        self.assertEqual(statement_spans.find_next_statement_span(given_source).get_location(), 0)
+        self.assertEqual(statement_spans.find_next_statement_span(given_source, 1).get_location(), 17)
+        self.assertIsNone(statement_spans.find_next_statement_span(given_source, 18))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -21,6 +21,11 @@ class TestWhitespaceInserter(unittest.TestCase):
         self.assertRaises(whitespace_inserter.LessThanTwoItemsException, whitespace_inserter.get_content_between_second_to_last_and_last_item,"", given_ast)
         self.assertRaises(whitespace_inserter.LessThanTwoItemsException, whitespace_inserter.get_content_between_second_to_last_and_last_item,"", given_ast_empty)
 
+    def test_get_content_next_to_composed_list_item(self):
+        given_ast = ast.CMakeStringList([ast.ListItemStringWithLocation("file1.cpp", 0), "${dir}/file2.cpp", ast.ListItemStringWithLocation("file3.cpp", 27)])
+
+        self.assertRaises(whitespace_inserter.ItemWithoutLocationException, whitespace_inserter.get_content_between_second_to_last_and_last_item, "", given_ast)
+
 if __name__ == "__main__":
     unittest.main()
     
\ No newline at end of file
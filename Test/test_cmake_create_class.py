@@ -1,8 +1,18 @@
+import errno
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 
+from unittest import mock
+
 import context
 
 import cmake_create_class
+from CMakeClassCreator import ast, mapped_source
 
 class FakeArgs(object):
     def __init__(self):
@@ -11,6 +21,11 @@ class FakeArgs(object):
         self.target = None
         self.variable = None
         self.name = "classname"
+        self.project = False
+        self.memory_mapped = False
+        self.ast_cache = None
+        self.batch = None
+        self.also_in = None
 
 class TestCMakeCreateClass(unittest.TestCase):
     def test_single_file_mode_either_has_reference_or_variable_or_target(self):
@@ -111,6 +126,27 @@ class TestCMakeCreateClass(unittest.TestCase):
 
         self.assertRaises(cmake_create_class.CMakeClassCreatorException, cmake_create_class.validate_args, given_args)
 
+    def test_project_mode_requires_reference(self):
+        given_args = FakeArgs()
+        given_args.project = True
+        given_args.reference_class = "fakeref"
+        cmake_create_class.validate_args(given_args)
+
+        given_args.single_file = True
+        cmake_create_class.validate_args(given_args)
+
+        given_args.reference_class = None
+        given_args.variable = "fakevariable"
+        self.assertRaises(cmake_create_class.CMakeClassCreatorException, cmake_create_class.validate_args, given_args)
+
+    def test_only_one_output_mode(self):
+        arg_parser = cmake_create_class.create_arg_parser()
+        cmake_create_class.validate_output_args(arg_parser.parse_args(["CMakeLists.txt", "classname", "--diff-context", "0"]))
+
+        for given_options in [["-i", "--diff"], ["-i", "--edits-json"], ["--diff-context", "1", "--edits-json"], ["--diff-context", "-1"]]:
+            given_args = arg_parser.parse_args(["CMakeLists.txt", "classname"] + given_options)
+            self.assertRaises(cmake_create_class.CMakeClassCreatorException, cmake_create_class.validate_output_args, given_args)
+
 class TestCMakeCreateClassSingleFileMode(unittest.TestCase):
     def test_insert_single_source_next_to_reference_in_full_cmake_source(self):
         given_full_source = \
@@ -141,6 +177,15 @@ class TestCMakeCreateClassSingleFileMode(unittest.TestCase):
         
         self.assertEqual(expected_cmake_source, result_cmake_source)
 
+    def test_edits_without_the_edited_cmake_source(self):
+        given_full_source = "set(TabsPlsTest_Sources\n    Test1.cpp\n    Test2.cpp\n)\n"
+        result_edits = cmake_create_class._insert_single_source_next_to_reference_in_full_cmake_source(given_full_source, "Test3.cpp", "Test2.cpp", 
+            as_edits=True)
+
+        self.assertEqual([(edit.line, edit.column, edit.content) for edit in result_edits.edits()], [(3, 14, "\n    Test3.cpp")])
+        self.assertEqual(result_edits.text(), cmake_create_class._insert_single_source_next_to_reference_in_full_cmake_source(given_full_source, 
+            "Test3.cpp", "Test2.cpp"))
+
     def test_insert_single_source_next_to_reference_in_full_cmake_source_path_aware(self):
         given_full_source = \
             """
@@ -170,5 +215,294 @@ class TestCMakeCreateClassSingleFileMode(unittest.TestCase):
         
         self.assertEqual(expected_cmake_source, result_cmake_source)
 
+    def test_insert_single_source_next_to_reference_mentioned_in_unsupported_statements(self):
+        given_full_source = \
+            """
+            message("Test2.cpp is added to the sources")
+            set(TabsPlsTest_Sources Test1.cpp Test2.cpp)
+            install(FILES Test2.cpp DESTINATION src)
+            """
+        result_cmake_source = cmake_create_class._insert_single_source_next_to_reference_in_full_cmake_source(given_full_source, "Test3.cpp", "Test2.cpp")
+
+        expected_cmake_source = \
+            """
+            message("Test2.cpp is added to the sources")
+            set(TabsPlsTest_Sources Test1.cpp Test2.cpp Test3.cpp)
+            install(FILES Test2.cpp DESTINATION src)
+            """
+
+        self.assertEqual(expected_cmake_source, result_cmake_source)
+
+    def test_composed_list_items_dont_crash_the_insertion(self):
+        for parser_backend in ast.backends:
+            given_full_source = "set(Sources\n    Main.cpp\n    ${dir}/Generated.cpp\n    Directory.cpp\n)\n"
+            result_cmake_source = cmake_create_class._insert_single_source_in_variable_in_full_cmake_source(given_full_source, "File.cpp", "Sources", 
+                parser_backend)
+            self.assertEqual(result_cmake_source, "set(Sources\n    Main.cpp\n    ${dir}/Generated.cpp\n    Directory.cpp File.cpp\n)\n")
+
+            given_full_source = "set(Sources\n    Main.cpp\n    ${dir}/Generated.cpp\n)\n"
+            with self.assertRaises(cmake_create_class.CMakeClassCreatorException) as context_manager:
+                cmake_create_class._insert_single_source_next_to_reference_in_full_cmake_source(given_full_source, "File.cpp", "Main.cpp", parser_backend)
+            self.assertIn("${dir}/Generated.cpp", str(context_manager.exception))
+
+class TestCMakeCreateClassBatchMode(unittest.TestCase):
+    def setUp(self):
+        temporary_file, self.cmakelists_path = tempfile.mkstemp()
+        os.close(temporary_file)
+        with open(self.cmakelists_path, 'w') as cmakelists_file:
+            cmakelists_file.write("set(TabsPls_Sources\n    Source/Main.cpp\n    Source/Directory.cpp\n    Source/Directory.hpp\n)\n"
+                + "add_executable(TabsPls ${TabsPls_Sources})\n")
+
+    def tearDown(self):
+        os.remove(self.cmakelists_path)
+
+    def test_insert_batch(self):
+        given_manifest_lines = [
+            '{"name": "File", "reference_class": "Directory"}\n',
+            '\n',
+            '{"name": "Other.hpp", "reference_class": "Main.cpp", "single_file": true}\n',
+            '{"name": "Generated.cpp", "target": "TabsPls"}\n']
+
+        result_cmake_source, errors = cmake_create_class.insert_batch(self.cmakelists_path, given_manifest_lines)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(result_cmake_source, "set(TabsPls_Sources\n    Source/Main.cpp\n    Source/Directory.cpp\n    Source/Directory.hpp\n"
+            + "    Source/File.hpp\n    Source/File.cpp\n    Source/Other.hpp\n)\n"
+            + "add_executable(TabsPls ${TabsPls_Sources} Generated.cpp)\n")
+
+    def test_failing_operations_are_reported_and_skipped(self):
+        given_manifest_lines = [
+            '{"name": "File", "reference_class": "Missing"}',
+            'not json',
+            '{"name": "File.cpp", "variable": "TabsPls_Sources", "target": "TabsPls"}',
+            '{"name": "File.cpp", "colour": "blue"}',
+            '{"name": "File.cpp", "variable": "TabsPls_Sources"}']
+
+        result_cmake_source, errors = cmake_create_class.insert_batch(self.cmakelists_path, given_manifest_lines)
+
+        self.assertEqual([line_number for line_number, _ in errors], [1, 2, 3, 4])
+        self.assertIn("    Source/Directory.hpp\n    File.cpp\n)", result_cmake_source)
+
+    def test_source_is_added_once_to_the_same_list(self):
+        given_manifest_lines = [
+            '{"name": "File.cpp", "variable": "TabsPls_Sources"}',
+            '{"name": "File.cpp", "variable": "TabsPls_Sources", "sorted": true}',
+            '{"name": "File.cpp", "target": "TabsPls"}',
+            '{"name": "File", "reference_class": "Directory"}',
+            '{"name": "File.hpp", "reference_class": "Main.cpp", "single_file": true}']
+
+        result_cmake_source, errors = cmake_create_class.insert_batch(self.cmakelists_path, given_manifest_lines)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(result_cmake_source, "set(TabsPls_Sources\n    Source/Main.cpp\n    Source/Directory.cpp\n    Source/Directory.hpp\n"
+            + "    File.cpp\n    Source/File.hpp\n    Source/File.cpp\n)\n"
+            + "add_executable(TabsPls ${TabsPls_Sources} File.cpp)\n")
+
+    def test_batch_mode_takes_no_other_operation(self):
+        given_args = FakeArgs()
+        given_args.batch = "manifest.jsonl"
+        given_args.name = None
+        cmake_create_class.validate_args(given_args)
+
+        given_args.reference_class = "fakeref"
+        self.assertRaises(cmake_create_class.CMakeClassCreatorException, cmake_create_class.validate_args, given_args)
+
+    def test_sorted_insertion_in_batch(self):
+        given_full_source = "set(TabsPls_Sources\n    Source/Directory.cpp\n    Source/Directory.hpp\n    Source/Main.cpp\n)\n"
+        given_manifest = ['{"name": "File", "reference_class": "Directory"}', '{"name": "Zeta.cpp", "variable": "TabsPls_Sources", "sorted": false}',
+            '{"name": "Anchor.cpp", "variable": "TabsPls_Sources"}']
+        result = cmake_create_class._insert_batch_in_full_cmake_source(given_full_source, given_manifest, sorted_insertion=True)
+
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.full_cmake_source, "set(TabsPls_Sources\n    Anchor.cpp\n    Source/Directory.cpp\n    Source/Directory.hpp\n"
+            + "    Source/File.cpp\n    Source/File.hpp\n    Source/Main.cpp\n    Zeta.cpp\n)\n")
+
+class TestCMakeCreateClassProjectMode(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self._write("CMakeLists.txt", "project(TabsPls)\nadd_subdirectory(Core)\nadd_subdirectory(App)\n")
+        self._write("Core/CMakeLists.txt", "add_library(Core\n    Source/Directory.cpp\n    Source/Directory.hpp\n)\n")
+        self._write("App/CMakeLists.txt", "add_executable(TabsPls Main.cpp Directory.hpp)\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, relative_path, content):
+        path = os.path.join(self.directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as cmake_file:
+            cmake_file.write(content)
+
+    def test_insert_single_source_next_to_reference_in_project(self):
+        cmakelists_path, result_cmake_source = cmake_create_class.insert_single_source_next_to_reference_in_project(
+            os.path.join(self.directory, "CMakeLists.txt"), "File.cpp", "Directory.cpp", workers=1)
+
+        self.assertEqual(cmakelists_path, os.path.join(self.directory, "Core", "CMakeLists.txt"))
+        self.assertEqual(result_cmake_source, "add_library(Core\n    Source/Directory.cpp\n    Source/Directory.hpp\n    Source/File.cpp\n)\n")
+
+    def test_reference_in_several_cmake_scripts_names_all_of_them(self):
+        with self.assertRaises(cmake_create_class.CMakeClassCreatorException) as context_manager:
+            cmake_create_class.create_class_in_project(os.path.join(self.directory, "CMakeLists.txt"), "File", "Directory", workers=1)
+
+        self.assertIn(os.path.join(self.directory, "Core", "CMakeLists.txt"), str(context_manager.exception))
+        self.assertIn(os.path.join(self.directory, "App", "CMakeLists.txt"), str(context_manager.exception))
+
+    def test_create_class_in_project(self):
+        self._write("App/CMakeLists.txt", "add_executable(TabsPls Main.cpp)\n")
+
+        [(cmakelists_path, result_cmake_source)] = cmake_create_class.create_class_in_project(os.path.join(self.directory, "CMakeLists.txt"), "File", "Directory", workers=1)
+
+        self.assertEqual(cmakelists_path, os.path.join(self.directory, "Core", "CMakeLists.txt"))
+        self.assertIn("    Source/File.cpp\n", result_cmake_source)
+        self.assertIn("    Source/File.hpp\n", result_cmake_source)
+
+    def test_reference_class_with_two_header_extensions_is_ambiguous(self):
+        self._write("App/CMakeLists.txt", "add_executable(TabsPls Main.cpp Directory.h)\n")
+
+        with self.assertRaises(cmake_create_class.CMakeClassCreatorException) as context_manager:
+            cmake_create_class.create_class_in_project(os.path.join(self.directory, "CMakeLists.txt"), "File", "Directory", workers=1)
+
+        self.assertIn("more than one header file", str(context_manager.exception))
+
+    def test_create_class_split_over_cmake_scripts(self):
+        self._write("Core/include/CMakeLists.txt", "target_sources(Core PRIVATE\n    Label.hpp\n    Widget.hpp\n)\n")
+        self._write("Core/src/CMakeLists.txt", "target_sources(Core PRIVATE Widget.cpp)\n")
+        given_paths = [os.path.join(self.directory, "Core", "include", "CMakeLists.txt"), os.path.join(self.directory, "Core", "src", "CMakeLists.txt")]
+
+        edited_cmake_scripts = cmake_create_class.create_class_in_cmake_scripts(given_paths, "Button", "Widget", workers=2)
+
+        self.assertEqual(edited_cmake_scripts, [
+            cmake_create_class.EditedCMakeScript(given_paths[0], "target_sources(Core PRIVATE\n    Label.hpp\n    Widget.hpp\n    Button.hpp\n)\n"),
+            cmake_create_class.EditedCMakeScript(given_paths[1], "target_sources(Core PRIVATE Widget.cpp Button.cpp)\n")])
+        self.assertRaises(cmake_create_class.CMakeClassCreatorException, cmake_create_class.create_class_in_cmake_scripts, given_paths[:1], "Button", "Widget")
+
+class TestCMakeCreateClassInPlace(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cmakelists_path = os.path.join(self.directory, "CMakeLists.txt")
+        with open(self.cmakelists_path, 'w') as cmakelists_file:
+            cmakelists_file.write("add_executable(TabsPls Main.cpp)\n")
+        os.chmod(self.cmakelists_path, 0o640)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_in_place_keeps_permissions(self):
+        self.assertEqual(cmake_create_class._write_all_in_place([cmake_create_class.EditedCMakeScript(self.cmakelists_path, 
+            "add_executable(TabsPls Main.cpp File.cpp)\n")]), [])
+
+        with open(self.cmakelists_path, 'r') as cmakelists_file:
+            self.assertEqual(cmakelists_file.read(), "add_executable(TabsPls Main.cpp File.cpp)\n")
+        self.assertEqual(os.stat(self.cmakelists_path).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(self.directory), ["CMakeLists.txt"])
+
+    def test_failed_write_leaves_the_cmake_script_as_it_is(self):
+        def fail_halfway(output_file):
+            output_file.write("add_executable(")
+            raise OSError("No space left on device")
+
+        self.assertRaises(OSError, cmake_create_class._write_temporary_file_next_to, self.cmakelists_path, fail_halfway)
+        with open(self.cmakelists_path, 'r') as cmakelists_file:
+            self.assertEqual(cmakelists_file.read(), "add_executable(TabsPls Main.cpp)\n")
+        self.assertEqual(os.listdir(self.directory), ["CMakeLists.txt"])
+
+    def test_unchanged_cmake_script_is_not_written(self):
+        os.utime(self.cmakelists_path, ns=(0, 0))
+        given_output = cmake_create_class.insert_single_source_in_target(self.cmakelists_path, "Main.cpp", "TabsPls")
+
+        self.assertEqual(cmake_create_class._write_all_in_place([cmake_create_class.EditedCMakeScript(self.cmakelists_path, given_output)]), 
+            [self.cmakelists_path])
+        self.assertEqual(os.stat(self.cmakelists_path).st_mtime_ns, 0)
+
+    def test_write_edits_in_place(self):
+        given_edits = cmake_create_class.insert_single_source_in_target(self.cmakelists_path, "File.cpp", "TabsPls", as_edits=True)
+
+        self.assertEqual(cmake_create_class._write_all_in_place([cmake_create_class.EditedCMakeScript(self.cmakelists_path, given_edits)]), [])
+        with open(self.cmakelists_path, 'r') as cmakelists_file:
+            self.assertEqual(cmakelists_file.read(), "add_executable(TabsPls Main.cpp File.cpp)\n")
+
+    def test_none_of_the_cmake_scripts_are_written_when_one_fails(self):
+        other_cmakelists_path = os.path.join(self.directory, "Core.cmake")
+        with open(other_cmakelists_path, 'w') as cmakelists_file:
+            cmakelists_file.write("add_library(Core Directory.cpp)\n")
+
+        write_temporary_file_next_to = cmake_create_class._write_temporary_file_next_to
+        def fail_for_the_other_cmake_script(cmakelists_path, write_to):
+            if cmakelists_path == other_cmakelists_path:
+                raise OSError(errno.ENOSPC, "No space left on device", cmakelists_path)
+            return write_temporary_file_next_to(cmakelists_path, write_to)
+
+        with mock.patch.object(cmake_create_class, "_write_temporary_file_next_to", fail_for_the_other_cmake_script):
+            self.assertRaises(cmake_create_class.CMakeClassCreatorException, cmake_create_class._write_all_in_place, [
+                cmake_create_class.EditedCMakeScript(self.cmakelists_path, "add_executable(TabsPls Main.cpp File.cpp)\n"),
+                cmake_create_class.EditedCMakeScript(other_cmakelists_path, "add_library(Core Directory.cpp File.hpp)\n")])
+
+        with open(self.cmakelists_path, 'r') as cmakelists_file:
+            self.assertEqual(cmakelists_file.read(), "add_executable(TabsPls Main.cpp)\n")
+        self.assertEqual(sorted(os.listdir(self.directory)), ["CMakeLists.txt", "Core.cmake"])
+
+class TestCMakeCreateClassMemoryMapped(unittest.TestCase):
+    def setUp(self):
+        temporary_file, self.cmakelists_path = tempfile.mkstemp()
+        os.close(temporary_file)
+        with open(self.cmakelists_path, 'w') as cmakelists_file:
+            cmakelists_file.write("add_executable(TabsPls Main.cpp Directory.cpp Directory.hpp)\n")
+
+    def tearDown(self):
+        os.remove(self.cmakelists_path)
+
+    def test_edited_mapped_source_is_returned(self):
+        with cmake_create_class.create_class(self.cmakelists_path, "File", "Directory", memory_mapped=True) as result:
+            self.assertIsInstance(result, mapped_source.EditedMappedCMakeSource)
+            output = io.StringIO()
+            result.write_to(output)
+
+        self.assertEqual(output.getvalue(), "add_executable(TabsPls Main.cpp Directory.cpp Directory.hpp File.cpp File.hpp)\n")
+
+    def test_mapped_source_is_closed_when_editing_fails(self):
+        with mock.patch.object(mapped_source.MappedCMakeSource, "close", autospec=True, side_effect=mapped_source.MappedCMakeSource.close) as close:
+            self.assertRaises(cmake_create_class.CMakeClassCreatorException, cmake_create_class.create_class, self.cmakelists_path, "File", "Missing", 
+                memory_mapped=True)
+            self.assertRaises(cmake_create_class.CMakeClassCreatorException, cmake_create_class.insert_single_source_in_target, self.cmakelists_path, 
+                "File.cpp", "Missing", memory_mapped=True)
+        self.assertEqual(close.call_count, 2)
+
+class TestCMakeCreateClassStdin(unittest.TestCase):
+    def _run(self, arguments, given_input):
+        return subprocess.run([sys.executable, os.path.join(os.path.dirname(__file__), '..', "cmake_create_class.py"), "-"] + arguments + ["--no-daemon"], 
+            input=given_input, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    def test_cmake_script_is_piped_through(self):
+        result = self._run(["File.cpp", "-t", "TabsPls"], "project(TabsPls)\nadd_executable(TabsPls Main.cpp)")
+        self.assertEqual(result.stdout, "project(TabsPls)\nadd_executable(TabsPls Main.cpp File.cpp)")
+
+        result = self._run(["File.cpp", "-t", "TabsPls", "--diff"], "add_executable(TabsPls Main.cpp)\n")
+        self.assertEqual(result.stdout, "--- -\n+++ -\n@@ -1 +1 @@\n-add_executable(TabsPls Main.cpp)\n+add_executable(TabsPls Main.cpp File.cpp)\n")
+
+    def test_stdin_can_only_be_read_once_and_not_written(self):
+        given_args = cmake_create_class.create_arg_parser().parse_args(["-", "File.cpp", "-t", "TabsPls", "-i"])
+        self.assertRaises(cmake_create_class.CMakeClassCreatorException, cmake_create_class.validate_output_args, given_args)
+
+        given_args = cmake_create_class.create_arg_parser().parse_args(["-", "--batch", "-"])
+        self.assertRaises(cmake_create_class.CMakeClassCreatorException, cmake_create_class.validate_output_args, given_args)
+
+class TestStartUp(unittest.TestCase):
+    def test_arguments_are_validated_before_the_parsers_are_imported(self):
+        #a fresh interpreter, the tests that ran before already imported everything
+        given_script = "\n".join([
+            "import sys, types",
+            "import cmake_create_class",
+            "args = cmake_create_class.create_arg_parser().parse_args(['CMakeLists.txt', 'NewClass', '-rc', 'ExistingClass'])",
+            "cmake_create_class.validate_args(args)",
+            "print(' '.join(name for name, module in sys.modules.items() if type(module) is types.ModuleType))"])
+        result = subprocess.run([sys.executable, "-c", given_script], cwd=os.path.join(os.path.dirname(__file__), '..'), 
+            check=True, stdout=subprocess.PIPE, universal_newlines=True)
+
+        imported_modules = result.stdout.split()
+        self.assertIn("CMakeClassCreator.ast", imported_modules)
+        for deferred_module in ["pyparsing", "CMakeClassCreator.parser", "CMakeClassCreator.handwritten_parser", 
+            "CMakeClassCreator.source_inserter", "CMakeClassCreator.project_loader", "CMakeClassCreator.daemon", "socket"]:
+            self.assertNotIn(deferred_module, imported_modules)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from unittest import mock
+
+import context
+
+import cmake_create_class
+import cmake_create_class_async
+
+class TestAsyncCMakeClassCreator(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cmakelists_path = os.path.join(self.directory, "CMakeLists.txt")
+        with open(self.cmakelists_path, 'w') as cmakelists_file:
+            cmakelists_file.write("set(TabsPls_Sources\n    Source/Main.cpp\n    Source/Directory.cpp\n    Source/Directory.hpp\n)\n"
+                + "add_executable(TabsPls ${TabsPls_Sources})\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_same_results_as_cmake_create_class(self):
+        async def create_and_insert(creator):
+            return await asyncio.gather(creator.create_class(self.cmakelists_path, "File", "Directory"), 
+                creator.insert_single_source_next_to_reference(self.cmakelists_path, "File.cpp", "Main.cpp"),
+                creator.insert_single_source_in_variable(self.cmakelists_path, "File.cpp", "TabsPls_Sources"),
+                creator.insert_single_source_in_target(self.cmakelists_path, "File.cpp", "TabsPls"))
+
+        expected_results = [cmake_create_class.create_class(self.cmakelists_path, "File", "Directory"), 
+            cmake_create_class.insert_single_source_next_to_reference(self.cmakelists_path, "File.cpp", "Main.cpp"),
+            cmake_create_class.insert_single_source_in_variable(self.cmakelists_path, "File.cpp", "TabsPls_Sources"),
+            cmake_create_class.insert_single_source_in_target(self.cmakelists_path, "File.cpp", "TabsPls")]
+
+        self.assertEqual(asyncio.run(create_and_insert(cmake_create_class_async.AsyncCMakeClassCreator())), expected_results)
+        with ProcessPoolExecutor(2) as executor:
+            self.assertEqual(asyncio.run(create_and_insert(cmake_create_class_async.AsyncCMakeClassCreator(executor))), expected_results)
+
+    def test_concurrent_operations_on_a_cmake_script_parse_it_once(self):
+        with mock.patch.object(cmake_create_class_async, "_load_cmake_script", wraps=cmake_create_class_async._load_cmake_script) as load_cmake_script:
+            async def create_classes(creator):
+                return await asyncio.gather(*[creator.create_class(self.cmakelists_path, "File{}".format(index), "Directory") for index in range(8)])
+
+            with ThreadPoolExecutor(4) as executor:
+                results = asyncio.run(create_classes(cmake_create_class_async.AsyncCMakeClassCreator(executor)))
+                self.assertEqual(load_cmake_script.call_count, 1)
+                self.assertIn("    Source/File7.cpp\n", results[7])
+
+                #a parse that finished isn't kept, a later operation reads the cmake script again
+                asyncio.run(create_classes(cmake_create_class_async.AsyncCMakeClassCreator(executor)))
+                self.assertEqual(load_cmake_script.call_count, 2)
+
+    def test_exceptions_are_raised_by_the_coroutine(self):
+        creator = cmake_create_class_async.AsyncCMakeClassCreator()
+        self.assertRaises(cmake_create_class.CMakeClassCreatorException, asyncio.run, creator.insert_single_source_in_target(self.cmakelists_path, "File.cpp", "Missing"))
+        self.assertRaises(cmake_create_class.CMakeClassCreatorException, asyncio.run, creator.create_class(os.path.join(self.directory, "Missing.txt"), "File", "Directory"))
+
+    def test_insert_batch_and_write_in_place(self):
+        creator = cmake_create_class_async.AsyncCMakeClassCreator()
+        batch_result = asyncio.run(creator.insert_batch(self.cmakelists_path, ['{"name": "File", "reference_class": "Directory"}', '{"name": "File.cpp", "target": "Missing"}']))
+        self.assertEqual(len(batch_result.errors), 1)
+
+        edited_cmake_scripts = [cmake_create_class.EditedCMakeScript(self.cmakelists_path, batch_result.full_cmake_source)]
+        self.assertEqual(asyncio.run(creator.write_in_place(edited_cmake_scripts)), [])
+        self.assertEqual(asyncio.run(creator.write_in_place(edited_cmake_scripts)), [self.cmakelists_path])
+        with open(self.cmakelists_path, 'r') as cmakelists_file:
+            self.assertEqual(cmakelists_file.read(), batch_result.full_cmake_source)
+
+if __name__ == '__main__':
+    unittest.main()
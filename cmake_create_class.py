@@ -1,32 +1,115 @@
-import argparse, os, pyparsing, sys
-
-from collections import namedtuple
-
-from CMakeClassCreator import list_item_string_path, class_inserter, ast, source_inserter
+import argparse, bisect, json, os, sys
+
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from CMakeClassCreator import list_item_string_path, ast, lazy_import, profiling
+
+#the arguments are parsed and validated before these are imported, so --help or an invalid argument doesn't wait for them
+class_inserter = lazy_import.lazy_import("CMakeClassCreator.class_inserter")
+source_inserter = lazy_import.lazy_import("CMakeClassCreator.source_inserter")
+mapped_source = lazy_import.lazy_import("CMakeClassCreator.mapped_source")
+ast_cache = lazy_import.lazy_import("CMakeClassCreator.ast_cache")
+project_loader = lazy_import.lazy_import("CMakeClassCreator.project_loader")
+reference_index = lazy_import.lazy_import("CMakeClassCreator.reference_index")
+daemon = lazy_import.lazy_import("CMakeClassCreator.daemon")
+edit_buffer = lazy_import.lazy_import("CMakeClassCreator.edit_buffer")
+pyparsing = lazy_import.lazy_import("pyparsing")
+tempfile = lazy_import.lazy_import("tempfile")
+shutil = lazy_import.lazy_import("shutil")
+socket = lazy_import.lazy_import("socket")
 
 class CMakeClassCreatorException(Exception):
     pass
 
+#in project mode, the edited cmake script is the one that lists the reference, not necessarily the given root CMakeLists
+EditedCMakeScript = namedtuple("EditedCMakeScript", ["cmakelists_path", "full_cmake_source"])
+#the errors are (manifest line number, message) of the operations that couldn't be done, the others are done nonetheless
+BatchResult = namedtuple("BatchResult", ["full_cmake_source", "errors"])
+
+_batch_operation_keys = ["name", "reference_class", "single_file", "variable", "target", "sorted"]
+
+_profile_environment_variable = "CMAKE_CLASS_CREATOR_PROFILE"
+_profile_trace_environment_variable = "CMAKE_CLASS_CREATOR_PROFILE_TRACE"
+
 def create_arg_parser():
     parser = argparse.ArgumentParser(description="Create a new class by modifying CMake scripts.")
-    parser.add_argument("cmakelists", help="The cmake script where the class will be added.")
-    parser.add_argument("name", help="The name of the new class. In single file mode, this is the name of the file including file extension.")
+    parser.add_argument("cmakelists", help="The cmake script where the class will be added, - reads it from stdin and writes the edited script to stdout.")
+    parser.add_argument("name", nargs="?", help="The name of the new class. In single file mode, this is the name of the file including file extension.")
 
     parser.add_argument("-rc", "--reference-class", help="Add the new class in the same way the reference class was added.")
     parser.add_argument("-i", "--inplace", action="store_true", help="Modify the cmake script in place instead of writing to stdout.")
+    parser.add_argument("--diff", action="store_true", help="Write a unified diff of the changes to stdout instead of the edited cmake script.")
+    parser.add_argument("--diff-context", metavar="LINES", type=int, help="Implies --diff. The number of unchanged lines around every change, 3 by default.")
+    parser.add_argument("--edits-json", action="store_true", help="Write every edit to stdout as a JSON object on a line of its own, with the position, "
+        + "line and column in the original cmake script and the inserted content, instead of the edited cmake script.")
 
     parser.add_argument("-s", "--single-file", action="store_true", help="Single file mode, only add a single file.")
     parser.add_argument("-var", "--variable", help="Implies single file mode. Add the source file to the given cmake variable.")
     parser.add_argument("-t", "--target", help="Implies single file mode. Add the source file to the given cmake target (library or executable).")
+    parser.add_argument("--sorted", action="store_true", help="Insert the source at its place in the list when the list is sorted by file name, "
+        + "ignoring path prefixes and quotes. A list that isn't sorted gets the source at the end.")
+
+    parser.add_argument("--parser", choices=ast.backends, default=ast.HANDWRITTEN_BACKEND, help="The parser used to read the cmake script, the pyparsing grammar is slower but available as a fallback.")
+    parser.add_argument("--memory-mapped", action="store_true", help="Read the cmake script through a memory map and parse it in blocks, for very large (generated) scripts.")
+    parser.add_argument("--ast-cache", metavar="DIRECTORY", help="Keep the parsed cmake script in this directory, so it isn't parsed again as long as it doesn't change.")
+
+    parser.add_argument("-p", "--project", action="store_true", help="The cmake script is the root CMakeLists of a project, the reference is looked up in every cmake script it adds or includes.")
+    parser.add_argument("--workers", type=int, help="In project mode, the number of processes that parse the cmake scripts, one for every cpu by default.")
+    parser.add_argument("--also-in", metavar="CMAKELISTS", action="append", help="Also look the reference class up in this cmake script, can be given more than once. "
+        + "The header and the implementation of the reference class may be listed in different cmake scripts, every cmake script that changes is written.")
+
+    parser.add_argument("--batch", metavar="MANIFEST", help="Do all operations of a manifest (- reads it from stdin) with a single parse and write. "
+        + "Each line is a JSON object with a name and the options of a single operation, such as {\"name\": \"NewClass\", \"reference_class\": \"ExistingClass\"}.")
+
+    parser.add_argument("--daemon-socket", metavar="PATH", help="The socket of a running cmake_create_class_daemon, the request is forwarded to it. "
+        + "By default, the socket that cmake_create_class_daemon listens on without --socket is used when it exists.")
+    parser.add_argument("--no-daemon", action="store_true", help="Don't forward the request to a running daemon.")
+
+    parser.add_argument("--profile", action="store_true", help="Print the wall and cpu time of every phase, such as reading, parsing and writing, to stderr. "
+        + "Setting the environment variable {} to 1 does the same.".format(_profile_environment_variable))
+    parser.add_argument("--profile-trace", metavar="FILE", help="Implies --profile. Also write the phases to a Chrome trace event file, which chrome://tracing and Perfetto can show. "
+        + "The environment variable {} can give the file as well.".format(_profile_trace_environment_variable))
+    return parser
+
+def create_daemon_arg_parser():
+    parser = argparse.ArgumentParser(description="Keep parsed CMake scripts in memory and serve cmake_create_class requests on a Unix domain socket.")
+    parser.add_argument("--socket", help="The path of the socket to listen on, cmake_class_creator-<uid>.sock in $XDG_RUNTIME_DIR or the temporary directory by default.")
+    parser.add_argument("--idle-timeout", type=float, default=daemon.default_idle_timeout_seconds, help="Shut down after this many seconds without requests.")
     return parser
 
+def validate_output_args(args):
+    if args.cmakelists == "-":
+        validate_args_stdin_mode(args)
+    outputs = [option for option, is_given in [("-i", args.inplace), ("--diff", _is_diff_requested(args)), ("--edits-json", args.edits_json)] if is_given]
+    if len(outputs) > 1:
+        raise CMakeClassCreatorException("Only one of {} can be given.".format(" and ".join(outputs)))
+    if args.diff_context is not None and args.diff_context < 0:
+        raise CMakeClassCreatorException("The number of context lines of the diff can't be negative.")
+
+def validate_args_stdin_mode(args):
+    if args.inplace:
+        raise CMakeClassCreatorException("The cmake script is read from stdin, it can't be modified in place.")
+    if args.batch == "-":
+        raise CMakeClassCreatorException("The cmake script and the manifest can't both be read from stdin.")
+    if args.project or args.also_in or args.memory_mapped or args.ast_cache:
+        raise CMakeClassCreatorException("When the cmake script is read from stdin, it is not allowed to use project mode, --also-in, --memory-mapped or --ast-cache.")
+
 def validate_args(args):
+    if args.batch:
+        return validate_args_batch_mode(args)
+    if args.name is None:
+        raise CMakeClassCreatorException("Please specify the name of the class or file to add, or a manifest with --batch.")
+
     if "\\" in args.name:
         raise CMakeClassCreatorException("It is not allowed to use backslashes in the class name.")
 
     if args.reference_class and "\\" in args.reference_class:
         raise CMakeClassCreatorException("It is not allowed to use backslashes in the reference class.")
 
+    if args.project or args.also_in:
+        validate_args_project_mode(args)
+
     if using_single_file_mode(args):
         return validate_args_single_file_mode(args)
     else:
@@ -41,16 +124,22 @@ def validate_args_single_file_mode(args):
             raise CMakeClassCreatorException("In single file mode, it is not allowed to specify a reference class and also a variable or target.")
         if list_item_string_path.is_cmake_path(args.name):
             raise CMakeClassCreatorException("In single file mode, when specifying a reference, the source name can't be a path.")
-        return lambda args: insert_single_source_next_to_reference(args.cmakelists, args.name, args.reference_class)
+        if args.project:
+            return lambda args: insert_single_source_next_to_reference_in_project(args.cmakelists, args.name, args.reference_class, args.parser, args.workers, 
+                as_edits=True, sorted_insertion=args.sorted)
+        return lambda args: insert_single_source_next_to_reference(args.cmakelists, args.name, args.reference_class, args.parser, args.memory_mapped, 
+            _make_ast_cache(args), as_edits=True, sorted_insertion=args.sorted)
     else:
         if not args.variable and not args.target:
             raise CMakeClassCreatorException("In single file mode, please specify a cmake variable or a cmake target using -var, --variable or -t, --target respectively.")
         if args.variable and args.target:
             raise CMakeClassCreatorException("In single file mode, it is not allowed to specify both a variable and a target.")
         if args.variable:
-            return lambda args: insert_single_source_in_variable(args.cmakelists, args.name, args.variable)
+            return lambda args: insert_single_source_in_variable(args.cmakelists, args.name, args.variable, args.parser, args.memory_mapped, 
+                _make_ast_cache(args), as_edits=True, sorted_insertion=args.sorted)
         if args.target:
-            return lambda args: insert_single_source_in_target(args.cmakelists, args.name, args.target)
+            return lambda args: insert_single_source_in_target(args.cmakelists, args.name, args.target, args.parser, args.memory_mapped, 
+                _make_ast_cache(args), as_edits=True, sorted_insertion=args.sorted)
 
 def validate_args_class_mode(args):
     if not args.reference_class:
@@ -58,33 +147,165 @@ def validate_args_class_mode(args):
     if list_item_string_path.is_cmake_path(args.name):
         raise CMakeClassCreatorException("When adding a class, the name of the class '{}' can't be a path.".format(args.name))
 
-    return lambda args: create_class(args.cmakelists, args.name, args.reference_class)
-
-def create_class(cmakelists_path, class_name, reference_class_name):
-    full_cmake_source = _read_cmakelists_contents(cmakelists_path)
-    
-    full_cmake_ast = _parse_cmakelists_contents(full_cmake_source)
+    if args.project:
+        return lambda args: create_class_in_project(args.cmakelists, args.name, args.reference_class, args.parser, args.workers, 
+            as_edits=True, sorted_insertion=args.sorted)
+    if args.also_in:
+        return lambda args: create_class_in_cmake_scripts([args.cmakelists] + args.also_in, args.name, args.reference_class, args.parser, args.workers, 
+            as_edits=True, sorted_insertion=args.sorted)
+    return lambda args: create_class(args.cmakelists, args.name, args.reference_class, args.parser, args.memory_mapped, _make_ast_cache(args), 
+        as_edits=True, sorted_insertion=args.sorted)
+
+def validate_args_project_mode(args):
+    if args.also_in and (args.project or using_single_file_mode(args)):
+        raise CMakeClassCreatorException("The reference class can only be looked up in other cmake scripts with --also-in when adding a class, without project mode.")
+    if args.variable or args.target:
+        raise CMakeClassCreatorException("In project mode, the source is added next to a reference, it is not allowed to specify a variable or target.")
+    if args.memory_mapped or args.ast_cache:
+        raise CMakeClassCreatorException("In project mode, it is not allowed to use --memory-mapped or --ast-cache.")
+
+def validate_args_batch_mode(args):
+    if args.name or args.reference_class or args.single_file or args.variable or args.target or args.also_in:
+        raise CMakeClassCreatorException("In batch mode, the name and the options of every operation are given in the manifest.")
+    if args.project:
+        raise CMakeClassCreatorException("In batch mode, it is not allowed to use project mode.")
+
+    return lambda args: insert_batch(args.cmakelists, _read_manifest_lines(args.batch), args.parser, args.memory_mapped, _make_ast_cache(args), 
+        as_edits=True, sorted_insertion=args.sorted)
+
+def _make_ast_cache(args):
+    return ast_cache.AstCache(args.ast_cache) if args.ast_cache else None
+
+def create_class(cmakelists_path, class_name, reference_class_name, parser_backend=ast.HANDWRITTEN_BACKEND, memory_mapped=False, cmake_ast_cache=None, 
+    as_edits=False, sorted_insertion=False):
+    """ Returns the edited cmake script, or with as_edits the edits that haven't been made yet (see _do_all_actions)
+
+    With memory_mapped, the result is always a mapped_source.EditedMappedCMakeSource, which keeps the cmake script mapped until
+    it is closed (also as a context manager). Nothing stays open when an exception is raised instead."""
+    cmakelists_stat = _stat_before_reading(cmakelists_path, cmake_ast_cache)
+    full_cmake_source = _read_cmakelists_contents(cmakelists_path, memory_mapped)
+
+    with _closing_on_error(full_cmake_source):
+        return _create_class_in_full_cmake_source(full_cmake_source, class_name, reference_class_name, parser_backend, cmakelists_path, cmake_ast_cache, 
+            as_edits, sorted_insertion, cmakelists_stat)
+
+def _create_class_in_full_cmake_source(full_cmake_source, class_name, reference_class_name, parser_backend=ast.HANDWRITTEN_BACKEND, 
+    cmakelists_path=None, cmake_ast_cache=None, as_edits=False, sorted_insertion=False, cmakelists_stat=None):
+    reference_class_name = list_item_string_path.PathAwareListItemString(reference_class_name)
+    #the lookup is repeated for every extension, so the statements that mention the reference class are parsed and indexed only once
+    with profiling.phase("index"):
+        full_cmake_ast = source_inserter.CMakeAstIndex(_parse_cmakelists_statements_mentioning(full_cmake_source, 
+            list_item_string_path.get_reference_source_file_name(reference_class_name), parser_backend, cmakelists_path, cmake_ast_cache, cmakelists_stat))
     
     try:
-        header_and_implementation_actions = class_inserter.insert_class_next_to_other_class_with_whitespace_enhancement(
-            full_cmake_source, full_cmake_ast, class_name, list_item_string_path.PathAwareListItemString(reference_class_name))
-    except class_inserter.ClassInserterException as e:
+        with profiling.phase("resolve"):
+            header_and_implementation_actions = class_inserter.insert_class_next_to_other_class_with_whitespace_enhancement(
+                full_cmake_source, full_cmake_ast, class_name, reference_class_name, sorted_insertion)
+    except (class_inserter.ClassInserterException, source_inserter.SourceInserterException) as e:
+        raise CMakeClassCreatorException(str(e))
+
+    return _do_all_actions(list(header_and_implementation_actions), full_cmake_source, as_edits)
+
+def create_class_in_project(root_cmakelists_path, class_name, reference_class_name, parser_backend=ast.HANDWRITTEN_BACKEND, workers=None, 
+    project_reference_index_cache=None, as_edits=False, sorted_insertion=False):
+    """ Adds the class to the cmake scripts of the project that list the reference class, returns an EditedCMakeScript for each of them """
+    project_reference_index = _load_reference_index(root_cmakelists_path, parser_backend, workers, project_reference_index_cache)
+    return _create_class_with_reference_index(project_reference_index, class_name, reference_class_name, as_edits, sorted_insertion)
+
+def create_class_in_cmake_scripts(cmakelists_paths, class_name, reference_class_name, parser_backend=ast.HANDWRITTEN_BACKEND, workers=None, 
+    as_edits=False, sorted_insertion=False):
+    """ Like create_class_in_project, but the reference class is only looked up in the given cmake scripts, which are parsed in parallel """
+    try:
+        with profiling.phase("project"):
+            project_reference_index = reference_index.make_reference_index(project_loader.load_cmake_scripts(cmakelists_paths, workers, parser_backend))
+    except project_loader.ProjectLoaderException as e:
+        raise CMakeClassCreatorException(str(e))
+    return _create_class_with_reference_index(project_reference_index, class_name, reference_class_name, as_edits, sorted_insertion)
+
+def _create_class_with_reference_index(project_reference_index, class_name, reference_class_name, as_edits=False, sorted_insertion=False):
+    """ The header and the implementation may be added to different cmake scripts, all edits are made before anything is written """
+    reference_class_name = list_item_string_path.PathAwareListItemString(reference_class_name)
+    try:
+        with profiling.phase("resolve"):
+            class_files = project_reference_index.find_class_files(reference_class_name)
+            header_path, header_inserter, header_extension = _make_project_inserter_for_class_file(project_reference_index, class_files,
+                reference_class_name, class_inserter._header_extensions, "header")
+            implementation_path, implementation_inserter, implementation_extension = _make_project_inserter_for_class_file(project_reference_index, class_files,
+                reference_class_name, class_inserter._implementation_extensions, "implementation")
+    except (reference_index.ReferenceIndexException, class_inserter.ClassInserterException) as e:
+        raise CMakeClassCreatorException(str(e))
+
+    actions_by_path = OrderedDict()
+    for cmakelists_path, inserter, source_item in [(header_path, header_inserter, class_name + header_extension), 
+        (implementation_path, implementation_inserter, class_name + implementation_extension)]:
+        if cmakelists_path not in actions_by_path:
+            actions_by_path[cmakelists_path] = (_read_cmakelists_contents(cmakelists_path), [])
+        full_cmake_source, actions = actions_by_path[cmakelists_path]
+        try:
+            actions.append(source_inserter.insert_source_considering_existing_whitespace(inserter, source_item, full_cmake_source, sorted_insertion))
+        except source_inserter.SourceInserterException as e:
+            raise CMakeClassCreatorException("{0}: {1}".format(cmakelists_path, str(e)))
+
+    return [EditedCMakeScript(cmakelists_path, _do_all_actions(actions, full_cmake_source, as_edits)) 
+        for cmakelists_path, (full_cmake_source, actions) in actions_by_path.items()]
+
+def _make_project_inserter_for_class_file(project_reference_index, class_files, reference_class_name, extensions, file_kind):
+    """ Like class_inserter, a reference class that is listed with more than one of the extensions is ambiguous """
+    extension = class_inserter.find_class_file_extension(class_files, reference_class_name, extensions, file_kind)
+    return project_reference_index.make_inserter_for_item_next_to_other_source(reference_class_name + extension) + (extension,)
+
+def _load_reference_index(root_cmakelists_path, parser_backend, workers, project_reference_index_cache=None):
+    try:
+        with profiling.phase("project"):
+            if project_reference_index_cache is not None:
+                return project_reference_index_cache.load_or_build(root_cmakelists_path, parser_backend, workers)
+            return reference_index.make_reference_index(project_loader.load_project(root_cmakelists_path, workers, parser_backend))
+    except project_loader.ProjectLoaderException as e:
         raise CMakeClassCreatorException(str(e))
 
-    full_cmake_source = _do_all_actions(list(header_and_implementation_actions), full_cmake_source)
-    return full_cmake_source
+def _read_cmakelists_contents(cmakelists_path, memory_mapped=False):
+    if cmakelists_path == "-":
+        with profiling.phase("read"):
+            return sys.stdin.read()
 
-def _read_cmakelists_contents(cmakelists_path):
     if not os.path.exists(cmakelists_path):
         raise CMakeClassCreatorException("{} can't be found.".format(cmakelists_path))
 
-    with open(cmakelists_path, 'r') as cmakelists_file:
-        return cmakelists_file.read()
+    with profiling.phase("read"):
+        if memory_mapped:
+            return mapped_source.MappedCMakeSource(cmakelists_path)
+
+        with open(cmakelists_path, 'r') as cmakelists_file:
+            return cmakelists_file.read()
+
+def _stat_before_reading(cmakelists_path, cmake_ast_cache):
+    """ The AST cache can only trust the modification time and size of the file when they were taken before it was read """
+    if cmake_ast_cache is None or cmakelists_path == "-":
+        return None
+    try:
+        return os.stat(cmakelists_path)
+    except OSError:
+        return None #reading it fails as well
+
+@contextmanager
+def _closing_on_error(full_cmake_source):
+    """ A mapped cmake source stays open for the edited cmake script that is returned, unless editing it fails """
+    try:
+        yield
+    except BaseException:
+        if isinstance(full_cmake_source, mapped_source.MappedCMakeSource):
+            full_cmake_source.close()
+        raise
 
-def _parse_cmakelists_contents(full_cmake_source):
+def _parse_cmakelists_contents(full_cmake_source, parser_backend=ast.HANDWRITTEN_BACKEND):
     full_cmake_ast = []
     try:
-        full_cmake_ast = [match[0] for match in ast.Ast().scan_all(full_cmake_source)]
+        #ignored statements such as set(ENV{...}) are matched without producing an AST component
+        with profiling.phase("parse"):
+            if isinstance(full_cmake_source, mapped_source.MappedCMakeSource):
+                full_cmake_ast = list(full_cmake_source.iter_statements(None, parser_backend))
+            else:
+                full_cmake_ast = [match[0] for match in ast.get_shared_ast(parser_backend).scan_all(full_cmake_source) if len(match) > 0]
     except pyparsing.exceptions.ParseException as e:
         raise CMakeClassCreatorException("Unable to parse cmake file. Here is the pyparsing exception:\n\n{}".format(str(e)))
 
@@ -93,71 +314,517 @@ def _parse_cmakelists_contents(full_cmake_source):
 
     return full_cmake_ast
 
-def insert_single_source_next_to_reference(cmakelists_path, source_item, reference_source_item):
-    full_cmake_source = _read_cmakelists_contents(cmakelists_path)
-    
-    _insert_single_source_next_to_reference_in_full_cmake_source(full_cmake_source, source_item, reference_source_item)
+def _parse_cmakelists_statements_mentioning(full_cmake_source, name, parser_backend=ast.HANDWRITTEN_BACKEND, cmakelists_path=None, cmake_ast_cache=None, 
+    cmakelists_stat=None):
+    """ Lazily parses only the (supported) statements that mention the given name, so a lookup can stop as soon as its result is known
+
+    With a cache, the complete AST is parsed once and then read from the cache for as long as the cmake script doesn't change"""
+    if cmake_ast_cache is not None:
+        with profiling.phase("ast cache"):
+            return cmake_ast_cache.load_or_parse(cmakelists_path, lambda: _parse_cmakelists_contents(full_cmake_source, parser_backend), parser_backend, 
+                full_cmake_source, cmakelists_stat)
+    if isinstance(full_cmake_source, mapped_source.MappedCMakeSource):
+        return profiling.iterate_in_phase("parse", full_cmake_source.iter_statements(name, parser_backend))
+    return profiling.iterate_in_phase("parse", ast.get_shared_ast(parser_backend).iter_statements(full_cmake_source, name))
+
+def insert_single_source_next_to_reference(cmakelists_path, source_item, reference_source_item, parser_backend=ast.HANDWRITTEN_BACKEND, memory_mapped=False, cmake_ast_cache=None, 
+    as_edits=False, sorted_insertion=False):
+    """ Returns the same kind of result as create_class """
+    cmakelists_stat = _stat_before_reading(cmakelists_path, cmake_ast_cache)
+    full_cmake_source = _read_cmakelists_contents(cmakelists_path, memory_mapped)
+
+    with _closing_on_error(full_cmake_source):
+        return _insert_single_source_next_to_reference_in_full_cmake_source(full_cmake_source, source_item, reference_source_item, parser_backend, cmakelists_path, 
+            cmake_ast_cache, as_edits, sorted_insertion, cmakelists_stat)
+
+def _insert_single_source_next_to_reference_in_full_cmake_source(full_cmake_source, source_item, reference_source_item, parser_backend=ast.HANDWRITTEN_BACKEND, 
+    cmakelists_path=None, cmake_ast_cache=None, as_edits=False, sorted_insertion=False, cmakelists_stat=None):
+    reference_source_item = list_item_string_path.PathAwareListItemString(_make_reference_path_aware_if_needed(reference_source_item))
+    full_cmake_ast = _parse_cmakelists_statements_mentioning(full_cmake_source, 
+        list_item_string_path.get_reference_source_file_name(reference_source_item), parser_backend, cmakelists_path, cmake_ast_cache, cmakelists_stat)
 
-def _insert_single_source_next_to_reference_in_full_cmake_source(full_cmake_source, source_item, reference_source_item):
-    full_cmake_ast = _parse_cmakelists_contents(full_cmake_source)
+    try:
+        with profiling.phase("resolve"):
+            inserter_with_reference = source_inserter._make_inserter_for_item_next_to_other_source(full_cmake_ast, reference_source_item)
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(inserter_with_reference, source_item, full_cmake_source, sorted_insertion)
+        return _do_all_actions([insert_action], full_cmake_source, as_edits)
+    except source_inserter.SourceInserterException as e:
+        raise CMakeClassCreatorException(str(e))
 
-    reference_source_item = _make_reference_path_aware_if_needed(reference_source_item)
+def insert_single_source_next_to_reference_in_project(root_cmakelists_path, source_item, reference_source_item, parser_backend=ast.HANDWRITTEN_BACKEND, workers=None, 
+    project_reference_index_cache=None, as_edits=False, sorted_insertion=False):
+    """ Adds the source to the cmake script of the project that lists the reference source """
+    project_reference_index = _load_reference_index(root_cmakelists_path, parser_backend, workers, project_reference_index_cache)
 
-    inserter_with_reference = source_inserter._make_inserter_for_item_next_to_other_source(full_cmake_ast, 
-        list_item_string_path.PathAwareListItemString(reference_source_item))
+    reference_source_item = list_item_string_path.PathAwareListItemString(_make_reference_path_aware_if_needed(reference_source_item))
     try:
-        insert_action = source_inserter.insert_source_considering_existing_whitespace(inserter_with_reference, source_item, full_cmake_source)
-        return insert_action.do(full_cmake_source)
-    except source_inserter.SourceInserterException as e:
+        with profiling.phase("resolve"):
+            cmakelists_path, inserter_with_reference = project_reference_index.make_inserter_for_item_next_to_other_source(reference_source_item)
+        full_cmake_source = _read_cmakelists_contents(cmakelists_path)
+        insert_action = source_inserter.insert_source_considering_existing_whitespace(inserter_with_reference, source_item, full_cmake_source, sorted_insertion)
+    except (reference_index.ReferenceIndexException, source_inserter.SourceInserterException) as e:
         raise CMakeClassCreatorException(str(e))
 
-def insert_single_source_in_variable(cmakelists_path, source_item, variable):
-    full_cmake_source = _read_cmakelists_contents(cmakelists_path)
-    
-    full_cmake_ast = _parse_cmakelists_contents(full_cmake_source)
+    return EditedCMakeScript(cmakelists_path, _do_all_actions([insert_action], full_cmake_source, as_edits))
+
+def insert_single_source_in_variable(cmakelists_path, source_item, variable, parser_backend=ast.HANDWRITTEN_BACKEND, memory_mapped=False, cmake_ast_cache=None, 
+    as_edits=False, sorted_insertion=False):
+    """ Returns the same kind of result as create_class """
+    cmakelists_stat = _stat_before_reading(cmakelists_path, cmake_ast_cache)
+    full_cmake_source = _read_cmakelists_contents(cmakelists_path, memory_mapped)
+
+    with _closing_on_error(full_cmake_source):
+        return _insert_single_source_in_variable_in_full_cmake_source(full_cmake_source, source_item, variable, parser_backend, cmakelists_path, cmake_ast_cache, 
+            as_edits, sorted_insertion, cmakelists_stat)
+
+def _insert_single_source_in_variable_in_full_cmake_source(full_cmake_source, source_item, variable, parser_backend=ast.HANDWRITTEN_BACKEND, 
+    cmakelists_path=None, cmake_ast_cache=None, as_edits=False, sorted_insertion=False, cmakelists_stat=None):
+    full_cmake_ast = _parse_cmakelists_statements_mentioning(full_cmake_source, variable, parser_backend, cmakelists_path, cmake_ast_cache, cmakelists_stat)
 
     try:
-        inserter = source_inserter._make_inserter_for_variable_declaration(full_cmake_ast, variable)
-        return source_inserter.insert_source_considering_existing_whitespace(inserter, source_item, full_cmake_source).do(full_cmake_source)
+        with profiling.phase("resolve"):
+            inserter = source_inserter._make_inserter_for_variable_declaration(full_cmake_ast, variable)
+        return _do_all_actions([source_inserter.insert_source_considering_existing_whitespace(inserter, source_item, full_cmake_source, sorted_insertion)], 
+            full_cmake_source, as_edits)
     except source_inserter.SourceInserterException as e:
         raise CMakeClassCreatorException(str(e))
 
-def insert_single_source_in_target(cmakelists_path, source_item, target):
-    full_cmake_source = _read_cmakelists_contents(cmakelists_path)
-    
-    full_cmake_ast = _parse_cmakelists_contents(full_cmake_source)
+def insert_single_source_in_target(cmakelists_path, source_item, target, parser_backend=ast.HANDWRITTEN_BACKEND, memory_mapped=False, cmake_ast_cache=None, 
+    as_edits=False, sorted_insertion=False):
+    """ Returns the same kind of result as create_class """
+    cmakelists_stat = _stat_before_reading(cmakelists_path, cmake_ast_cache)
+    full_cmake_source = _read_cmakelists_contents(cmakelists_path, memory_mapped)
+
+    with _closing_on_error(full_cmake_source):
+        return _insert_single_source_in_target_in_full_cmake_source(full_cmake_source, source_item, target, parser_backend, cmakelists_path, cmake_ast_cache, 
+            as_edits, sorted_insertion, cmakelists_stat)
+
+def _insert_single_source_in_target_in_full_cmake_source(full_cmake_source, source_item, target, parser_backend=ast.HANDWRITTEN_BACKEND, 
+    cmakelists_path=None, cmake_ast_cache=None, as_edits=False, sorted_insertion=False, cmakelists_stat=None):
+    full_cmake_ast = _parse_cmakelists_statements_mentioning(full_cmake_source, target, parser_backend, cmakelists_path, cmake_ast_cache, cmakelists_stat)
 
     try:
-        inserter = source_inserter._make_inserter_for_target(full_cmake_ast, target)
-        return source_inserter.insert_source_considering_existing_whitespace(inserter, source_item, full_cmake_source).do(full_cmake_source)
+        with profiling.phase("resolve"):
+            inserter = source_inserter._make_inserter_for_target(full_cmake_ast, target)
+        return _do_all_actions([source_inserter.insert_source_considering_existing_whitespace(inserter, source_item, full_cmake_source, sorted_insertion)], 
+            full_cmake_source, as_edits)
     except source_inserter.SourceInserterException as e:
         raise CMakeClassCreatorException(str(e))
 
+def insert_batch(cmakelists_path, manifest_lines, parser_backend=ast.HANDWRITTEN_BACKEND, memory_mapped=False, cmake_ast_cache=None, 
+    as_edits=False, sorted_insertion=False):
+    """ Does the operations of a manifest, given as lines of JSON objects, on a cmake script that is parsed only once
+
+    All operations are looked up in the cmake script as it was before the batch, so a reference can't be something that the
+    batch adds. An operation that fails is reported in the errors of the result and the others are done nonetheless.
+    The edited cmake script in the result is of the same kind as the one of create_class."""
+    cmakelists_stat = _stat_before_reading(cmakelists_path, cmake_ast_cache)
+    full_cmake_source = _read_cmakelists_contents(cmakelists_path, memory_mapped)
+
+    with _closing_on_error(full_cmake_source):
+        return _insert_batch_in_full_cmake_source(full_cmake_source, manifest_lines, parser_backend, cmakelists_path, cmake_ast_cache, as_edits, sorted_insertion, 
+            cmakelists_stat)
+
+def _insert_batch_in_full_cmake_source(full_cmake_source, manifest_lines, parser_backend=ast.HANDWRITTEN_BACKEND, cmakelists_path=None, cmake_ast_cache=None, 
+    as_edits=False, sorted_insertion=False, cmakelists_stat=None):
+    operations, errors = [], []
+    for line_number, line in enumerate(manifest_lines, 1):
+        if not line.strip():
+            continue
+        try:
+            operations.append((line_number, _parse_batch_operation(line)))
+        except CMakeClassCreatorException as e:
+            errors.append((line_number, str(e)))
+
+    #every operation is a lookup in the same cmake script, which only needs the statements that mention one of the looked up names
+    with profiling.phase("index"):
+        cmake_ast_index = source_inserter.CMakeAstIndex(_parse_cmakelists_statements_mentioning(full_cmake_source, 
+            [_get_batch_operation_lookup_name(operation_args) for _, operation_args in operations], parser_backend, cmakelists_path, cmake_ast_cache, 
+            cmakelists_stat))
+        class_stem_index = class_inserter.ClassStemIndex(cmake_ast_index)
+        list_starts = _get_list_starts(cmake_ast_index)
+
+    keys_and_actions, inserted_sources = [], set()
+    for line_number, operation_args in operations:
+        try:
+            #an operation without its own sorted option uses the one of the batch
+            operation_sorted_insertion = sorted_insertion if operation_args.sorted is None else operation_args.sorted
+            with profiling.phase("resolve"):
+                for action in _make_batch_operation_actions(operation_args, full_cmake_source, cmake_ast_index, class_stem_index, operation_sorted_insertion):
+                    #a source that an earlier operation adds to the same list is already listed, just like one in the cmake script
+                    inserted_source = (list_starts[bisect.bisect_right(list_starts, action.position) - 1], source_inserter._unquote(action.content.strip()))
+                    if inserted_source in inserted_sources:
+                        continue
+                    inserted_sources.add(inserted_source)
+                    keys_and_actions.append((source_inserter._get_sort_key(action.content.strip()) if operation_sorted_insertion else "", action))
+        except CMakeClassCreatorException as e:
+            errors.append((line_number, str(e)))
+
+    #sources that are inserted in front of the same list item are sorted among themselves, the others keep the order of the manifest
+    keys_and_actions.sort(key=lambda key_and_action: (key_and_action[1].position, key_and_action[0]))
+    #actions at the same position end up in reverse order, so reversing them keeps the order of the manifest
+    return BatchResult(_do_all_actions([action for _, action in keys_and_actions[::-1]], full_cmake_source, as_edits), sorted(errors))
+
+def _get_batch_operation_lookup_name(operation_args):
+    """ The name that the statements used by the operation contain, like the single operations look it up """
+    if operation_args.reference_class:
+        return list_item_string_path.get_reference_source_file_name(operation_args.reference_class)
+    return operation_args.variable or operation_args.target
+
+def _get_list_starts(cmake_ast_index):
+    """ The sorted start locations of the lists, an insert action goes to the last list that starts at or before its position """
+    list_starts = []
+    for statement in cmake_ast_index.statements:
+        list_start = next((item.location for item in statement.cmake_string_list.items if hasattr(item, "location")), None)
+        if list_start is not None:
+            list_starts.append(list_start)
+    return sorted(list_starts)
+
+def _read_manifest_lines(manifest):
+    """ The manifest is read while the operations are done, so it can be streamed on stdin """
+    if manifest == "-":
+        return sys.stdin
+
+    if not os.path.exists(manifest):
+        raise CMakeClassCreatorException("{} can't be found.".format(manifest))
+    return _read_lines_and_close(manifest)
+
+def _read_lines_and_close(path):
+    with open(path, 'r') as lines_file:
+        yield from lines_file
+
+def _parse_batch_operation(line):
+    """ Turns a line of the manifest into validated arguments, like the ones of the command line """
+    try:
+        operation = json.loads(line)
+    except ValueError as e:
+        raise CMakeClassCreatorException("The operation is not valid JSON: {}".format(str(e)))
+
+    if not isinstance(operation, dict):
+        raise CMakeClassCreatorException("An operation has to be a JSON object.")
+    unknown_keys = sorted(set(operation) - set(_batch_operation_keys))
+    if unknown_keys:
+        raise CMakeClassCreatorException("Unknown operation options {0}, the supported options are {1}.".format(unknown_keys, _batch_operation_keys))
+    if not isinstance(operation.get("name"), str):
+        raise CMakeClassCreatorException("Every operation needs the name of the class or file to add.")
+
+    operation_args = argparse.Namespace(**{key: operation.get(key) for key in _batch_operation_keys}, project=False, memory_mapped=False, ast_cache=None, batch=None, also_in=None)
+    validate_args(operation_args)
+    return operation_args
+
+def _make_batch_operation_actions(operation_args, full_cmake_source, cmake_ast_index, class_stem_index, sorted_insertion=False):
+    try:
+        if not using_single_file_mode(operation_args):
+            return list(class_inserter.insert_class_next_to_other_class_with_whitespace_enhancement(full_cmake_source, class_stem_index, 
+                operation_args.name, list_item_string_path.PathAwareListItemString(operation_args.reference_class), sorted_insertion))
+
+        if operation_args.reference_class:
+            inserter = source_inserter._make_inserter_for_item_next_to_other_source(cmake_ast_index, 
+                list_item_string_path.PathAwareListItemString(_make_reference_path_aware_if_needed(operation_args.reference_class)))
+        elif operation_args.variable:
+            inserter = source_inserter._make_inserter_for_variable_declaration(cmake_ast_index, operation_args.variable)
+        else:
+            inserter = source_inserter._make_inserter_for_target(cmake_ast_index, operation_args.target)
+        return [source_inserter.insert_source_considering_existing_whitespace(inserter, operation_args.name, full_cmake_source, sorted_insertion)]
+    except (class_inserter.ClassInserterException, source_inserter.SourceInserterException) as e:
+        raise CMakeClassCreatorException(str(e))
+
 def _make_reference_path_aware_if_needed(reference_source_item):
     return reference_source_item \
         if not list_item_string_path.is_cmake_path(reference_source_item) \
             else list_item_string_path.PathAwareListItemString(reference_source_item)
 
-def _do_all_actions(actions, full_cmake_source):
-    actions.sort(reverse=True, key=lambda action: action.position)
-    for action in actions:
-        full_cmake_source = action.do(full_cmake_source)
-    return full_cmake_source
+def _do_all_actions(actions, full_cmake_source, as_edits=False):
+    """ The edited cmake script, or with as_edits an edit_buffer.EditBuffer that can also give the edits or a diff without building it
+
+    The edited mapped cmake script is only built while it is written, so it can give the edits or a diff as well."""
+    if isinstance(full_cmake_source, mapped_source.MappedCMakeSource):
+        return full_cmake_source.with_actions(actions)
+
+    edits = edit_buffer.EditBuffer(full_cmake_source)
+    try:
+        with profiling.phase("edit"):
+            for action in actions:
+                edits.do(action)
+            return edits if as_edits else edits.text()
+    except edit_buffer.EditBufferException as e:
+        raise CMakeClassCreatorException(str(e))
+
+def _write_edited_mapped_source(output, cmakelists_path=None):
+    """ Writes to stdout, or in place through a temporary file because the mapped cmake script is still being read """
+    try:
+        if cmakelists_path is None:
+            output.write_to(sys.stdout)
+            sys.stdout.write("\n")
+            return
+
+        temporary_path = _write_temporary_file_next_to(cmakelists_path, output.write_to)
+    finally:
+        output.close()
+    _replace_with_temporary_file(cmakelists_path, temporary_path)
+
+def _write_all_in_place(edited_cmake_scripts):
+    """ Writes every cmake script that changes, or none of them when one of them can't be written
+
+    Returns the paths of the cmake scripts that are unchanged, which aren't written."""
+    changes, unchanged_paths = [], []
+    for cmakelists_path, full_cmake_source in edited_cmake_scripts:
+        if isinstance(full_cmake_source, edit_buffer.EditBuffer):
+            is_unchanged, original_cmake_source = full_cmake_source.is_unchanged, full_cmake_source.full_cmake_source
+        else:
+            original_cmake_source = _read_cmakelists_contents(cmakelists_path)
+            is_unchanged = original_cmake_source == full_cmake_source
+        if is_unchanged:
+            unchanged_paths.append(cmakelists_path)
+        else:
+            changes.append((cmakelists_path, full_cmake_source, original_cmake_source))
+
+    temporary_paths, replaced = [], []
+    try:
+        #every cmake script is written before the first one is replaced, so a full disk doesn't leave some of them changed
+        for cmakelists_path, full_cmake_source, _ in changes:
+            temporary_paths.append(_write_temporary_file_next_to(cmakelists_path, lambda output_file: _write_cmake_source(output_file, full_cmake_source)))
+        for (cmakelists_path, _, original_cmake_source), temporary_path in zip(changes, list(temporary_paths)):
+            os.replace(temporary_path, os.path.realpath(cmakelists_path))
+            temporary_paths.remove(temporary_path)
+            replaced.append((cmakelists_path, original_cmake_source))
+    except OSError as e:
+        for temporary_path in temporary_paths:
+            os.remove(temporary_path)
+        for cmakelists_path, original_cmake_source in replaced:
+            _replace_with_temporary_file(cmakelists_path, _write_temporary_file_next_to(cmakelists_path, lambda output_file: output_file.write(original_cmake_source)))
+        raise CMakeClassCreatorException("Unable to write {0}: {1}, none of the cmake scripts are changed.".format(e.filename, e.strerror))
+    return unchanged_paths
+
+def _write_cmake_source(output_file, full_cmake_source):
+    """ An edit buffer is written as slices of the original cmake script and the inserted contents, without joining them """
+    if isinstance(full_cmake_source, str):
+        output_file.write(full_cmake_source)
+    else:
+        full_cmake_source.write_to(output_file)
+
+def _write_temporary_file_next_to(cmakelists_path, write_to):
+    """ Writes a temporary file with the permissions of the cmake script, which is only replaced once the whole file is written
+
+    The temporary file is in the same directory, so replacing the cmake script with it is a rename on the same file system"""
+    cmakelists_path = os.path.realpath(cmakelists_path) #a symbolic link is kept, the file it points to is replaced
+    temporary_file_descriptor, temporary_path = tempfile.mkstemp(prefix=os.path.basename(cmakelists_path) + ".", suffix=".tmp", 
+        dir=os.path.dirname(cmakelists_path))
+    try:
+        with os.fdopen(temporary_file_descriptor, 'w') as temporary_file:
+            write_to(temporary_file)
+        shutil.copymode(cmakelists_path, temporary_path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+    return temporary_path
+
+def _replace_with_temporary_file(cmakelists_path, temporary_path):
+    try:
+        os.replace(temporary_path, os.path.realpath(cmakelists_path))
+    except OSError:
+        os.remove(temporary_path)
+        raise
+
+def make_daemon_methods():
+    """ The JSON-RPC methods of the daemon, they share the parsed cmake scripts and project indexes between requests """
+    cmake_ast_cache = ast_cache.InMemoryAstCache()
+    project_reference_index_cache = reference_index.ReferenceIndexCache()
+
+    def create_class_method(cmakelists, name, reference_class, parser=ast.HANDWRITTEN_BACKEND, project=False, workers=None, sorted_insertion=False):
+        if project:
+            return [edited_cmake_script._asdict() for edited_cmake_script in 
+                create_class_in_project(cmakelists, name, reference_class, parser, workers, project_reference_index_cache, sorted_insertion=sorted_insertion)]
+        return EditedCMakeScript(cmakelists, create_class(cmakelists, name, reference_class, parser, False, cmake_ast_cache, 
+            sorted_insertion=sorted_insertion))._asdict()
+
+    def insert_single_source_next_to_reference_method(cmakelists, name, reference_class, parser=ast.HANDWRITTEN_BACKEND, project=False, workers=None, 
+        sorted_insertion=False):
+        if project:
+            return insert_single_source_next_to_reference_in_project(cmakelists, name, reference_class, parser, workers, project_reference_index_cache, 
+                sorted_insertion=sorted_insertion)._asdict()
+        return EditedCMakeScript(cmakelists, insert_single_source_next_to_reference(cmakelists, name, reference_class, parser, False, cmake_ast_cache, 
+            sorted_insertion=sorted_insertion))._asdict()
+
+    def insert_single_source_in_variable_method(cmakelists, name, variable, parser=ast.HANDWRITTEN_BACKEND, sorted_insertion=False):
+        return EditedCMakeScript(cmakelists, insert_single_source_in_variable(cmakelists, name, variable, parser, False, cmake_ast_cache, 
+            sorted_insertion=sorted_insertion))._asdict()
+
+    def insert_single_source_in_target_method(cmakelists, name, target, parser=ast.HANDWRITTEN_BACKEND, sorted_insertion=False):
+        return EditedCMakeScript(cmakelists, insert_single_source_in_target(cmakelists, name, target, parser, False, cmake_ast_cache, 
+            sorted_insertion=sorted_insertion))._asdict()
+
+    return {"create_class": create_class_method, "insert_single_source_next_to_reference": insert_single_source_next_to_reference_method,
+        "insert_single_source_in_variable": insert_single_source_in_variable_method, "insert_single_source_in_target": insert_single_source_in_target_method}
+
+def _make_daemon_request(args):
+    """ The daemon method and parameters that do the same as the (validated) arguments, or None when the daemon can't handle them """
+    if args.cmakelists == "-" or args.memory_mapped or args.ast_cache or args.batch or args.also_in or _is_edit_output_requested(args):
+        return None
+
+    params = {"cmakelists": os.path.abspath(args.cmakelists), "name": args.name, "parser": args.parser, "sorted_insertion": args.sorted}
+    if args.variable:
+        return "insert_single_source_in_variable", dict(params, variable=args.variable)
+    if args.target:
+        return "insert_single_source_in_target", dict(params, target=args.target)
+
+    params.update(reference_class=args.reference_class, project=args.project, workers=args.workers)
+    return ("insert_single_source_next_to_reference" if args.single_file else "create_class"), params
+
+def _call_daemon_if_running(args):
+    """ Returns None when there is no daemon to forward to, so the request has to be handled by this process """
+    if args.no_daemon:
+        return None
+    daemon_request = _make_daemon_request(args)
+    if daemon_request is None:
+        return None
+    socket_path = args.daemon_socket or daemon.default_socket_path()
+    if not daemon.is_trusted_socket(socket_path):
+        return None #no daemon, or one that another user may have started
+
+    try:
+        with profiling.phase("daemon"):
+            result = daemon.call(socket_path, *daemon_request, timeout=daemon.default_call_timeout_seconds)
+    except socket.timeout:
+        return None #the daemon is busy or hung, this process does the work itself
+    except OSError:
+        return None #a socket that was left behind, nobody is listening
+    except daemon.DaemonException as e:
+        raise CMakeClassCreatorException(str(e))
+    edited_cmake_scripts = [EditedCMakeScript(edited["cmakelists_path"], edited["full_cmake_source"]) for edited in (result if isinstance(result, list) else [result])]
+    unexpected_paths = _find_unexpected_daemon_paths(edited_cmake_scripts, args)
+    if unexpected_paths:
+        print("The daemon answered with cmake scripts that weren't asked for ({}), the request is handled without it.".format(", ".join(unexpected_paths)),
+            file=sys.stderr)
+        return None
+    return edited_cmake_scripts if isinstance(result, list) else edited_cmake_scripts[0]
+
+def _find_unexpected_daemon_paths(edited_cmake_scripts, args):
+    """ The daemon may only edit the given cmake script, or in project mode the cmake scripts of the project """
+    if args.project:
+        try:
+            expected_paths = set(project_loader.find_cmake_scripts(args.cmakelists))
+        except project_loader.ProjectLoaderException as e:
+            raise CMakeClassCreatorException(str(e))
+    else:
+        expected_paths = {os.path.abspath(args.cmakelists)}
+    return [str(cmakelists_path) for cmakelists_path, _ in edited_cmake_scripts if not isinstance(cmakelists_path, str) or cmakelists_path not in expected_paths]
+
+def daemon_main():
+    args = create_daemon_arg_parser().parse_args()
+
+    try:
+        cmake_create_class_daemon = daemon.Daemon(args.socket or daemon.default_socket_path(), make_daemon_methods(), [CMakeClassCreatorException], args.idle_timeout)
+    except daemon.DaemonException as e:
+        print(str(e), file=sys.stderr)
+        return
+    cmake_create_class_daemon.serve_until_idle()
 
 def main():
-    args = create_arg_parser().parse_args()
+    arg_parser = create_arg_parser()
+    args = arg_parser.parse_args()
+    if args.name is None and not args.batch:
+        arg_parser.error("the following arguments are required: name")
 
+    validate_output_args(args)
     function_to_call = validate_args(args)
-    if function_to_call is not None:
-        try:
+    if function_to_call is None:
+        return
+
+    if _is_profiling_requested(args):
+        profiling.start_recording()
+    try:
+        _run(args, function_to_call)
+    finally:
+        phase_recorder = profiling.stop_recording()
+        if phase_recorder is not None:
+            _report_profile(phase_recorder, _get_profile_trace_path(args))
+
+def _run(args, function_to_call):
+    try:
+        output = _call_daemon_if_running(args)
+        if output is None:
             output = function_to_call(args)
-            if args.inplace:
-                with open(args.cmakelists, 'w') as output_file:
-                    output_file.write(output)
+        if isinstance(output, BatchResult):
+            for line_number, message in output.errors:
+                print("{0}:{1}: {2}".format(args.batch, line_number, message), file=sys.stderr)
+            output = output.full_cmake_source
+
+        with profiling.phase("write"):
+            if _is_edit_output_requested(args):
+                _write_edits(_as_edited_cmake_scripts(output, args.cmakelists), args)
+            elif isinstance(output, mapped_source.EditedMappedCMakeSource):
+                _write_or_skip_edited_mapped_source(output, args)
             else:
-                print(output)
-        except CMakeClassCreatorException as e:
-            print(str(e), file=sys.stderr)
-            
+                _write_edited_cmake_scripts(_as_edited_cmake_scripts(output, args.cmakelists), args)
+    except CMakeClassCreatorException as e:
+        print(str(e), file=sys.stderr)
+
+def _as_edited_cmake_scripts(output, cmakelists_path):
+    """ In project mode, the edited cmake scripts are not necessarily the given one and there may be more than one """
+    if isinstance(output, EditedCMakeScript):
+        return [output]
+    if isinstance(output, list):
+        return output
+    return [EditedCMakeScript(cmakelists_path, output)]
+
+def _write_edited_cmake_scripts(edited_cmake_scripts, args):
+    #rewriting a cmake script, even with the same content, makes every build directory configure again
+    if args.inplace:
+        for cmakelists_path in _write_all_in_place(edited_cmake_scripts):
+            print("{} is unchanged, it isn't written.".format(cmakelists_path), file=sys.stderr)
+        return
+
+    for cmakelists_path, full_cmake_source in edited_cmake_scripts:
+        if len(edited_cmake_scripts) > 1 or os.path.abspath(cmakelists_path) != os.path.abspath(args.cmakelists):
+            print("Changes to {}:".format(cmakelists_path), file=sys.stderr)
+        _write_cmake_source(sys.stdout, full_cmake_source)
+        #a cmake script piped through from stdin comes out exactly as it is edited, like a filter
+        if cmakelists_path != "-":
+            sys.stdout.write("\n")
+
+def _write_edits(edited_cmake_scripts, args):
+    """ Writes the diff or the edits of every cmake script, from edits that haven't been made """
+    for cmakelists_path, edits in edited_cmake_scripts:
+        try:
+            if args.edits_json:
+                for edit in edits.edits():
+                    print(json.dumps(dict(cmakelists=cmakelists_path, **edit._asdict())))
+            else:
+                sys.stdout.writelines(edits.unified_diff(cmakelists_path, 3 if args.diff_context is None else args.diff_context))
+        finally:
+            if isinstance(edits, mapped_source.EditedMappedCMakeSource):
+                edits.close()
+
+def _is_diff_requested(args):
+    return args.diff or args.diff_context is not None
+
+def _is_edit_output_requested(args):
+    return _is_diff_requested(args) or args.edits_json
+
+def _write_or_skip_edited_mapped_source(output, args):
+    if args.inplace and output.is_unchanged:
+        output.close()
+        print("{} is unchanged, it isn't written.".format(args.cmakelists), file=sys.stderr)
+        return
+    _write_edited_mapped_source(output, args.cmakelists if args.inplace else None)
+
+def _get_profile_trace_path(args):
+    return args.profile_trace or os.environ.get(_profile_trace_environment_variable) or None
+
+def _is_profiling_requested(args):
+    return args.profile or _get_profile_trace_path(args) is not None or os.environ.get(_profile_environment_variable, "") not in ("", "0")
+
+def _report_profile(phase_recorder, trace_path=None):
+    for line in phase_recorder.get_summary_lines():
+        print(line, file=sys.stderr)
+
+    if trace_path is not None:
+        try:
+            with open(trace_path, 'w') as trace_file:
+                phase_recorder.write_chrome_trace(trace_file)
+        except OSError as e:
+            print("Unable to write the profile trace {0}: {1}".format(trace_path, e.strerror), file=sys.stderr)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,88 @@
+""" Coroutines for the operations of cmake_create_class, for servers that run an asyncio event loop
+
+Reading and parsing a cmake script, the lookups and edits, and writing are done on an executor, so they don't block the
+event loop. That is the default executor of the event loop unless another one is given, such as a ProcessPoolExecutor to
+parse on several cpus. When operations on the same cmake script run at the same time, it is read and parsed only once.
+"""
+
+import asyncio, os
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import cmake_create_class
+from CMakeClassCreator import ast, ast_cache, lazy_import
+
+#the operations may run in several threads at once
+lazy_import.load_all()
+
+#when it is sent to another process, the AST is encoded in the compact format of the AST cache
+_LoadedCMakeScript = namedtuple("_LoadedCMakeScript", ["full_cmake_source", "full_cmake_ast", "is_encoded"])
+
+class _ParsedCMakeScript(object):
+    """ Gives the AST that was parsed before, where the operations of cmake_create_class take an AST cache """
+    def __init__(self, full_cmake_ast):
+        self.full_cmake_ast = full_cmake_ast
+
+    def load_or_parse(self, cmakelists_path, parse, parser_backend=ast.HANDWRITTEN_BACKEND, full_cmake_source=None, cmakelists_stat=None):
+        return self.full_cmake_ast
+
+def _load_cmake_script(cmakelists_path, parser_backend, encode):
+    full_cmake_source = cmake_create_class._read_cmakelists_contents(cmakelists_path)
+    full_cmake_ast = cmake_create_class._parse_cmakelists_contents(full_cmake_source, parser_backend)
+    if encode:
+        return _LoadedCMakeScript(full_cmake_source, ast_cache.encode_ast(full_cmake_ast), True)
+    return _LoadedCMakeScript(full_cmake_source, full_cmake_ast, False)
+
+def _do_operation(operation, loaded_cmake_script, cmakelists_path, parser_backend, sorted_insertion, *operation_args):
+    full_cmake_ast = ast_cache.decode_ast(loaded_cmake_script.full_cmake_ast) if loaded_cmake_script.is_encoded else loaded_cmake_script.full_cmake_ast
+    return operation(loaded_cmake_script.full_cmake_source, *operation_args, parser_backend, cmakelists_path, _ParsedCMakeScript(full_cmake_ast), 
+        sorted_insertion=sorted_insertion)
+
+class AsyncCMakeClassCreator(object):
+    """ The coroutines give the same results as the functions of cmake_create_class, and raise the same exceptions
+
+    An instance has to be used from a single event loop."""
+    def __init__(self, executor=None, parser_backend=ast.HANDWRITTEN_BACKEND):
+        """ The executor is a concurrent.futures executor, with None the default executor of the event loop is used """
+        self.executor = executor
+        self.parser_backend = parser_backend
+        self._loading = {} #real path of a cmake script -> the task that reads and parses it, while it runs
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def _load(self, cmakelists_path):
+        key = os.path.realpath(cmakelists_path)
+        loading = self._loading.get(key)
+        if loading is None:
+            loading = asyncio.ensure_future(self._run(_load_cmake_script, cmakelists_path, self.parser_backend, isinstance(self.executor, ProcessPoolExecutor)))
+            self._loading[key] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(key))
+        #a caller that is cancelled doesn't cancel the parse that other callers are waiting for
+        return await asyncio.shield(loading)
+
+    async def _do(self, cmakelists_path, operation, sorted_insertion, *operation_args):
+        loaded_cmake_script = await self._load(cmakelists_path)
+        return await self._run(_do_operation, operation, loaded_cmake_script, cmakelists_path, self.parser_backend, sorted_insertion, *operation_args)
+
+    async def create_class(self, cmakelists_path, class_name, reference_class_name, sorted_insertion=False):
+        return await self._do(cmakelists_path, cmake_create_class._create_class_in_full_cmake_source, sorted_insertion, class_name, reference_class_name)
+
+    async def insert_single_source_next_to_reference(self, cmakelists_path, source_item, reference_source_item, sorted_insertion=False):
+        return await self._do(cmakelists_path, cmake_create_class._insert_single_source_next_to_reference_in_full_cmake_source, sorted_insertion, 
+            source_item, reference_source_item)
+
+    async def insert_single_source_in_variable(self, cmakelists_path, source_item, variable, sorted_insertion=False):
+        return await self._do(cmakelists_path, cmake_create_class._insert_single_source_in_variable_in_full_cmake_source, sorted_insertion, source_item, variable)
+
+    async def insert_single_source_in_target(self, cmakelists_path, source_item, target, sorted_insertion=False):
+        return await self._do(cmakelists_path, cmake_create_class._insert_single_source_in_target_in_full_cmake_source, sorted_insertion, source_item, target)
+
+    async def insert_batch(self, cmakelists_path, manifest_lines, sorted_insertion=False):
+        """ Returns a cmake_create_class.BatchResult, the manifest lines are read before the batch starts """
+        return await self._do(cmakelists_path, cmake_create_class._insert_batch_in_full_cmake_source, sorted_insertion, list(manifest_lines))
+
+    async def write_in_place(self, edited_cmake_scripts):
+        """ Writes cmake_create_class.EditedCMakeScript results like -i does, all of them or none, and returns the paths that are unchanged """
+        return await self._run(cmake_create_class._write_all_in_place, list(edited_cmake_scripts))
@@ -17,9 +17,9 @@ setup(name='CMake-Class-Creator',
       author='Frank Goyens',
       url='https://github.com/FrankGoyens/CMakeClassCreator',
       packages=find_packages(),
-      py_modules=["cmake_create_class"],
+      py_modules=["cmake_create_class", "cmake_create_class_async"],
       install_requires=install_requires,
       long_description=long_description,
       long_description_content_type="text/markdown",
-      entry_points={"console_scripts": {"cmake_create_class=cmake_create_class:main"}}
+      entry_points={"console_scripts": {"cmake_create_class=cmake_create_class:main", "cmake_create_class_daemon=cmake_create_class:daemon_main"}}
      )